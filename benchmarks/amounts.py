@@ -0,0 +1,63 @@
+"""
+Compare format_amount with the "%.2f" % value formatting it replaced, on the amounts of a 100k item invoice.
+
+    $ python -m benchmarks.amounts --items 100000
+"""
+import argparse
+import time
+
+from decimal import Decimal
+
+from eracun_generator import formatting
+from eracun_generator.definitionsV2 import construct_invoice_json
+from eracun_generator.formatting import format_amount
+
+from benchmarks.invoices import make_invoice
+
+
+def make_amounts(item_count, distinct):
+    """
+    Amounts formatted for every item of an e-Slog 2.0 invoice, total without tax and discounted price, with
+    distinct different prices.
+    """
+    amounts = []
+
+    for i in range(item_count):
+        price = Decimal(i % distinct + 1) / 100
+        amounts.append(price * 2)
+        amounts.append(price * Decimal(1 - (10 / 100)))
+
+    return amounts
+
+
+def timed(function, amounts):
+    start = time.perf_counter()
+
+    for amount in amounts:
+        function(amount)
+
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the throughput of amount formatting.')
+    parser.add_argument('--items', type=int, default=100000, help='number of items')
+    args = parser.parse_args(argv)
+
+    for distinct in (100, args.items):
+        amounts = make_amounts(args.items, distinct)
+        formatting._cache.clear()
+
+        for name, function in (('"%.2f" % value', lambda value: "%.2f" % value), ('format_amount', format_amount)):
+            duration = timed(function, amounts)
+            print(f'{name:16} {distinct:>7} distinct prices  {duration * 1000:8.1f} ms  '
+                  f'{len(amounts) / duration:12.0f} amounts/s')
+
+    invoice = make_invoice(args.items)
+    start = time.perf_counter()
+    construct_invoice_json(invoice)
+    print(f'construct_invoice_json {args.items} items {(time.perf_counter() - start) * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Measure how long rendering large signed invoices stalls other work on the event loop.
+
+A probe task sleeps for 1 ms in a loop and records how late it wakes up, while invoices are rendered with
+Invoice.render_xml called directly on the loop and with Invoice.render_xml_async in threads and processes.
+
+    $ python -m benchmarks.async_latency --items 5000 --invoices 4
+"""
+import argparse
+import asyncio
+import time
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from eracun_generator.aio import AsyncRenderer
+from eracun_generator.utils import SigningContext
+
+from benchmarks.invoices import make_invoice
+from benchmarks.suite import _read_cert, percentile
+
+PROBE_INTERVAL = 0.001
+
+
+async def probe(lags, stop):
+    while not stop.is_set():
+        expected = time.perf_counter() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - expected)
+
+
+async def measure(render, invoices):
+    lags = []
+    stop = asyncio.Event()
+    task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(render(invoice) for invoice in invoices))
+    duration = time.perf_counter() - start
+
+    stop.set()
+    await task
+    lags.sort()
+
+    return duration, percentile(lags, 50), percentile(lags, 99), lags[-1]
+
+
+async def run(item_count, invoice_count, workers):
+    signing_context = SigningContext(*_read_cert())
+    invoices = [make_invoice(item_count) for _ in range(invoice_count)]
+    renderer = AsyncRenderer(ThreadPoolExecutor(workers), concurrency=workers)
+    process_renderer = AsyncRenderer(ProcessPoolExecutor(workers), concurrency=workers)
+
+    async def blocking(invoice):
+        invoice.render_xml(signing_context=signing_context)
+
+    async def threaded(invoice):
+        await invoice.render_xml_async(signing_context=signing_context, renderer=renderer)
+
+    async def threaded_prototype(invoice):
+        await invoice.render_xml_async(signing_context=signing_context, renderer=renderer, engine='prototype')
+
+    async def process(invoice):
+        await invoice.render_xml_async(signing_context=signing_context, renderer=process_renderer, engine='prototype')
+
+    for name, render in (('render_xml', blocking), ('render_xml_async', threaded),
+                         ('render_xml_async prototype', threaded_prototype), ('render_xml_async processes', process)):
+        duration, p50, p99, worst = await measure(render, invoices)
+        print(f'{name:28} {duration * 1000:9.1f} ms total  loop lag p50 {p50 * 1000:7.2f} ms  '
+              f'p99 {p99 * 1000:7.2f} ms  max {worst * 1000:7.2f} ms')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure event loop lag while rendering invoices.')
+    parser.add_argument('--items', type=int, default=5000, help='number of items per invoice')
+    parser.add_argument('--invoices', type=int, default=4, help='number of invoices rendered at once')
+    parser.add_argument('--workers', type=int, default=2, help='number of executor threads')
+    args = parser.parse_args(argv)
+
+    asyncio.run(run(args.items, args.invoices, args.workers))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Measure the time a fresh interpreter takes to import eracun_generator.core, and check that the signing stack is
+not imported with it.
+
+    $ python -m benchmarks.import_time
+"""
+import statistics
+import subprocess
+import sys
+
+SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start, sorted(name for name in ('cryptography', 'signxml') if name in sys.modules))
+'''
+
+
+def measure(module, repeat):
+    timings = []
+
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', SCRIPT.format(module=module)], check=True,
+                                capture_output=True, text=True).stdout
+        duration, loaded = output.split(' ', 1)
+        timings.append(float(duration))
+
+    return statistics.median(timings), loaded.strip()
+
+
+def main(repeat=10):
+    for module in ('lxml.etree', 'eracun_generator.core', 'eracun_generator.utils', 'eracun_generator.core, signxml'):
+        duration, loaded = measure(module, repeat)
+        print(f'import {module:32} {duration * 1000:7.1f} ms  signing stack loaded: {loaded}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+from decimal import Decimal
+from datetime import datetime
+
+from eracun_generator.core import Invoice, ReferenceDocument, Business
+
+
+def make_business(name, vat_id):
+    return Business(name=name,
+                    address='Our Address 100',
+                    zip_code=1000,
+                    city='Ljubljana',
+                    country='Slovenia',
+                    country_iso_code='SI',
+                    vat_id=vat_id,
+                    iban='SI56111122223333456',
+                    bic='BAKOSI2XXXX',
+                    registration_number='555555555')
+
+
+def make_invoice(item_count, columnar_items=False):
+    """
+    Synthetic invoice with item_count items. Every other item is discounted.
+    """
+    item_total_without_tax = Decimal('1.48')
+    item_total_with_tax = Decimal('1.81')
+
+    invoice = Invoice(
+        issuer=make_business('Company d.o.o.', '12345678'),
+        recipient=make_business('Recipient Name', '87654321'),
+        invoice_number='1-2019-154',
+        total_without_tax=item_total_without_tax * item_count,
+        total_with_tax=item_total_with_tax * item_count,
+        location_address='Ljubljana',
+        date_issued=datetime(2019, 5, 6),
+        date_of_service=datetime(2019, 5, 6),
+        date_due=datetime(2019, 6, 5),
+        payment_reference='SI001-2019-154',
+        intro_text='Invoice intro text to be included',
+        columnar_items=columnar_items)
+
+    invoice.add_reference_document('NAR-54654', ReferenceDocument.TYPE_ORDER_NUMBER)
+
+    for i in range(item_count):
+        discounted = i % 2 == 1
+
+        invoice.add_item(
+            row_number=i + 1,
+            item_name=f'Item {i + 1}',
+            quantity=Decimal('2.00'),
+            ean='12345678',
+            price_without_tax=Decimal('0.82'),
+            total_with_tax=item_total_with_tax,
+            total_without_tax=item_total_without_tax,
+            tax_rate=Decimal('22.00'),
+            discount_percentage=Decimal('10') if discounted else None,
+            discount_amount=Decimal('0.16') if discounted else None)
+
+    invoice.add_tax_summary(tax_rate=Decimal('22.00'),
+                            tax_base=item_total_without_tax * item_count,
+                            tax_amount=(item_total_with_tax - item_total_without_tax) * item_count)
+
+    return invoice
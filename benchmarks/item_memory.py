@@ -0,0 +1,64 @@
+"""
+Compare the memory used by invoice items stored as objects with a __dict__, slotted InvoiceItem objects and
+an ItemColumns store.
+
+    $ python -m benchmarks.item_memory
+"""
+import tracemalloc
+
+from eracun_generator.core import InvoiceItem
+
+from benchmarks.invoices import make_invoice
+
+
+class DictItem:
+    """
+    InvoiceItem as it was before __slots__, every instance has its own __dict__.
+    """
+    def __init__(self, item):
+        for field in InvoiceItem.__slots__:
+            setattr(self, field, getattr(item, field))
+
+        self.item_description_code = item.item_description_code
+        self.quantity_type = item.quantity_type
+
+
+def measure(build):
+    tracemalloc.start()
+    items = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del items
+
+    return size
+
+
+def main(item_count=100000):
+    # Item values are shared between the stores, only the containers and item objects are measured
+    source = list(make_invoice(item_count).document_items)
+
+    stores = {
+        'dict objects': lambda: [DictItem(item) for item in source],
+        'slotted objects': lambda: [InvoiceItem(**{field: getattr(item, field) for field in InvoiceItem.__slots__})
+                                    for item in source],
+        'columns': lambda: _columns(source),
+    }
+
+    print(f'{item_count} items')
+
+    for name, build in stores.items():
+        print(f'  {name:16} {measure(build) / item_count:6.0f} bytes per item')
+
+
+def _columns(source):
+    invoice = make_invoice(0, columnar_items=True)
+
+    for item in source:
+        invoice.document_items.append(item)
+
+    return invoice.document_items
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Run signed invoices through the async pipeline and print the per-stage summary.
+
+    $ python -m benchmarks.pipeline --invoices 200 --items 100 --sign-workers 4
+"""
+import argparse
+import asyncio
+import json
+
+from eracun_generator.pipeline import Pipeline
+from eracun_generator.utils import SigningContext
+
+from benchmarks.invoices import make_invoice
+from benchmarks.suite import _read_cert
+
+
+async def discard(invoice, xml, envelope):
+    pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the throughput of the async pipeline stages.')
+    parser.add_argument('--invoices', type=int, default=200, help='number of invoices')
+    parser.add_argument('--items', type=int, default=100, help='number of items per invoice')
+    parser.add_argument('--render-workers', type=int, default=1)
+    parser.add_argument('--sign-workers', type=int, default=2)
+    parser.add_argument('--engine', default='dict', choices=['dict', 'element', 'prototype'])
+    args = parser.parse_args(argv)
+
+    invoices = (make_invoice(args.items) for _ in range(args.invoices))
+    pipeline = Pipeline(discard, engine=args.engine, signing_context=SigningContext(*_read_cert()), envelope=True,
+                        render_workers=args.render_workers, sign_workers=args.sign_workers)
+
+    print(json.dumps(asyncio.run(pipeline.run(invoices)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
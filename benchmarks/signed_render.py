@@ -0,0 +1,44 @@
+"""
+Compare signed rendering that constructs the invoice twice with the single pass render_xml.
+
+    $ python -m benchmarks.signed_render
+"""
+import os
+import timeit
+
+from lxml import etree
+
+from eracun_generator.builder import build_xml
+from eracun_generator.definitionsV2 import construct_invoice_json
+from eracun_generator.utils import SigningContext
+
+from benchmarks.invoices import make_invoice
+
+CERT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'demos', 'cert')
+
+
+def render_twice(invoice, signing_context):
+    # Previous render_xml: the unsigned tree is built and discarded, then the invoice is constructed again to sign it
+    build_xml(construct_invoice_json(invoice))
+    xml_content = signing_context.sign_invoice(construct_invoice_json(invoice))
+
+    return etree.tostring(xml_content, method="c14n")
+
+
+def main(item_count=1000, repeat=5):
+    with open(os.path.join(CERT_DIR, 'example.key'), 'rb') as key, open(os.path.join(CERT_DIR, 'example.pem'), 'rb') as cert:
+        signing_context = SigningContext(key.read(), cert.read())
+
+    invoice = make_invoice(item_count)
+
+    twice = min(timeit.repeat(lambda: render_twice(invoice, signing_context), number=1, repeat=repeat))
+    once = min(timeit.repeat(lambda: invoice.render_xml(signing_context=signing_context), number=1, repeat=repeat))
+
+    print(f'{item_count} items, signed e-Slog 2.0')
+    print(f'  constructed twice: {twice * 1000:.1f} ms')
+    print(f'  single pass:       {once * 1000:.1f} ms')
+    print(f'  saved:             {(twice - once) * 1000:.1f} ms ({(1 - once / twice) * 100:.0f} %)')
+
+
+if __name__ == '__main__':
+    main()
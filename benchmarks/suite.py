@@ -0,0 +1,188 @@
+"""
+Benchmark the rendering pipeline stage by stage on synthetic invoices.
+
+    $ python -m benchmarks.suite --output results.json
+    $ python -m benchmarks.suite --sizes 1 100 1000 --baseline results.json
+
+Every path is timed separately, with its input prepared outside of the timed call. Results are written as JSON with
+throughput, latency percentiles and peak Python memory per path and invoice size. Peak memory is traced with
+tracemalloc and does not include memory allocated by libxml2 for the element trees. When a baseline is given, paths
+whose median latency grew by more than the threshold are reported as regressions and the exit code is 1.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from lxml import etree
+
+from eracun_generator.builder import build_xml
+from eracun_generator.definitions import construct_invoice_json
+from eracun_generator.definitionsV2 import construct_invoice_json as construct_invoice_jsonV2
+from eracun_generator.elementsV2 import construct_invoice_element as construct_invoice_elementV2
+from eracun_generator.prototypesV2 import construct_invoice_element as construct_invoice_prototypeV2
+from eracun_generator.utils import sign_invoice
+
+from benchmarks.invoices import make_invoice
+
+SIZES = [1, 10, 100, 1000, 10000, 100000]
+
+CERT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'demos', 'cert')
+
+
+def _read_cert():
+    with open(os.path.join(CERT_DIR, 'example.key'), 'rb') as key, open(os.path.join(CERT_DIR, 'example.pem'), 'rb') as cert:
+        return key.read(), cert.read()
+
+
+def _paths():
+    """
+    Benchmarked paths as name -> (setup, run). setup(invoice) prepares the input of a single run and is not timed.
+    """
+    key, cert = _read_cert()
+
+    return {
+        'construct_invoice_json': (lambda invoice: invoice, construct_invoice_json),
+        'construct_invoice_jsonV2': (lambda invoice: invoice, construct_invoice_jsonV2),
+        'build_xml': (construct_invoice_jsonV2, build_xml),
+        # Complete element trees, comparable to construct_invoice_jsonV2 and build_xml together
+        'construct_invoice_elementV2': (lambda invoice: invoice, construct_invoice_elementV2),
+        'construct_invoice_prototypeV2': (lambda invoice: invoice, construct_invoice_prototypeV2),
+        'c14n': (lambda invoice: build_xml(construct_invoice_jsonV2(invoice)),
+                 lambda xml_content: etree.tostring(xml_content, method="c14n")),
+        'sign_invoice': (construct_invoice_jsonV2, lambda invoice_json: sign_invoice(invoice_json, key, cert)),
+        'render_envelope': (lambda invoice: (invoice, invoice.render_xml()),
+                            lambda prepared: prepared[0].render_envelope(xml=prepared[1])),
+    }
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def run_case(setup, run, invoice, repeat):
+    timings = []
+
+    for _ in range(repeat):
+        prepared = setup(invoice)
+
+        start = time.perf_counter()
+        run(prepared)
+        timings.append(time.perf_counter() - start)
+
+    # Peak memory is measured in a separate run, tracing slows the code down too much to time it at the same time
+    prepared = setup(invoice)
+    tracemalloc.start()
+    run(prepared)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    total = sum(timings)
+    item_count = len(invoice.document_items)
+
+    return {
+        'items': item_count,
+        'repeat': repeat,
+        'min_s': timings[0],
+        'mean_s': total / repeat,
+        'p50_s': percentile(timings, 50),
+        'p90_s': percentile(timings, 90),
+        'p99_s': percentile(timings, 99),
+        'invoices_per_s': repeat / total,
+        'items_per_s': repeat * item_count / total,
+        'peak_memory_bytes': peak_memory,
+    }
+
+
+def run(sizes=None, paths=None, repeat=20, max_items=200000):
+    """
+    Run the benchmarks and return the results.
+
+    Larger invoices are repeated fewer times, so that a single case processes about max_items items but runs
+    at least 3 times.
+    """
+    available = _paths()
+    results = []
+
+    for size in sizes or SIZES:
+        invoice = make_invoice(size)
+        case_repeat = max(3, min(repeat, max_items // size))
+
+        for name in paths or available:
+            setup, run_path = available[name]
+            result = run_case(setup, run_path, invoice, case_repeat)
+            result['path'] = name
+            results.append(result)
+
+            print(f"{name:28} {size:>7} items  p50 {result['p50_s'] * 1000:10.2f} ms  "
+                  f"{result['items_per_s']:12.0f} items/s  peak {result['peak_memory_bytes'] / 1024 / 1024:8.1f} MB",
+                  file=sys.stderr)
+
+    return {
+        'python': platform.python_version(),
+        'lxml': '.'.join(str(part) for part in etree.LXML_VERSION),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=0.1):
+    """
+    Compare the median latency of every path and size with the baseline report.
+
+    :return: list of (path, items, baseline p50, current p50) tuples that regressed by more than threshold
+    """
+    baseline_results = {(result['path'], result['items']): result for result in baseline['results']}
+    regressions = []
+
+    for result in report['results']:
+        base = baseline_results.get((result['path'], result['items']))
+
+        if base is not None and result['p50_s'] > base['p50_s'] * (1 + threshold):
+            regressions.append((result['path'], result['items'], base['p50_s'], result['p50_s']))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark e-Slog rendering paths.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='number of items per invoice')
+    parser.add_argument('--paths', nargs='+', choices=sorted(_paths()), help='paths to benchmark, default all')
+    parser.add_argument('--repeat', type=int, default=20, help='maximum number of runs per case')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed relative slowdown of the median')
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.paths, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(report, json.load(fp), args.threshold)
+
+        for path, items, base, current in regressions:
+            print(f'REGRESSION {path} with {items} items: p50 {base * 1000:.2f} ms -> {current * 1000:.2f} ms',
+                  file=sys.stderr)
+
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
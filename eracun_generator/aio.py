@@ -0,0 +1,128 @@
+"""
+Rendering invoices from asyncio applications.
+
+Rendering is CPU bound and blocks the event loop for as long as it runs. AsyncRenderer runs it in an executor
+instead, with at most concurrency invoices rendered at once.
+
+    renderer = AsyncRenderer(executor=ThreadPoolExecutor(4), concurrency=4)
+    xml = await invoice.render_xml_async(signing_context=signing_context, renderer=renderer)
+
+With a thread pool, the default, the segments of invoices with more than chunk_size items are constructed
+chunk_size at a time, one executor call per chunk, so a very large invoice does not hold a worker thread for its
+whole construction and invoices rendered at the same time take turns. Signing, validation and serialization run in
+a single call after that. With a ProcessPoolExecutor every invoice is rendered in a single call in a worker
+process and the invoice, signing context and attachments are pickled to it.
+
+Invoice.render_xml_async and Invoice.render_envelope_async use default_renderer unless they are given a renderer.
+Replace it to configure the executor and concurrency for the whole application.
+"""
+import asyncio
+import weakref
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from itertools import islice
+
+from eracun_generator import instrumentation
+from eracun_generator.builder import build_xml
+from eracun_generator.definitions import construct_root_data, construct_invoice_segments
+from eracun_generator.definitionsV2 import construct_root_data as construct_root_dataV2
+from eracun_generator.definitionsV2 import construct_invoice_segments as construct_invoice_segmentsV2
+from eracun_generator.streaming import ENGINE_MODULES, XML_DECLARATION
+from eracun_generator.utils import SigningContext
+
+
+class AsyncRenderer:
+    def __init__(self, executor=None, concurrency=None, chunk_size=1000):
+        """
+        :param executor: concurrent.futures executor, defaults to the default executor of the event loop
+        :param concurrency: maximum number of invoices rendered at once, None for no limit
+        :param chunk_size: number of segments constructed per executor call, about the number of items
+        """
+        self.executor = executor
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+
+        # Semaphores are bound to the event loop they are first used in
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    async def render_xml_bytes(self, invoice, key=None, cert=None, v2=True, engine='dict', signing_context=None,
+                               validate=False):
+        """
+        See Invoice.render_xml_bytes for the arguments.
+        """
+        async with self._limit():
+            if isinstance(self.executor, ProcessPoolExecutor) or len(invoice.document_items) <= self.chunk_size:
+                return await self._run(invoice.render_xml_bytes, key, cert, v2, engine, signing_context, validate)
+
+            if signing_context is None and key and cert:
+                signing_context = await self._run(SigningContext, key, cert)
+
+            root, segments = _construct_root(invoice, v2, engine)
+
+            while await self._run(_construct_segments, segments, self.chunk_size):
+                pass
+
+            return XML_DECLARATION + await self._run(_serialize, invoice, root, v2, signing_context, validate)
+
+    async def render_envelope_bytes(self, invoice, attachments=None, sender_bic=None, recipient_bic=None, xml=None,
+                                    validate=False):
+        """
+        See Invoice.render_envelope_bytes for the arguments.
+        """
+        async with self._limit():
+            return await self._run(invoice.render_envelope_bytes, attachments, sender_bic, recipient_bic, xml,
+                                   validate)
+
+    @asynccontextmanager
+    async def _limit(self):
+        if self.concurrency is None:
+            yield
+            return
+
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+
+        async with semaphore:
+            yield
+
+    def _run(self, function, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, partial(function, *args))
+
+
+default_renderer = AsyncRenderer()
+
+
+def _construct_root(invoice, v2, engine):
+    """
+    Build the root element and return it with a generator appending the segments of the invoice to it.
+    """
+    if engine in ENGINE_MODULES:
+        module = ENGINE_MODULES[engine][0 if v2 else 1]
+        root = module.construct_root_element()
+
+        return root, module.construct_invoice_segments(invoice, root[0])
+
+    root = build_xml(construct_root_dataV2() if v2 else construct_root_data())
+    parent = root[0]
+    construct_segments = construct_invoice_segmentsV2 if v2 else construct_invoice_segments
+    segments = construct_segments(invoice, cached_parties=True)
+
+    return root, (build_xml(segment, parent) for _, segment in segments)
+
+
+def _construct_segments(segments, count):
+    """
+    Construct up to count segments. Returns False when all segments are constructed.
+    """
+    return sum(1 for _ in islice(segments, count)) == count
+
+
+def _serialize(invoice, root, v2, signing_context, validate):
+    stopwatch = instrumentation.stopwatch(len(invoice.document_items))
+
+    return invoice._serialize_xml(root, v2, signing_context, validate, stopwatch)
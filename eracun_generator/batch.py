@@ -0,0 +1,185 @@
+import os
+import traceback
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+from eracun_generator.utils import SigningContext
+
+# Function and options the pool initializer hands to every worker process, so they are transferred once per worker
+# instead of once per chunk.
+_worker = {}
+
+
+class RenderResult:
+    """
+    Outcome of rendering a single invoice in a batch.
+
+    Failed invoices have xml set to None and error set to the formatted traceback.
+    """
+    def __init__(self, index, invoice_number, xml=None, error=None):
+        self.index = index
+        self.invoice_number = invoice_number
+        self.xml = xml
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def render_many(invoices, v2=True, workers=None, chunksize=16, ordered=True, key=None, cert=None,
+                signing_context=None):
+    """
+    Render many invoices across a pool of worker processes.
+
+    Invoices are consumed lazily and sent to the workers in chunks of chunksize, with at most two chunks per
+    worker in flight, so memory stays bounded for arbitrarily long batches. A failing invoice is reported in its
+    RenderResult and does not stop the batch, as are the invoices of a chunk that can't be pickled or whose worker
+    process died.
+
+    :param invoices: iterable of Invoice objects
+    :param v2: set to False to use e-Slog v1.6.1
+    :param workers: number of worker processes, defaults to the number of CPUs. 1 renders in the current process.
+    :param chunksize: number of invoices sent to a worker at once
+    :param ordered: yield results in input order. Set to False to yield them as they finish.
+    :param key: private key used to sign every invoice
+    :param cert: certificate used to sign every invoice
+    :param signing_context: SigningContext used to sign every invoice, instead of key and cert. It is sent to every
+                            worker once and rebuilt there.
+    :return: generator of RenderResult objects
+    """
+    if signing_context is None and key and cert:
+        signing_context = SigningContext(key, cert)
+
+    return map_chunks(_render, enumerate(invoices), workers, chunksize, ordered,
+                      dict(signing_context=signing_context, v2=v2), on_error=_render_error)
+
+
+def map_chunks(function, items, workers=None, chunksize=16, ordered=True, options=None, on_error=None):
+    """
+    Call function(item, **options) for every item across a pool of worker processes.
+
+    Items are consumed lazily and sent to the workers in chunks of chunksize, with at most two chunks per worker in
+    flight, so memory stays bounded for arbitrarily long inputs. function and options are sent to every worker once,
+    when it starts.
+
+    :param function: module level function, so it can be pickled
+    :param items: iterable of items
+    :param workers: number of worker processes, defaults to the number of CPUs. 1 calls function in the current
+                    process.
+    :param chunksize: number of items sent to a worker at once
+    :param ordered: yield results in input order. Set to False to yield them as they finish.
+    :param options: dict of keyword arguments of every call
+    :param on_error: function(item, error) returning the result of an item whose chunk failed outside of function,
+                     e.g. when the chunk can't be pickled or its worker process died, with error set to the formatted
+                     traceback. Without on_error the exception is raised. Chunks submitted after a worker process
+                     died are sent to a new pool.
+    :return: generator of function results
+    """
+    options = options or {}
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunked(iter(items), chunksize)
+
+    if workers == 1:
+        for chunk in chunks:
+            for item in chunk:
+                yield function(item, **options)
+        return
+
+    executor = _pool(workers, function, options)
+    in_flight = deque()
+
+    try:
+        for chunk in chunks:
+            try:
+                future = executor.submit(_map_chunk, chunk)
+            except BrokenProcessPool:
+                # A worker process died, the chunks in flight fail with the pool
+                executor.shutdown(wait=False)
+                executor = _pool(workers, function, options)
+                future = executor.submit(_map_chunk, chunk)
+
+            in_flight.append((future, chunk))
+
+            if len(in_flight) >= workers * 2:
+                yield from _collect(in_flight, ordered, on_error)
+
+        while in_flight:
+            yield from _collect(in_flight, ordered, on_error)
+    finally:
+        executor.shutdown()
+
+
+def _pool(workers, function, options):
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(function, options))
+
+
+def _collect(in_flight, ordered, on_error):
+    """
+    Remove the next, or all finished, chunks from in_flight and return their results.
+    """
+    if ordered:
+        done = [in_flight.popleft()]
+    else:
+        finished, _ = wait([future for future, _ in in_flight], return_when=FIRST_COMPLETED)
+        done = [entry for entry in in_flight if entry[0] in finished]
+
+        for entry in done:
+            in_flight.remove(entry)
+
+    results = []
+
+    for future, chunk in done:
+        if on_error is None:
+            results.extend(future.result())
+            continue
+
+        try:
+            results.extend(future.result())
+        except Exception:
+            error = traceback.format_exc()
+            results.extend(on_error(item, error) for item in chunk)
+
+    return results
+
+
+def _chunked(iterable, size):
+    while True:
+        chunk = list(islice(iterable, size))
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def _init_worker(function, options):
+    # Import the rendering stack before the first chunk arrives instead of while unpickling it.
+    import eracun_generator.core  # noqa: F401
+
+    _worker.update(function=function, options=options)
+
+
+def _map_chunk(chunk):
+    function, options = _worker['function'], _worker['options']
+
+    return [function(item, **options) for item in chunk]
+
+
+def _render(item, signing_context, v2):
+    index, invoice = item
+    invoice_number = getattr(invoice, 'invoice_number', None)
+
+    try:
+        return RenderResult(index, invoice_number, xml=invoice.render_xml(v2=v2, signing_context=signing_context))
+    except Exception:
+        return RenderResult(index, invoice_number, error=traceback.format_exc())
+
+
+def _render_error(item, error):
+    index, invoice = item
+
+    return RenderResult(index, getattr(invoice, 'invoice_number', None), error=error)
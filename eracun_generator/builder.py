@@ -1,25 +1,41 @@
+from copy import deepcopy
+
 from lxml import etree
 
 
-def build_xml(data):
-    if data.get('_ns'):
-        tag = etree.Element(data['_name'], nsmap=data['_ns'])
+def build_xml(data, parent=None):
+    """
+    Build an lxml element from the dict tree. When parent is given, the element is appended to it.
+
+    A dict with an _element key stands for a prebuilt element, a copy of it is used instead.
+    """
+    if '_element' in data:
+        tag = deepcopy(data['_element'])
+
+        if parent is not None:
+            parent.append(tag)
+
+        return tag
+
+    if parent is None:
+        tag = etree.Element(data['_name'], nsmap=data.get('_ns'))
     else:
-        tag = etree.Element(data['_name'])
+        tag = etree.SubElement(parent, data['_name'], nsmap=data.get('_ns'))
 
     for attr, val in data.get('_attrs', []):
         tag.attrib[attr] = val
 
     for child, child_data in data.items():
         if not child.startswith('_'):
-            child_tag = build_xml(child_data)
-            tag.append(child_tag)
+            build_xml(child_data, tag)
 
     if data.get('_value', None) is not None:
         tag.text = data['_value']
 
-    # Sort the child elements
+    # Sort the child elements by the order of their names in _sorting, for dict trees built by applications. The
+    # definitions construct their children in schema order and don't use it.
     if '_sorting' in data:
-        tag[:] = sorted(tag, key=lambda element: data['_sorting'].index(element.tag))
+        rank = {name: i for i, name in enumerate(data['_sorting'])}
+        tag[:] = sorted(tag, key=lambda element: rank[element.tag])
 
     return tag
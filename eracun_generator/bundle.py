@@ -0,0 +1,148 @@
+import hashlib
+import zipfile
+
+from eracun_generator import instrumentation
+from eracun_generator.envelope.utils import iter_content
+from eracun_generator.streaming import XML_DECLARATION, iter_invoice_xml
+
+INVOICE_FILENAME = 'eRacun.xml'
+ENVELOPE_FILENAME = 'envelope.xml'
+
+
+def write_bundle(fp, invoice, attachments=None, **options):
+    """
+    Write a ZIP archive with the invoice XML, its envelope and attachments to a binary file object.
+
+    See add_bundle for attachments and options.
+    :param fp: binary file object, does not need to be seekable
+    :param invoice:
+    :param attachments:
+    :return:
+    """
+    with zipfile.ZipFile(fp, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        add_bundle(archive, invoice, attachments, **options)
+
+
+def write_bundles(fp, invoices, **options):
+    """
+    Write a ZIP archive with one bundle per invoice to a binary file object.
+
+    Every bundle is placed in a directory named after the invoice number, see bundle_name. Invoices with a number
+    already in the archive get the first free directory of <invoice number>_2, <invoice number>_3 and so on.
+    Invoices are consumed one at a time and every member is written as it is produced, so memory stays bounded for
+    any number of invoices.
+    :param fp: binary file object, does not need to be seekable
+    :param invoices: iterable of Invoice objects or (invoice, attachments) tuples
+    :param options: see add_bundle
+    :return:
+    """
+    directories = set()
+
+    with zipfile.ZipFile(fp, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for entry in invoices:
+            invoice, attachments = entry if isinstance(entry, tuple) else (entry, None)
+            name = bundle_name(invoice.invoice_number)
+            directory, number = name, 1
+
+            while directory in directories:
+                number += 1
+                directory = f'{name}_{number}'
+
+            directories.add(directory)
+            add_bundle(archive, invoice, attachments, prefix=directory + '/', **options)
+
+
+def add_bundle(archive, invoice, attachments=None, prefix='', v2=True, signing_context=None, sender_bic=None,
+               recipient_bic=None, validate=False):
+    """
+    Add eRacun.xml, the attachments and envelope.xml of the invoice to an open ZipFile.
+
+    Unsigned invoice XML is written segment by segment and attachments are copied in chunks. Attachment sizes and
+    the envelope hash are computed from the bytes written to the archive. Raises ValueError when two members of the
+    bundle would have the same name, when a filename or the prefix would place a member outside of the bundle
+    directory and when the content of an attachment is not given.
+
+    :param archive: ZipFile opened for writing
+    :param invoice:
+    :param attachments: list of (filename, type, source) tuples, where source is bytes, a path or a binary file object.
+                        Filenames can't contain slashes or be . or ..
+    :param prefix: prefix of member names, e.g. a directory ending with a slash. It can't start with a slash or
+                   contain . or .. directories.
+    :param v2: set to False to use e-Slog v1.6.1
+    :param signing_context: SigningContext used to sign the invoice
+    :param sender_bic: see Invoice.render_envelope
+    :param recipient_bic: see Invoice.render_envelope
+    :param validate: validate the invoice and envelope against their XSD schemas, see Invoice.render_xml_bytes.
+                     The invoice is then rendered whole instead of segment by segment.
+    :return:
+    """
+    attachments = list(attachments or [])
+    filenames = [INVOICE_FILENAME, ENVELOPE_FILENAME] + [filename for filename, _, _ in attachments]
+    name = prefix.rstrip('/') or invoice.invoice_number
+
+    if len(set(filenames)) < len(filenames):
+        raise ValueError(f'Bundle {name} has more than one file with the same name')
+
+    if prefix and not all(_valid_name(directory) for directory in prefix.rstrip('/').split('/')):
+        raise ValueError(f'Bundle prefix {prefix!r} is not a relative directory')
+
+    for filename, _, source in attachments:
+        if not _valid_name(filename):
+            raise ValueError(f'Bundle {name} attachment {filename!r} is not a file name')
+
+        # digest_attachments takes sizes in place of the content, a bundle needs the content itself
+        if source is None or isinstance(source, int):
+            raise ValueError(f'Bundle {name} attachment {filename} needs its content as bytes, a path or a binary '
+                             f'file object, not {source!r}')
+
+    if signing_context or validate:
+        xml = [invoice.render_xml_bytes(v2=v2, signing_context=signing_context, validate=validate)]
+    else:
+        xml = iter_invoice_xml(invoice, v2=v2)
+
+    stopwatch = instrumentation.stopwatch(len(invoice.document_items))
+    digest = hashlib.sha1()
+
+    sized = [(INVOICE_FILENAME, 'XML', _write_member(archive, prefix + INVOICE_FILENAME, xml, digest))]
+
+    for filename, attachment_type, source in attachments:
+        size = _write_member(archive, prefix + filename, iter_content(source), digest)
+        sized.append((filename, attachment_type, size))
+
+    attachments_size = sum(size for _, _, size in sized)
+
+    if stopwatch:
+        stopwatch.lap('bundle.write', attachments_size)
+
+    envelope = invoice._serialize_envelope(sized, digest.hexdigest(), attachments_size, sender_bic, recipient_bic,
+                                           validate, stopwatch)
+
+    _write_member(archive, prefix + ENVELOPE_FILENAME, [XML_DECLARATION, envelope])
+
+
+def bundle_name(invoice_number):
+    """
+    Directory name of an invoice, the invoice number with slashes and backslashes replaced by underscores. Names of
+    only dots, or no characters, get an underscore in front, so they can't refer to a parent directory.
+    """
+    name = str(invoice_number).replace('/', '_').replace('\\', '_')
+
+    return name if name.strip('.') else '_' + name
+
+
+def _valid_name(name):
+    return bool(name) and '/' not in name and '\\' not in name and name not in ('.', '..')
+
+
+def _write_member(archive, name, chunks, digest=None):
+    size = 0
+
+    with archive.open(name, 'w') as member:
+        for chunk in chunks:
+            member.write(chunk)
+            size += len(chunk)
+
+            if digest is not None:
+                digest.update(chunk)
+
+    return size
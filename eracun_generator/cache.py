@@ -0,0 +1,88 @@
+"""
+Bounded LRU cache of built party segments.
+
+The issuer is the same on every invoice and most recipients repeat, so the e-SLOG 1.6, e-SLOG 2.0 and envelope
+party segments are built once per distinct Business content and copied into every document. Keys hold the values of
+all Business fields, so a Business that changes simply misses the cache and its old segments age out.
+
+    from eracun_generator.cache import party_cache
+
+    print(party_cache.info())
+"""
+from collections import OrderedDict
+from threading import Lock
+
+
+class FragmentCache:
+    def __init__(self, maxsize=256):
+        """
+        :param maxsize: number of fragments kept, 0 disables caching
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.fragments = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key, build):
+        """
+        Return the fragment cached under key, building it with build() on a miss.
+
+        The fragment is shared by every caller, copy it before appending it to a document.
+        """
+        with self.lock:
+            fragment = self.fragments.get(key)
+
+            if fragment is not None:
+                self.fragments.move_to_end(key)
+                self.hits += 1
+
+                return fragment
+
+            self.misses += 1
+
+        fragment = build()
+
+        if self.maxsize > 0:
+            with self.lock:
+                self.fragments[key] = fragment
+
+                if len(self.fragments) > self.maxsize:
+                    self.fragments.popitem(last=False)
+
+        return fragment
+
+    def clear(self):
+        with self.lock:
+            self.fragments.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.fragments),
+            'maxsize': self.maxsize,
+        }
+
+
+party_cache = FragmentCache()
+
+
+def party_fragment(kind, business, build, *args):
+    """
+    Return the cached party element of business, building it with build() on a miss.
+    :param kind: format of the fragment, e.g. 'v2' or 'envelope.sender'
+    :param business: Business object
+    :param build: function building the element when it's not cached
+    :param args: other values the fragment depends on, e.g. the partner type
+    :return: shared lxml element, copy it before use
+    """
+    try:
+        key = (kind, args, tuple(getattr(business, field) for field in business.__slots__))
+        hash(key)
+    except (AttributeError, TypeError):
+        return build()  # not a slotted Business or unhashable field values
+
+    return party_cache.get(key, build)
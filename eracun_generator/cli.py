@@ -0,0 +1,417 @@
+"""
+eracun command line tool. Converts invoice records from JSONL or CSV files to e-Slog XML files.
+
+    $ eracun invoices.jsonl --output out/ --envelope --key example.key --cert example.pem
+    $ eracun invoices.csv --output invoices.zip --v1 --workers 4
+
+Every invoice is written to <invoice number>/eRacun.xml, with its envelope in <invoice number>/envelope.xml, in
+the output directory or ZIP archive. Invoices with a number that already came up in the input get the first free
+directory of <invoice number>_2, <invoice number>_3 and so on. Invoices whose files are already there are skipped,
+so an interrupted run continues where it stopped when started again with the same arguments.
+
+JSONL input has one invoice per line. Header fields have the Invoice argument names, issuer and recipient are
+objects with the Business argument names and items is a list of objects with the add_item argument names.
+reference_documents is an optional list of {"document_number": ..., "type_code": ...} objects and tax_summaries
+an optional list of objects with the add_tax_summary argument names. Dates are ISO 8601 strings.
+
+    {"invoice_number": "1-2019-154", "date_issued": "2019-05-01", ..., "issuer": {"name": ...},
+     "recipient": {...}, "items": [{"item_name": "CocaCola 0.33L", "quantity": "2.00", ...}]}
+
+CSV input has one item per row with a header row. The invoice header is repeated on every row of the invoice and
+consecutive rows with the same invoice_number belong to the same invoice. Header columns have the Invoice argument
+names, e.g. global_discount_amount. Issuer and recipient columns are prefixed with issuer_ and recipient_, e.g.
+issuer_vat_id, and item columns with item_, e.g. item_quantity.
+
+Invoices without tax summaries get them, and the invoice totals, computed from the items with
+Invoice.finalize_totals. CSV files can't hold tax summaries, so their totals are always computed.
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import time
+import traceback
+import zipfile
+
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from eracun_generator.batch import map_chunks
+from eracun_generator.bundle import ENVELOPE_FILENAME, INVOICE_FILENAME, bundle_name
+from eracun_generator.core import Business, Invoice
+from eracun_generator.utils import SigningContext
+
+HEADER_FIELDS = ('invoice_number', 'location_address', 'payment_reference', 'intro_text', 'outro_text',
+                 'invoice_type', 'currency', 'invoice_function', 'payment_type', 'payment_purpose',
+                 'additional_remittance_information', 'location_code')
+HEADER_DATE_FIELDS = ('date_issued', 'date_of_service', 'date_due')
+HEADER_AMOUNT_FIELDS = ('total_without_tax', 'total_with_tax', 'global_discount_amount', 'global_discount_percentage')
+BUSINESS_FIELDS = ('name', 'address', 'city', 'zip_code', 'country', 'country_iso_code', 'vat_id', 'iban', 'bic',
+                   'registration_number')
+ITEM_FIELDS = ('row_number', 'item_name', 'quantity', 'price_without_tax', 'total_with_tax', 'total_without_tax',
+               'tax_rate', 'tax_rate_type', 'discount_percentage', 'discount_amount', 'unit', 'ean')
+ITEM_AMOUNT_FIELDS = ('quantity', 'price_without_tax', 'total_with_tax', 'total_without_tax', 'tax_rate',
+                      'discount_percentage', 'discount_amount')
+
+# CSV column of every item field
+ITEM_COLUMNS = {field: field if field.startswith('item_') else 'item_' + field for field in ITEM_FIELDS}
+
+
+class InputError(Exception):
+    """
+    The input file can't be read as JSONL or CSV records.
+    """
+
+
+class Converted:
+    """
+    Rendered files of a single invoice. Failed invoices have files set to None and error set to the traceback.
+    """
+    def __init__(self, name, item_count=0, files=None, error=None):
+        self.name = name
+        self.item_count = item_count
+        self.files = files
+        self.error = error
+
+
+def read_jsonl(fp):
+    """
+    :param fp: text file object
+    :return: generator of invoice records, read one line at a time
+    """
+    for line_number, line in enumerate(fp, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            yield json.loads(line, parse_float=Decimal)
+        except ValueError as e:
+            raise ValueError(f'line {line_number}: {e}')
+
+
+def read_csv(fp):
+    """
+    :param fp: text file object
+    :return: generator of invoice records, read one invoice at a time
+    """
+    for _, rows in groupby(csv.DictReader(fp), key=itemgetter('invoice_number')):
+        rows = [{column: value for column, value in row.items() if value != ''} for row in rows]
+        header = rows[0]
+
+        record = {field: header[field] for field in HEADER_FIELDS + HEADER_DATE_FIELDS + HEADER_AMOUNT_FIELDS
+                  if field in header}
+
+        for party in ('issuer', 'recipient'):
+            record[party] = {field: header[f'{party}_{field}'] for field in BUSINESS_FIELDS
+                             if f'{party}_{field}' in header}
+
+        record['items'] = [{field: row[column] for field, column in ITEM_COLUMNS.items() if column in row}
+                           for row in rows]
+
+        yield record
+
+
+def invoice_from_record(record):
+    """
+    Build an Invoice from a record read from JSONL or CSV input. See the module docstring for the fields.
+    """
+    header = {field: record.get(field) for field in HEADER_FIELDS if record.get(field) is not None}
+    header.update((field, _date(record.get(field))) for field in HEADER_DATE_FIELDS)
+    header.update((field, _decimal(record.get(field))) for field in HEADER_AMOUNT_FIELDS)
+
+    invoice = Invoice(issuer=_business(record.get('issuer')), recipient=_business(record.get('recipient')), **header)
+
+    for reference in record.get('reference_documents') or []:
+        invoice.add_reference_document(reference['document_number'], *_optional(reference, 'type_code'))
+
+    invoice.add_items_from_records({**item, **{field: _decimal(item[field])
+                                               for field in ITEM_AMOUNT_FIELDS if field in item}}
+                                   for item in record.get('items') or [])
+
+    if record.get('tax_summaries'):
+        for summary in record['tax_summaries']:
+            invoice.add_tax_summary(_decimal(summary['tax_rate']), _decimal(summary['tax_base']),
+                                    _decimal(summary['tax_amount']), *_optional(summary, 'tax_type'))
+    else:
+        invoice.finalize_totals()
+
+    return invoice
+
+
+def convert(record, v2=True, signing_context=None, envelope=False, sender_bic=None, recipient_bic=None,
+            validate=False, name=None):
+    """
+    Render the files of a single invoice record.
+    :param name: name of the output directory, defaults to output_name(record)
+    :return: Converted
+    """
+    name = name or output_name(record)
+
+    try:
+        invoice = invoice_from_record(record)
+        xml = invoice.render_xml_bytes(v2=v2, signing_context=signing_context, validate=validate)
+        files = [(INVOICE_FILENAME, xml)]
+
+        if envelope:
+            files.append((ENVELOPE_FILENAME, invoice.render_envelope_bytes(sender_bic=sender_bic,
+                                                                           recipient_bic=recipient_bic,
+                                                                           xml=xml, validate=validate)))
+
+        return Converted(name, len(invoice.document_items), files)
+    except Exception:
+        return Converted(name, error=traceback.format_exc())
+
+
+def convert_many(records, workers=None, chunksize=16, **options):
+    """
+    Convert records across a pool of worker processes.
+
+    Records are read lazily and sent to the workers in chunks, with at most two chunks per worker in flight, so
+    memory stays bounded for any input size. Results are yielded as they finish. Records are named with unique_names.
+
+    :param records: iterable of invoice records
+    :param workers: number of worker processes, defaults to the number of CPUs. 1 converts in the current process.
+    :param chunksize: number of records sent to a worker at once
+    :param options: see convert
+    :return: generator of Converted objects
+    """
+    return map_chunks(_convert, unique_names(records), workers, chunksize, ordered=False, options=options,
+                      on_error=_convert_error)
+
+
+def output_name(record):
+    """
+    Name of the directory holding the files of the invoice, see bundle.bundle_name.
+    """
+    return bundle_name(record.get('invoice_number'))
+
+
+def unique_names(records):
+    """
+    :param records: iterable of invoice records
+    :return: generator of (name, record) tuples. Records with an output_name that came up before get the first free
+             name of <name>_2, <name>_3 and so on, like bundle.write_bundles.
+    """
+    names = set()
+
+    for record in records:
+        name = output_name(record)
+        unique, number = name, 1
+
+        while unique in names:
+            number += 1
+            unique = f'{name}_{number}'
+
+        names.add(unique)
+        yield unique, record
+
+
+class DirectoryOutput:
+    """
+    Writes files to <path>/<name>/<filename>. Every file is written to a temporary file first and renamed, so
+    interrupted runs don't leave partial files behind.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def exists(self, name, filename):
+        return os.path.exists(os.path.join(self.path, name, filename))
+
+    def write(self, name, filename, data):
+        directory = os.path.join(self.path, name)
+        os.makedirs(directory, exist_ok=True)
+
+        path = os.path.join(directory, filename)
+
+        with open(path + '.tmp', 'wb') as fp:
+            fp.write(data)
+
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        pass
+
+
+class ArchiveOutput:
+    """
+    Writes files to <name>/<filename> in a ZIP archive.
+
+    The archive is written to a temporary file, which replaces the archive when it is closed. Files of an existing
+    archive are copied into it first, so an interrupted run leaves the previous archive intact. Raises InputError
+    when the existing archive is damaged.
+    """
+    def __init__(self, path, overwrite=False):
+        self.path = path
+        self.archive = zipfile.ZipFile(path + '.tmp', 'w', compression=zipfile.ZIP_DEFLATED)
+
+        if os.path.exists(path) and not overwrite:
+            try:
+                self._copy(path)
+            except zipfile.BadZipFile as e:
+                self.archive.close()
+                os.remove(path + '.tmp')
+                raise InputError(f'{path} is damaged, {e}. Remove it or use --overwrite to write a new archive')
+
+        self.names = set(self.archive.namelist())
+
+    def _copy(self, path):
+        with zipfile.ZipFile(path) as existing:
+            for info in existing.infolist():
+                with existing.open(info) as source, self.archive.open(info, 'w') as target:
+                    shutil.copyfileobj(source, target)
+
+    def exists(self, name, filename):
+        return f'{name}/{filename}' in self.names
+
+    def write(self, name, filename, data):
+        self.archive.writestr(f'{name}/{filename}', data)
+        self.names.add(f'{name}/{filename}')
+
+    def close(self):
+        self.archive.close()
+        os.replace(self.path + '.tmp', self.path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='eracun', description='Convert invoice records to e-Slog XML files.')
+    parser.add_argument('input', help='JSONL or CSV file, - for standard input')
+    parser.add_argument('-o', '--output', required=True, help='output directory, or a .zip archive')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='input format, defaults to the file extension')
+    parser.add_argument('--v1', action='store_true', help='render e-Slog 1.6.1 instead of 2.0')
+    parser.add_argument('--key', help='private key in PEM format used to sign the invoices')
+    parser.add_argument('--cert', help='certificate in PEM format used to sign the invoices')
+    parser.add_argument('--passphrase', help='passphrase of the private key')
+    parser.add_argument('--envelope', action='store_true', help='write an envelope for every invoice')
+    parser.add_argument('--sender-bic', help='see Invoice.render_envelope')
+    parser.add_argument('--recipient-bic', help='see Invoice.render_envelope')
+    parser.add_argument('--validate', action='store_true', help='validate the files against their XSD schemas')
+    parser.add_argument('--workers', type=int, help='number of worker processes, defaults to the number of CPUs')
+    parser.add_argument('--chunksize', type=int, default=16, help='number of invoices sent to a worker at once')
+    parser.add_argument('--overwrite', action='store_true', help='render invoices that were already written')
+    args = parser.parse_args(argv)
+
+    if bool(args.key) != bool(args.cert):
+        parser.error('--key and --cert are required together')
+
+    signing_context = None
+
+    if args.key:
+        with open(args.key, 'rb') as key, open(args.cert, 'rb') as cert:
+            passphrase = args.passphrase.encode('utf-8') if args.passphrase else None
+            signing_context = SigningContext(key.read(), cert.read(), passphrase)
+
+    input_format = args.format or ('csv' if args.input.lower().endswith('.csv') else 'jsonl')
+
+    try:
+        if args.output.lower().endswith('.zip'):
+            output = ArchiveOutput(args.output, args.overwrite)
+        else:
+            output = DirectoryOutput(args.output)
+    except InputError as e:
+        parser.exit(2, f'eracun: {e}\n')
+
+    # Invoices are done when their last file was written
+    last_filename = ENVELOPE_FILENAME if args.envelope else INVOICE_FILENAME
+
+    fp = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8')
+    stats = {'converted': 0, 'skipped': 0, 'failed': 0, 'items': 0, 'bytes': 0}
+    started = time.perf_counter()
+
+    def pending(records):
+        for name, record in unique_names(records):
+            if not args.overwrite and output.exists(name, last_filename):
+                stats['skipped'] += 1
+                continue
+
+            yield name, record
+
+    try:
+        records = _read_records(read_csv(fp) if input_format == 'csv' else read_jsonl(fp))
+
+        for converted in map_chunks(_convert, pending(records), args.workers, args.chunksize, ordered=False,
+                                    options=dict(v2=not args.v1, signing_context=signing_context,
+                                                 envelope=args.envelope, sender_bic=args.sender_bic,
+                                                 recipient_bic=args.recipient_bic, validate=args.validate),
+                                    on_error=_convert_error):
+            if converted.error:
+                stats['failed'] += 1
+                print(f'{converted.name} failed\n{converted.error}', file=sys.stderr)
+                continue
+
+            for filename, data in converted.files:
+                output.write(converted.name, filename, data)
+                stats['bytes'] += len(data)
+
+            stats['converted'] += 1
+            stats['items'] += converted.item_count
+    except InputError as e:
+        parser.exit(2, f'eracun: invalid input, {e}\n')
+    finally:
+        output.close()
+
+        if fp is not sys.stdin:
+            fp.close()
+
+    elapsed = time.perf_counter() - started
+
+    print(f"{stats['converted']} converted, {stats['skipped']} skipped, {stats['failed']} failed in {elapsed:.2f} s, "
+          f"{stats['converted'] / elapsed:.1f} invoices/s, {stats['items'] / elapsed:.0f} items/s, "
+          f"{stats['bytes'] / elapsed / 1024 / 1024:.2f} MB/s", file=sys.stderr)
+
+    return 1 if stats['failed'] else 0
+
+
+def _convert(item, **options):
+    name, record = item
+
+    return convert(record, name=name, **options)
+
+
+def _convert_error(item, error):
+    name, _ = item
+
+    return Converted(name, error=error)
+
+
+def _read_records(records):
+    """
+    Records of the input, with errors reading them raised as InputError.
+    """
+    try:
+        yield from records
+    except (ValueError, KeyError, csv.Error) as e:
+        raise InputError(str(e) if not isinstance(e, KeyError) else f'missing column {e}')
+
+
+def _business(data):
+    if data is None:
+        return None
+
+    return Business(**{field: data.get(field) for field in BUSINESS_FIELDS})
+
+
+def _date(value):
+    if value is None or isinstance(value, date):
+        return value
+
+    return datetime.fromisoformat(value) if 'T' in value or ' ' in value else date.fromisoformat(value)
+
+
+def _decimal(value):
+    if value is None or isinstance(value, (Decimal, int)):
+        return value
+
+    return Decimal(str(value))
+
+
+def _optional(data, field):
+    return (data[field],) if data.get(field) is not None else ()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,18 +1,35 @@
-from decimal import Decimal
+"""
+Invoice, its parties and documents, and rendering them to XML.
+
+Modules needed only by some applications are imported inside the methods using them, so importing the package stays
+fast: validation is loaded only when validating, bundle (and zipfile) only when writing bundles and aio (and asyncio)
+only by the asynchronous methods.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from operator import itemgetter
 
 from lxml import etree
 
+from eracun_generator import instrumentation
 from eracun_generator.builder import build_xml
 from eracun_generator.definitions import construct_invoice_json
 from eracun_generator.definitionsV2 import construct_invoice_json as construct_invoice_jsonV2
-from eracun_generator.envelope.utils import convert_invoice_to_envelope
-from eracun_generator.utils import ds_tag, sign_invoice
+from eracun_generator.elements import construct_invoice_element
+from eracun_generator.elementsV2 import construct_invoice_element as construct_invoice_elementV2
+from eracun_generator.envelope.utils import convert_invoice_to_envelope, digest_attachments
+from eracun_generator.prototypes import construct_invoice_element as construct_invoice_prototype
+from eracun_generator.prototypesV2 import construct_invoice_element as construct_invoice_prototypeV2
+from eracun_generator.streaming import XML_DECLARATION, write_invoice_xml
+from eracun_generator.utils import SigningContext
 
 
 class Business:
     """
     Prepare Business object for Issuer and Recipient instances.
     """
+    __slots__ = ('name', 'address', 'city', 'zip_code', 'country', 'country_iso_code', 'iban', 'bic',
+                 'registration_number', 'vat_id')
+
     def __init__(self, name, address, city, zip_code, country, country_iso_code, vat_id, iban=None, bic=None, registration_number=None):
         self.name = name
         self.address = address
@@ -49,12 +66,21 @@ class ReferenceDocument:
     TYPE_SPECIFICATION_NUMBER = 'SZ'
     TYPE_ORDER_NUMBER_SUPPLIER = 'VN'
 
+    __slots__ = ('document_number', 'type_code')
+
     def __init__(self, document_number, type_code=TYPE_ORDER_NUMBER):
         self.document_number = document_number
         self.type_code = type_code
 
 
 class InvoiceItem:
+    __slots__ = ('row_number', 'item_name', 'quantity', 'price_without_tax', 'total_with_tax', 'total_without_tax',
+                 'tax_rate', 'tax_rate_type', 'discount_percentage', 'discount_amount', 'unit', 'ean')
+
+    # Same for every item
+    item_description_code = 'F'
+    quantity_type = '47'
+
     def __init__(self,
                  row_number,
                  item_name,
@@ -85,11 +111,80 @@ class InvoiceItem:
         self.unit = unit
         self.ean = ean
 
-        self.item_description_code = 'F'
-        self.quantity_type = '47'
+
+ITEM_REQUIRED_FIELDS = ('item_name', 'quantity', 'price_without_tax', 'total_with_tax', 'total_without_tax', 'tax_rate')
+
+# Defaults of the optional add_item arguments
+ITEM_DEFAULTS = (('tax_rate_type', 'S'), ('discount_percentage', None), ('discount_amount', None), ('unit', 'PCE'),
+                 ('ean', None))
+
+
+class ItemColumns:
+    """
+    Column oriented store of invoice items.
+
+    Every InvoiceItem field is kept in its own list, so an item costs one reference per field instead of an object.
+    Iterating yields a single InvoiceItem that is refilled with the values of every row - read what you need before
+    advancing and don't keep references to it. Indexing returns a new InvoiceItem.
+    """
+    __slots__ = InvoiceItem.__slots__
+
+    def __init__(self):
+        for field in self.__slots__:
+            setattr(self, field, [])
+
+    def __len__(self):
+        return len(self.row_number)
+
+    def __iter__(self):
+        item = InvoiceItem.__new__(InvoiceItem)
+        columns = [getattr(self, field) for field in self.__slots__]
+
+        for values in zip(*columns):
+            (item.row_number, item.item_name, item.quantity, item.price_without_tax, item.total_with_tax,
+             item.total_without_tax, item.tax_rate, item.tax_rate_type, item.discount_percentage, item.discount_amount,
+             item.unit, item.ean) = values
+
+            yield item
+
+    def __getitem__(self, index):
+        item = InvoiceItem.__new__(InvoiceItem)
+
+        for field in self.__slots__:
+            setattr(item, field, getattr(self, field)[index])
+
+        return item
+
+    def add(self, row_number, item_name, quantity, price_without_tax, total_with_tax, total_without_tax, tax_rate,
+            tax_rate_type='S', discount_percentage=None, discount_amount=None, unit='PCE', ean=''):
+        self.row_number.append(row_number)
+        self.item_name.append(item_name)
+        self.quantity.append(quantity)
+        self.price_without_tax.append(price_without_tax)
+        self.total_with_tax.append(total_with_tax)
+        self.total_without_tax.append(total_without_tax)
+        self.tax_rate.append(tax_rate)
+        self.tax_rate_type.append(tax_rate_type)
+        self.discount_percentage.append(discount_percentage)
+        self.discount_amount.append(discount_amount)
+        self.unit.append(unit)
+        self.ean.append(ean)
+
+    def append(self, item):
+        for field in self.__slots__:
+            getattr(self, field).append(getattr(item, field))
+
+    def extend(self, columns):
+        """
+        :param columns: one sequence per field, in __slots__ order
+        """
+        for field, column in zip(self.__slots__, columns):
+            getattr(self, field).extend(column)
 
 
 class TaxSummary:
+    __slots__ = ('tax_rate', 'tax_amount', 'tax_base', 'tax_type')
+
     def __init__(self, tax_rate, tax_amount, tax_base, tax_type='S'):
         self.tax_rate = tax_rate
         self.tax_amount = tax_amount
@@ -130,6 +225,10 @@ class Invoice:
     LOCATION_ISSUED = '91'
     LOCATION_SALE = '162'
 
+    ENGINE_DICT = 'dict'
+    ENGINE_ELEMENT = 'element'
+    ENGINE_PROTOTYPE = 'prototype'
+
     def __init__(self,
                  issuer,  # Business object
                  recipient,  # Business object
@@ -151,7 +250,12 @@ class Invoice:
                  payment_type=PAYMENT_REQUIRED,
                  payment_purpose="GDSV",
                  additional_remittance_information=None,
-                 location_code=LOCATION_ISSUED):
+                 location_code=LOCATION_ISSUED,
+                 columnar_items=False):
+        """
+        :param columnar_items: keep items in an ItemColumns store instead of a list of InvoiceItem objects. Saves
+            memory on invoices with many items, but document_items then yields one reused InvoiceItem per row.
+        """
         # Business objects
         self.issuer = issuer
         self.recipient = recipient
@@ -190,17 +294,21 @@ class Invoice:
 
         self.reference_documents = []
 
-        self.document_items = []
+        self.document_items = ItemColumns() if columnar_items else []
 
         self.subtotal_net = Decimal('0')
 
+        # (tax_rate, tax_rate_type) -> [total without tax, total with tax] of the added items, see finalize_totals
+        self.tax_totals = {}
+
         self.tax_summaries = []
 
     def add_reference_document(self, reference_document_number, reference_type=ReferenceDocument.TYPE_ORDER_NUMBER):
         self.reference_documents.append(ReferenceDocument(reference_document_number, reference_type))
 
-    def add_tax_summary(self, tax_rate, tax_base, tax_amount):
-        self.tax_summaries.append(TaxSummary(tax_rate=tax_rate, tax_amount=tax_amount, tax_base=tax_base))
+    def add_tax_summary(self, tax_rate, tax_base, tax_amount, tax_type='S'):
+        self.tax_summaries.append(TaxSummary(tax_rate=tax_rate, tax_amount=tax_amount, tax_base=tax_base,
+                                             tax_type=tax_type))
 
     def add_item(self,
                  row_number,
@@ -213,72 +321,451 @@ class Invoice:
                  ean=None,
                  discount_percentage=None,
                  discount_amount=None,
-                 unit='PCE'):
-        self.document_items.append(InvoiceItem(row_number=row_number,
-                                               item_name=item_name,
-                                               quantity=quantity,
-                                               price_without_tax=price_without_tax,
-                                               total_with_tax=total_with_tax,
-                                               total_without_tax=total_without_tax,
-                                               tax_rate=tax_rate,
-                                               ean=ean,
-                                               discount_percentage=discount_percentage,
-                                               discount_amount=discount_amount,
-                                               unit=unit))
+                 unit='PCE',
+                 tax_rate_type='S'):
+        if isinstance(self.document_items, ItemColumns):
+            self.document_items.add(row_number=row_number,
+                                    item_name=item_name,
+                                    quantity=quantity,
+                                    price_without_tax=price_without_tax,
+                                    total_with_tax=total_with_tax,
+                                    total_without_tax=total_without_tax,
+                                    tax_rate=tax_rate,
+                                    tax_rate_type=tax_rate_type,
+                                    ean=ean,
+                                    discount_percentage=discount_percentage,
+                                    discount_amount=discount_amount,
+                                    unit=unit)
+        else:
+            self.document_items.append(InvoiceItem(row_number=row_number,
+                                                   item_name=item_name,
+                                                   quantity=quantity,
+                                                   price_without_tax=price_without_tax,
+                                                   total_with_tax=total_with_tax,
+                                                   total_without_tax=total_without_tax,
+                                                   tax_rate=tax_rate,
+                                                   tax_rate_type=tax_rate_type,
+                                                   ean=ean,
+                                                   discount_percentage=discount_percentage,
+                                                   discount_amount=discount_amount,
+                                                   unit=unit))
 
         self.subtotal_net = self.subtotal_net + total_without_tax
 
-    def render_envelope(self, attachments=None, sender_bic=None, recipient_bic=None):
+        totals = self.tax_totals.get((tax_rate, tax_rate_type))
+
+        if totals is None:
+            totals = self.tax_totals[(tax_rate, tax_rate_type)] = [Decimal('0'), Decimal('0')]
+
+        totals[0] += total_without_tax
+        totals[1] += total_with_tax
+
+    def add_items_from_columns(self,
+                               item_name,
+                               quantity,
+                               price_without_tax,
+                               total_with_tax,
+                               total_without_tax,
+                               tax_rate,
+                               row_number=None,
+                               tax_rate_type=None,
+                               discount_percentage=None,
+                               discount_amount=None,
+                               unit=None,
+                               ean=None):
+        """
+        Add items given as columns - one sequence or NumPy array per item field, in row order.
+
+        Column lengths are checked once and subtotal_net is updated in a single pass. Optional columns left out
+        get the add_item defaults and rows are numbered after the existing items when row_number is not given.
+        NumPy arrays are converted with tolist(), so use object arrays of Decimal to keep amounts exact.
+        """
+        columns = dict(item_name=item_name,
+                       quantity=quantity,
+                       price_without_tax=price_without_tax,
+                       total_with_tax=total_with_tax,
+                       total_without_tax=total_without_tax,
+                       tax_rate=tax_rate,
+                       row_number=row_number,
+                       tax_rate_type=tax_rate_type,
+                       discount_percentage=discount_percentage,
+                       discount_amount=discount_amount,
+                       unit=unit,
+                       ean=ean)
+
+        for field, column in columns.items():
+            if column is not None:
+                columns[field] = column.tolist() if hasattr(column, 'tolist') else list(column)
+
+        count = len(columns['item_name'])
+
+        for field, column in columns.items():
+            if column is not None and len(column) != count:
+                raise ValueError(f'Column {field} has {len(column)} values, expected {count}')
+
+        if columns['row_number'] is None:
+            first_row = len(self.document_items) + 1
+            columns['row_number'] = range(first_row, first_row + count)
+
+        for field, default in ITEM_DEFAULTS:
+            if columns[field] is None:
+                columns[field] = [default] * count
+
+        ordered = [columns[field] for field in InvoiceItem.__slots__]
+
+        if isinstance(self.document_items, ItemColumns):
+            self.document_items.extend(ordered)
+        else:
+            self.document_items.extend(InvoiceItem(*values) for values in zip(*ordered))
+
+        self.subtotal_net = sum(columns['total_without_tax'], self.subtotal_net)
+        self.add_tax_totals(columns['tax_rate'], columns['tax_rate_type'], columns['total_without_tax'],
+                            columns['total_with_tax'])
+
+    def add_tax_totals(self, tax_rates, tax_rate_types, totals_without_tax, totals_with_tax):
+        """
+        Add item totals given as columns to the running (tax_rate, tax_rate_type) aggregates.
+
+        When all items share one tax rate and type - the usual case - the columns are summed whole, otherwise they
+        are grouped by rate in a single pass first. New rates are added in the order they first appear, like add_item
+        does, so finalize_totals gives the same summaries.
+        """
+        keys = dict.fromkeys(zip(tax_rates, tax_rate_types))
+
+        if len(keys) == 1:
+            groups = {next(iter(keys)): (totals_without_tax, totals_with_tax)}
+        else:
+            groups = {key: ([], []) for key in keys}
+
+            for key, total_without_tax, total_with_tax in zip(zip(tax_rates, tax_rate_types), totals_without_tax,
+                                                              totals_with_tax):
+                group = groups[key]
+                group[0].append(total_without_tax)
+                group[1].append(total_with_tax)
+
+        for key, (group_without_tax, group_with_tax) in groups.items():
+            totals = self.tax_totals.get(key)
+
+            if totals is None:
+                totals = self.tax_totals[key] = [Decimal('0'), Decimal('0')]
+
+            totals[0] = sum(group_without_tax, totals[0])
+            totals[1] = sum(group_with_tax, totals[1])
+
+    def finalize_totals(self):
         """
-        Render envelope to be included with the eRacun.
+        Replace the tax summaries and invoice totals with the ones computed from the items.
+
+        Every (tax_rate, tax_rate_type) pair gets a tax summary with the sum of the item totals without tax as the
+        tax base and the sum of the item taxes as the tax amount, rounded half up to cents. A global discount
+        amount is spread over the tax rates in proportion to their base, with the rounding difference put on the
+        last one, so the tax bases add up to the discounted total without tax. Invoice totals are the sums of the
+        rounded summaries.
+
+        Items are aggregated as they are added, so this does not scan the items again.
+        """
+        cent = Decimal('0.01')
+
+        subtotal = sum((totals[0] for totals in self.tax_totals.values()), Decimal('0'))
+        discount = Decimal(str(self.global_discount_amount or 0))
+        remaining = (subtotal - discount).quantize(cent, ROUND_HALF_UP)
+        factor = (subtotal - discount) / subtotal if subtotal else Decimal('1')
+
+        self.tax_summaries = []
+
+        for i, ((tax_rate, tax_rate_type), (total_without_tax, total_with_tax)) in enumerate(self.tax_totals.items()):
+            if i == len(self.tax_totals) - 1:
+                tax_base = remaining
+            else:
+                tax_base = (total_without_tax * factor).quantize(cent, ROUND_HALF_UP)
+                remaining -= tax_base
+
+            tax_amount = ((total_with_tax - total_without_tax) * factor).quantize(cent, ROUND_HALF_UP)
+
+            self.tax_summaries.append(TaxSummary(tax_rate=tax_rate, tax_amount=tax_amount, tax_base=tax_base,
+                                                 tax_type=tax_rate_type))
+
+        taxes = sum((ts.tax_amount for ts in self.tax_summaries), Decimal('0.00'))
+
+        self.total_without_tax = sum((ts.tax_base for ts in self.tax_summaries), Decimal('0.00'))
+        self.total_with_tax = self.total_without_tax + taxes
+
+    def add_items_from_records(self, records):
+        """
+        Add items from an iterable of mappings with the add_item argument names, e.g. rows fetched as dicts from a
+        database cursor. Records are read once and added with add_items_from_columns. Records without a row_number
+        are numbered by their position.
+        """
+        defaults = dict(ITEM_DEFAULTS, row_number=None)
+        values = itemgetter(*InvoiceItem.__slots__)
+        rows = [values({**defaults, **record}) for record in records]
+
+        columns = dict(zip(InvoiceItem.__slots__, zip(*rows))) if rows else dict.fromkeys(InvoiceItem.__slots__, ())
+
+        first_row = len(self.document_items) + 1
+        columns['row_number'] = [row_number or position
+                                 for position, row_number in enumerate(columns['row_number'], start=first_row)]
+
+        self.add_items_from_columns(**columns)
+
+    def render_envelope(self, attachments=None, sender_bic=None, recipient_bic=None, xml=None, validate=False):
+        """
+        Render envelope to be included with the eRacun. See render_envelope_bytes for the arguments.
+        """
+        return self.render_envelope_bytes(attachments, sender_bic, recipient_bic, xml, validate).decode('utf-8')
+
+    def render_envelope_bytes(self, attachments=None, sender_bic=None, recipient_bic=None, xml=None, validate=False):
+        """
+        Render envelope to be included with the eRacun as UTF-8 encoded bytes.
 
         Every Envelope will have eRacun.xml as an attachment. It is recommended to
         include PDF invoice as an attachment as well.
 
-        To include attachment data in envelope pass in the attachment name and format. For example
+        To include attachment data in envelope pass in the attachment name, format and content as bytes, a path or
+        a binary file object. For example
 
-        attachments=[('invoice.pdf', 'PDF')]
+        attachments=[('invoice.pdf', 'PDF', '/path/to/invoice.pdf')]
+
+        Attachment sizes and the hash of all attachments are computed from their content, reading every file once.
+        The hash is only set when the rendered invoice is passed in as xml and the content of every attachment is
+        known. Passing the size in place of the content, as in ('invoice.pdf', 'PDF', 4096), is still supported, the
+        total size is then the sum of the sizes and the hash is left out. The total size is 0 when the size of an
+        attachment is not known, e.g. when xml is not passed in.
 
         :param attachments:
         :param sender_bic: Set to UJPLSI20ICL for DEV environment and UJPLSI2DICL for production environment if
                            the issuer is government budget user.
         :param recipient_bic: Set to UJPLSI20ICL for DEV environment and UJPLSI2DICL for production environment if
                               the recipient is government budget user.
+        :param xml: rendered invoice XML as returned by render_xml or render_xml_bytes, included as eRacun.xml
+        :param validate: validate the envelope against its XSD schema before it is serialized, raises
+                         lxml.etree.DocumentInvalid when it's not valid
         :return:
         """
-        if attachments is None:
-            attachments = []
-
-        attachments.insert(0, ('eRacun.xml', 'XML', 0))
-
-        return ("%s%s" % ('<?xml version="1.0" encoding="UTF-8"?>\n',
-                          etree.tostring(build_xml(convert_invoice_to_envelope(self, attachments, sender_bic, recipient_bic)),
-                                         pretty_print=True,
-                                         xml_declaration=False,
-                                         encoding="utf-8").decode('utf-8')))
-
-    def render_xml(self, key=None, cert=None, v2=True):
-        if v2:
-            xml_content = build_xml(construct_invoice_jsonV2(self))
-
-            if key and cert:
-                xml_content = sign_invoice(construct_invoice_jsonV2(self), key, cert)
-
-            return ("%s%s" % ('<?xml version="1.0" encoding="UTF-8"?>\n',
-                            etree.tostring(xml_content,
-                                            pretty_print=False,
-                                            xml_declaration=False,
-                                            method="c14n",
-                                            ).decode('utf-8')))
-        else :
-            xml_content = build_xml(construct_invoice_json(self))
-
-            if key and cert:
-                xml_content = sign_invoice(construct_invoice_json(self), key, cert)
-
-            return ("%s%s" % ('<?xml version="1.0" encoding="UTF-8"?>\n',
-                            etree.tostring(xml_content,
-                                            pretty_print=False,
-                                            xml_declaration=False,
-                                            method="c14n",
-                                            ).decode('utf-8')))
+        return XML_DECLARATION + self._render_envelope(attachments, sender_bic, recipient_bic, xml, validate)
+
+    def write_envelope(self, fp, attachments=None, sender_bic=None, recipient_bic=None, xml=None, validate=False):
+        """
+        Write the envelope to a binary file object. See render_envelope_bytes for the arguments.
+        """
+        fp.write(XML_DECLARATION)
+        fp.write(self._render_envelope(attachments, sender_bic, recipient_bic, xml, validate))
+
+    async def render_envelope_async(self, attachments=None, sender_bic=None, recipient_bic=None, xml=None,
+                                    validate=False, renderer=None):
+        """
+        Render the envelope in an executor, without blocking the event loop. See render_envelope_bytes for the
+        arguments.
+        :param renderer: AsyncRenderer, defaults to eracun_generator.aio.default_renderer
+        """
+        from eracun_generator import aio
+
+        envelope = await (renderer or aio.default_renderer).render_envelope_bytes(self, attachments, sender_bic,
+                                                                                  recipient_bic, xml, validate)
+        return envelope.decode('utf-8')
+
+    def _render_envelope(self, attachments, sender_bic, recipient_bic, xml, validate):
+        if isinstance(xml, str):
+            xml = xml.encode('utf-8')
+
+        stopwatch = instrumentation.stopwatch(len(self.document_items))
+
+        attachments = [('eRacun.xml', 'XML', xml)] + list(attachments or [])
+        attachments, attachments_hash, attachments_size = digest_attachments(attachments)
+
+        # The total size is only left out when the size of an attachment, usually the invoice XML, is not known
+        if attachments_size is None:
+            attachments_size = 0
+
+        if stopwatch:
+            stopwatch.lap('envelope.digest', attachments_size)
+
+        return self._serialize_envelope(attachments, attachments_hash, attachments_size, sender_bic, recipient_bic,
+                                        validate, stopwatch)
+
+    def _serialize_envelope(self, attachments, attachments_hash, attachments_size, sender_bic, recipient_bic,
+                            validate, stopwatch):
+        """
+        Construct, validate and serialize the envelope of attachments whose sizes and hash are known.
+        :param attachments: list of (filename, type, size) tuples, the invoice XML first
+        """
+        envelope_json = convert_invoice_to_envelope(self, attachments, sender_bic, recipient_bic, attachments_hash,
+                                                    attachments_size, cached_parties=True)
+
+        if stopwatch:
+            stopwatch.lap('envelope.construct')
+
+        envelope = build_xml(envelope_json)
+
+        if stopwatch:
+            stopwatch.lap('envelope.build')
+
+        if validate:
+            from eracun_generator.validation import validate_envelope
+
+            validate_envelope(envelope)
+
+            if stopwatch:
+                stopwatch.lap('envelope.validate')
+
+        envelope = etree.tostring(envelope,
+                                  pretty_print=True,
+                                  xml_declaration=False,
+                                  encoding="utf-8")
+
+        if stopwatch:
+            stopwatch.lap('envelope.serialize', len(envelope))
+
+        return envelope
+
+    def render_xml(self, key=None, cert=None, v2=True, engine=ENGINE_DICT, signing_context=None, validate=False):
+        """
+        Render the invoice XML, signed when key and cert or signing_context are given. See render_xml_bytes for
+        the arguments.
+        """
+        return self.render_xml_bytes(key, cert, v2, engine, signing_context, validate).decode('utf-8')
+
+    def render_xml_bytes(self, key=None, cert=None, v2=True, engine=ENGINE_DICT, signing_context=None, validate=False):
+        """
+        Render the invoice XML as UTF-8 encoded bytes, signed when key and cert or signing_context are given.
+
+        :param key: private key in PEM format
+        :param cert: certificate in PEM format
+        :param v2: set to False to use e-Slog v1.6.1
+        :param engine: ENGINE_DICT constructs the dict tree from definitions and converts it with build_xml.
+                       ENGINE_ELEMENT builds lxml elements directly and is about twice as fast on invoices
+                       with 1000 items. ENGINE_PROTOTYPE clones prebuilt segments and fills in their values, see
+                       eracun_generator.prototype, and is faster still. All of them produce identical XML.
+        :param signing_context: SigningContext to reuse the loaded key and certificate across invoices, used
+                                instead of key and cert.
+        :param validate: validate the built, and signed, tree against the e-Slog XSD schema before it is serialized,
+                         raises lxml.etree.DocumentInvalid when it's not valid. See eracun_generator.validation.
+        :return:
+        """
+        return XML_DECLARATION + self._render_xml(key, cert, v2, engine, signing_context, validate)
+
+    def write_xml(self, fp, key=None, cert=None, v2=True, engine=ENGINE_DICT, signing_context=None, validate=False):
+        """
+        Write the invoice XML to a binary file object. See render_xml_bytes for the arguments.
+
+        Unlike stream_xml the whole document is built first, so it can be signed.
+        """
+        fp.write(XML_DECLARATION)
+        fp.write(self._render_xml(key, cert, v2, engine, signing_context, validate))
+
+    async def render_xml_async(self, key=None, cert=None, v2=True, engine=ENGINE_DICT, signing_context=None,
+                               validate=False, renderer=None):
+        """
+        Render the invoice XML in an executor, without blocking the event loop. See render_xml_bytes for the
+        arguments.
+        :param renderer: AsyncRenderer with the executor and concurrency limit, defaults to
+                         eracun_generator.aio.default_renderer
+        """
+        from eracun_generator import aio
+
+        xml = await (renderer or aio.default_renderer).render_xml_bytes(self, key, cert, v2, engine, signing_context,
+                                                                        validate)
+        return xml.decode('utf-8')
+
+    def _render_xml(self, key, cert, v2, engine, signing_context, validate):
+        if signing_context is None and key and cert:
+            signing_context = SigningContext(key, cert)
+
+        stopwatch = instrumentation.stopwatch(len(self.document_items))
+        xml_content = self._construct_xml(v2, engine, stopwatch)
+
+        return self._serialize_xml(xml_content, v2, signing_context, validate, stopwatch)
+
+    def _construct_xml(self, v2, engine, stopwatch):
+        """
+        Build the unsigned invoice tree with the given engine.
+        """
+        if engine == self.ENGINE_PROTOTYPE:
+            xml_content = construct_invoice_prototypeV2(self) if v2 else construct_invoice_prototype(self)
+        elif engine == self.ENGINE_ELEMENT:
+            xml_content = construct_invoice_elementV2(self) if v2 else construct_invoice_element(self)
+        else:
+            construct_json = construct_invoice_jsonV2 if v2 else construct_invoice_json
+            invoice_json = construct_json(self, cached_parties=True)
+
+            if stopwatch:
+                stopwatch.lap('construct')
+
+            xml_content = build_xml(invoice_json)
+
+        if stopwatch:
+            stopwatch.lap('build')
+
+        return xml_content
+
+    def _serialize_xml(self, xml_content, v2, signing_context, validate, stopwatch):
+        """
+        Sign, validate and serialize the built invoice tree.
+        """
+        if signing_context:
+            # Sign the tree built above instead of constructing the invoice a second time
+            xml_content = signing_context.sign_invoice_element(xml_content)
+
+            if stopwatch:
+                stopwatch.lap('sign')
+
+        if validate:
+            from eracun_generator.validation import validate_invoice
+
+            validate_invoice(xml_content, v2)
+
+            if stopwatch:
+                stopwatch.lap('validate')
+
+        xml = etree.tostring(xml_content,
+                             pretty_print=False,
+                             xml_declaration=False,
+                             method="c14n",
+                             )
+
+        if stopwatch:
+            stopwatch.lap('serialize', len(xml))
+
+        return xml
+
+    def stream_xml(self, fp, v2=True, engine=ENGINE_DICT):
+        """
+        Write unsigned XML to a binary file object one segment at a time.
+
+        Output is identical to render_xml(v2=v2) encoded as UTF-8, but the whole document is never held in
+        memory, which keeps invoices with a very large number of items cheap to render.
+
+        :param fp: file object opened in binary mode
+        :param v2: set to False to use e-Slog v1.6.1
+        :param engine: ENGINE_DICT, ENGINE_ELEMENT or ENGINE_PROTOTYPE, see render_xml
+        :return:
+        """
+        write_invoice_xml(self, fp, v2=v2, engine=engine)
+
+    def write_bundle(self, fp, attachments=None, sender_bic=None, recipient_bic=None, v2=True, key=None, cert=None,
+                     signing_context=None, validate=False):
+        """
+        Write a ZIP archive with eRacun.xml, the attachments and envelope.xml to a binary file object.
+
+        Every member is written as it is produced and the envelope attachment sizes and hash are computed from the
+        bytes written, see render_envelope.
+
+        :param fp: binary file object, does not need to be seekable
+        :param attachments: list of (filename, type, source) tuples, where source is bytes, a path or a binary
+                            file object
+        :param sender_bic: see render_envelope
+        :param recipient_bic: see render_envelope
+        :param v2: set to False to use e-Slog v1.6.1
+        :param key: private key in PEM format
+        :param cert: certificate in PEM format
+        :param signing_context: SigningContext used instead of key and cert
+        :param validate: validate the invoice and envelope against their XSD schemas
+        :return:
+        """
+        if signing_context is None and key and cert:
+            signing_context = SigningContext(key, cert)
+
+        from eracun_generator.bundle import write_bundle
+
+        write_bundle(fp, self, attachments, v2=v2, signing_context=signing_context, sender_bic=sender_bic,
+                     recipient_bic=recipient_bic, validate=validate)
@@ -1,7 +1,24 @@
-import textwrap
+from eracun_generator.builder import build_xml
+from eracun_generator.cache import party_fragment
+from eracun_generator.formatting import format_amount, split_text
 
 
-def construct_invoice_json(invoice):
+def construct_invoice_json(invoice, cached_parties=False):
+    """
+    :param invoice:
+    :param cached_parties: give the issuer and buyer as {'_element': element} from the party cache instead of dicts,
+                           for callers converting the data with build_xml right away, see construct_cached_company_data
+    :return: dict tree of the invoice
+    """
+    data = construct_root_data()
+
+    for key, segment in construct_invoice_segments(invoice, cached_parties):
+        data['invoice'][key] = segment
+
+    return data
+
+
+def construct_root_data():
     NS = 'http://www.w3.org/2001/XMLSchema-instance'
 
     data = {
@@ -15,51 +32,63 @@ def construct_invoice_json(invoice):
         'invoice': {
             '_name': 'Racun',
             '_attrs': [('Id', 'data')],
-            'header': construct_header_data(invoice),
-            'date_issued': construct_date_data(invoice.date_issued_code, invoice.date_issued),
-            'date_of_service': construct_date_data(invoice.date_of_service_code, invoice.date_of_service),
-            'currency': construct_currency_data(invoice.currency),
-            'location': construct_location_data(invoice.location_code, invoice.location_address),
-            'issuer': construct_company_data(invoice.issuer, 'II'),
-            'buyer': construct_company_data(invoice.recipient, 'BY'),
-            'recipient': construct_company_data(invoice.recipient, 'IV'),
-            'payment_terms': construct_payment_terms_data(invoice.date_due_code, invoice.date_due),
-            'reference_data': construct_reference_data(invoice.total_with_tax, invoice.payment_reference),
-
         }  # end invoice
     }
 
+    return data
+
+
+def construct_invoice_segments(invoice, cached_parties=False):
+    """
+    Yield (key, segment) pairs of the Racun element in document order.
+
+    Items are constructed one at a time, so the segments can be serialized as they are produced.
+    :param invoice:
+    :param cached_parties: see construct_invoice_json
+    :return:
+    """
+    construct_company = construct_cached_company_data if cached_parties else construct_company_data
+
+    yield 'header', construct_header_data(invoice)
+    yield 'date_issued', construct_date_data(invoice.date_issued_code, invoice.date_issued)
+    yield 'date_of_service', construct_date_data(invoice.date_of_service_code, invoice.date_of_service)
+    yield 'currency', construct_currency_data(invoice.currency)
+    yield 'location', construct_location_data(invoice.location_code, invoice.location_address)
+    yield 'issuer', construct_company(invoice.issuer, 'II')
+    yield 'buyer', construct_company(invoice.recipient, 'BY')
+    yield 'recipient', construct_company(invoice.recipient, 'IV')
+    yield 'payment_terms', construct_payment_terms_data(invoice.date_due_code, invoice.date_due)
+    yield 'reference_data', construct_reference_data(invoice.total_with_tax, invoice.payment_reference)
+
     for i, reference_document in enumerate(invoice.reference_documents):
-        data['invoice'][f"reference_document_{i}"] = construct_reference_document_data(reference_document)
+        yield f"reference_document_{i}", construct_reference_document_data(reference_document)
 
     if invoice.global_discount_amount:
-        data['invoice']['global_discount'] = construct_global_discount_data(invoice.global_discount_amount, invoice.global_discount_percentage)
+        yield 'global_discount', construct_global_discount_data(invoice.global_discount_amount, invoice.global_discount_percentage)
 
     if invoice.intro_text:
-        data['invoice']['intro_text'] = construct_custom_text_data('AAI', 'GLAVA_TEKST', invoice.intro_text)
+        yield 'intro_text', construct_custom_text_data('AAI', 'GLAVA_TEKST', invoice.intro_text)
 
     for i, item in enumerate(invoice.document_items):
-        data['invoice'][f"item_{i}"] = construct_item_data(item)
+        yield f"item_{i}", construct_item_data(item)
 
     for i, ts in enumerate(invoice.tax_summaries):
-        data['invoice'][f"tax_summary_{i}"] = construct_tax_summary_data(ts)
+        yield f"tax_summary_{i}", construct_tax_summary_data(ts)
 
     # add final sums to invoice
     # Total without discount
-    data['invoice']['sums_without_discounts'] = construct_sums_data(amount=invoice.subtotal_net, sum_type='79')
+    yield 'sums_without_discounts', construct_sums_data(amount=invoice.subtotal_net, sum_type='79')
     # Discounts amount
-    data['invoice']['sums_discounts'] = construct_sums_data(amount=invoice.subtotal_net - invoice.total_without_tax, sum_type='53')
+    yield 'sums_discounts', construct_sums_data(amount=invoice.subtotal_net - invoice.total_without_tax, sum_type='53')
     # Tax base sums
-    data['invoice']['sums_tax_base_amount'] = construct_sums_data(amount=invoice.total_without_tax, sum_type='125')
+    yield 'sums_tax_base_amount', construct_sums_data(amount=invoice.total_without_tax, sum_type='125')
     # Taxes amount
-    data['invoice']['sums_taxes'] = construct_sums_data(amount=invoice.total_with_tax - invoice.total_without_tax, sum_type='176')
+    yield 'sums_taxes', construct_sums_data(amount=invoice.total_with_tax - invoice.total_without_tax, sum_type='176')
     # Total amount - with taxes
-    data['invoice']['sums_total_amount'] = construct_sums_data(amount=invoice.total_with_tax, sum_type='86')
+    yield 'sums_total_amount', construct_sums_data(amount=invoice.total_with_tax, sum_type='86')
 
     if invoice.outro_text:
-        data['invoice']['outro_text'] = construct_custom_text_data('AAI', 'DODATNI_TEKST', invoice.outro_text)
-
-    return data
+        yield 'outro_text', construct_custom_text_data('AAI', 'DODATNI_TEKST', invoice.outro_text)
 
 
 def construct_header_data(invoice):
@@ -138,6 +167,16 @@ def construct_location_data(location_code, location_address):
     return location
 
 
+def construct_cached_company_data(business, business_type='II'):
+    """
+    Company data as a prebuilt element from the party cache, see eracun_generator.cache.
+    """
+    element = party_fragment('v1', business, lambda: build_xml(construct_company_data(business, business_type)),
+                             business_type)
+
+    return {'_element': element}
+
+
 def construct_company_data(business, business_type='II'):
     data = {
         '_name': 'PodatkiPodjetja',
@@ -173,7 +212,7 @@ def construct_company_data(business, business_type='II'):
     }
 
     # Add business name
-    business_name_split = textwrap.wrap(business.name, 35, break_long_words=True)
+    business_name_split = split_text(business.name, 35, 4)
 
     for i, bn_part in enumerate(business_name_split):
         i = i + 1  # Start from 1
@@ -186,7 +225,7 @@ def construct_company_data(business, business_type='II'):
             break  # Stop at max length
 
     # Add business name
-    addr_split = textwrap.wrap(business.address, 35, break_long_words=True)
+    addr_split = split_text(business.address, 35, 4)
 
     for i, addr_part in enumerate(addr_split):
         i = i + 1  # Start from 1
@@ -280,7 +319,7 @@ def construct_reference_data(total_with_tax, payment_reference):
             },
             'amount': {
                 '_name': 'ZnesekRacuna',
-                '_value': str(total_with_tax)
+                '_value': format_amount(total_with_tax)
             }
         },
         'reference': {
@@ -329,7 +368,7 @@ def construct_global_discount_data(discount_amount, discount_percentage):
         },
         'amount': {
             '_name': 'ZnesekPopusta',
-            '_value': str(discount_amount)
+            '_value': format_amount(discount_amount)
         },
     }
 
@@ -344,7 +383,7 @@ def construct_custom_text_data(text_format, text_type, text):
     :param text:
     :return:
     """
-    text_split = textwrap.wrap(text, 70, break_long_words=True)
+    text_split = split_text(text, 70, 4)
 
     custom_text = {
         '_name': 'PoljubnoBesedilo',
@@ -424,7 +463,7 @@ def construct_item_data(item):
             },
             'amount': {
                 '_name': 'ZnesekPostavke',
-                '_value': "%.2f" % (item.price_without_tax * item.quantity)
+                '_value': format_amount(item.price_without_tax * item.quantity)
             }
         },
         'value_total': {
@@ -435,7 +474,7 @@ def construct_item_data(item):
             },
             'amount': {
                 '_name': 'ZnesekPostavke',
-                '_value': str(item.total_with_tax)
+                '_value': format_amount(item.total_with_tax)
             }
         },
         'price': {
@@ -455,7 +494,7 @@ def construct_item_data(item):
                 },
                 'vat_percentage': {
                     '_name': 'OdstotekDavkaPostavke',
-                    '_value': str(item.tax_rate)
+                    '_value': format_amount(item.tax_rate)
                 }
             },
             'tax_amounts_base': {
@@ -466,7 +505,7 @@ def construct_item_data(item):
                 },
                 'amount': {
                     '_name': 'Znesek',
-                    '_value': str(item.total_without_tax)
+                    '_value': format_amount(item.total_without_tax)
                 }
             },
             'tax_amounts_tax': {
@@ -477,7 +516,7 @@ def construct_item_data(item):
                 },
                 'amount': {
                     '_name': 'Znesek',
-                    '_value': str(item.total_with_tax - item.total_without_tax)
+                    '_value': format_amount(item.total_with_tax - item.total_without_tax)
                 }
             }
         }
@@ -504,7 +543,7 @@ def construct_item_data(item):
             },
             'amount': {
                 '_name': 'ZnesekOdstotka',
-                '_value': str(item.discount_amount)
+                '_value': format_amount(item.discount_amount)
             }
 
         }
@@ -523,7 +562,7 @@ def construct_tax_summary_data(tax_summary):
             },
             'tax_percentage': {
                 '_name': 'OdstotekDavka',
-                '_value': str(tax_summary.tax_rate)
+                '_value': format_amount(tax_summary.tax_rate)
             },
         },
         'amount_base': {
@@ -534,7 +573,7 @@ def construct_tax_summary_data(tax_summary):
             },
             'amount': {
                 '_name': 'ZnesekDavka',
-                '_value': str(tax_summary.tax_base)
+                '_value': format_amount(tax_summary.tax_base)
             }
         },
         'amount_tax': {
@@ -545,7 +584,7 @@ def construct_tax_summary_data(tax_summary):
             },
             'amount': {
                 '_name': 'ZnesekDavka',
-                '_value': str(tax_summary.tax_amount)
+                '_value': format_amount(tax_summary.tax_amount)
             }
         }
     }
@@ -564,7 +603,7 @@ def construct_sums_data(amount, sum_type, ref=None):
             },
             'amount': {
                 '_name': 'ZnesekRacuna',
-                '_value': "%.2f" % amount
+                '_value': format_amount(amount)
             }
         },
         'ref': {
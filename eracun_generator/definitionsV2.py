@@ -1,8 +1,26 @@
-import textwrap
 from decimal import Decimal
 
+from eracun_generator.builder import build_xml
+from eracun_generator.cache import party_fragment
+from eracun_generator.formatting import format_amount, split_text
 
-def construct_invoice_json(invoice):
+
+def construct_invoice_json(invoice, cached_parties=False):
+    """
+    :param invoice:
+    :param cached_parties: give the issuer and buyer as {'_element': element} from the party cache instead of dicts,
+                           for callers converting the data with build_xml right away, see construct_cached_company_data
+    :return: dict tree of the invoice
+    """
+    data = construct_root_data()
+
+    for key, segment in construct_invoice_segments(invoice, cached_parties):
+        data['invoice'][key] = segment
+
+    return data
+
+
+def construct_root_data():
     NS = 'http://www.w3.org/2001/XMLSchema-instance'
 
     data = {
@@ -20,58 +38,73 @@ def construct_invoice_json(invoice):
         'invoice': {
             '_name': 'M_INVOIC',
             '_attrs': [('Id', 'data')],
-            '_sorting': ['S_UNH', 'S_BGM', 'S_DTM', 'S_PAI', 'S_ALI', 'S_FTX', 'G_SG1', 'G_SG2', 'G_SG6', 'G_SG7',
-                         'G_SG8', 'G_SG9', 'G_SG12', 'G_SG14', 'G_SG16', 'G_SG24', 'G_SG26', 'S_UNS', 'S_CNT', 'G_SG50',
-                         'G_SG52', 'G_SG53', 'S_UNT'],
-            'document_header': construct_document_header_data(invoice),
-            'header': construct_header_data(invoice),
-            'date_issued': construct_date_data(invoice.date_issued_code, invoice.date_issued),
-            'date_of_service': construct_date_data(invoice.date_of_service_code, invoice.date_of_service),
-            'payment_type': construct_payment_type_data(invoice),
-            'payment_purpose': construct_payment_purpose_data(invoice),
-            'issuer': construct_company_data(invoice.issuer, 'SE'),
-            'buyer': construct_company_data(invoice.recipient, 'BY'),
-            # 'recipient': construct_company_data(invoice.recipient, 'IV'),
-            'currency': construct_currency_data(invoice.currency),
-            'payment_terms': construct_payment_terms_data(invoice.date_due_code, invoice.date_due),
-            'payment_data': construct_payment_data(invoice.total_with_tax)
         }  # end invoice
     }
 
+    return data
+
+
+def construct_invoice_segments(invoice, cached_parties=False):
+    """
+    Yield (key, segment) pairs of the M_INVOIC element in schema order:
+
+    S_UNH, S_BGM, S_DTM, S_PAI, S_ALI, S_FTX, G_SG1, G_SG2, G_SG6, G_SG7, G_SG8, G_SG9, G_SG12, G_SG14, G_SG16,
+    G_SG24, G_SG26, S_UNS, S_CNT, G_SG50, G_SG52, G_SG53, S_UNT
+
+    Items are constructed one at a time, so the segments can be serialized as they are produced.
+    :param invoice:
+    :param cached_parties: see construct_invoice_json
+    :return:
+    """
+    construct_company = construct_cached_company_data if cached_parties else construct_company_data
+
+    yield 'document_header', construct_document_header_data(invoice)
+    yield 'header', construct_header_data(invoice)
+    yield 'date_issued', construct_date_data(invoice.date_issued_code, invoice.date_issued)
+    yield 'date_of_service', construct_date_data(invoice.date_of_service_code, invoice.date_of_service)
+    yield 'payment_type', construct_payment_type_data(invoice)
+    yield 'payment_purpose', construct_payment_purpose_data(invoice)
+
+    if invoice.intro_text:
+        yield 'intro_text', construct_custom_text_data('GEN', invoice.intro_text)
+
+    if invoice.outro_text:
+        yield 'outro_text', construct_custom_text_data('GEN', invoice.outro_text)
+
     if invoice.payment_reference != None:
-        data['invoice']['payment_reference_data'] = construct_payment_reference_data(invoice.payment_reference)
+        yield 'payment_reference_data', construct_payment_reference_data(invoice.payment_reference)
 
     for i, reference_document in enumerate(invoice.reference_documents):
-        data['invoice'][f"reference_document_{i}"] = construct_reference_document_data(reference_document)
+        yield f"reference_document_{i}", construct_reference_document_data(reference_document)
 
-    if invoice.global_discount_amount:
-        data['invoice']['global_discount'] = construct_global_discount_data(invoice.global_discount_amount, invoice.global_discount_percentage)
+    yield 'issuer', construct_company(invoice.issuer, 'SE')
+    yield 'buyer', construct_company(invoice.recipient, 'BY')
+    # yield 'recipient', construct_company_data(invoice.recipient, 'IV')
+    yield 'currency', construct_currency_data(invoice.currency)
+    yield 'payment_terms', construct_payment_terms_data(invoice.date_due_code, invoice.date_due)
 
-    if invoice.intro_text:
-        data['invoice']['intro_text'] = construct_custom_text_data('GEN', invoice.intro_text)
+    if invoice.global_discount_amount:
+        yield 'global_discount', construct_global_discount_data(invoice.global_discount_amount, invoice.global_discount_percentage)
 
     for i, item in enumerate(invoice.document_items):
-        data['invoice'][f"item_{i}"] = construct_item_data(item)
+        yield f"item_{i}", construct_item_data(item)
 
-    for i, ts in enumerate(invoice.tax_summaries):
-        data['invoice'][f"tax_summary_{i}"] = construct_tax_summary_data(ts)
+    yield 'payment_data', construct_payment_data(invoice.total_with_tax)
 
     # add final sums to invoice
     # Total without discount
-    data['invoice']['sums_without_discounts'] = construct_sums_data(amount=invoice.subtotal_net, sum_type='79')
+    yield 'sums_without_discounts', construct_sums_data(amount=invoice.subtotal_net, sum_type='79')
     # Discounts amount
-    data['invoice']['sums_discounts'] = construct_sums_data(amount=invoice.subtotal_net - invoice.total_without_tax, sum_type='260')
+    yield 'sums_discounts', construct_sums_data(amount=invoice.subtotal_net - invoice.total_without_tax, sum_type='260')
     # Tax base sums
-    data['invoice']['sums_tax_base_amount'] = construct_sums_data(amount=invoice.total_without_tax, sum_type='389')
+    yield 'sums_tax_base_amount', construct_sums_data(amount=invoice.total_without_tax, sum_type='389')
     # Taxes amount
-    data['invoice']['sums_taxes'] = construct_sums_data(amount=invoice.total_with_tax - invoice.total_without_tax, sum_type='176')
+    yield 'sums_taxes', construct_sums_data(amount=invoice.total_with_tax - invoice.total_without_tax, sum_type='176')
     # Total amount - with taxes
-    data['invoice']['sums_total_amount'] = construct_sums_data(amount=invoice.total_with_tax, sum_type='388')
+    yield 'sums_total_amount', construct_sums_data(amount=invoice.total_with_tax, sum_type='388')
 
-    if invoice.outro_text:
-        data['invoice']['outro_text'] = construct_custom_text_data('GEN', invoice.outro_text)
-
-    return data
+    for i, ts in enumerate(invoice.tax_summaries):
+        yield f"tax_summary_{i}", construct_tax_summary_data(ts)
 
 
 def construct_document_header_data(invoice):
@@ -224,6 +257,16 @@ def construct_location_data(location_code, location_address):  # does not transl
     return location
 
 
+def construct_cached_company_data(business, business_type='SE'):
+    """
+    Company data as a prebuilt element from the party cache, see eracun_generator.cache.
+    """
+    element = party_fragment('v2', business, lambda: build_xml(construct_company_data(business, business_type)),
+                             business_type)
+
+    return {'_element': element}
+
+
 def construct_company_data(business, business_type='SE'):
     data = {
         '_name': 'G_SG2',
@@ -256,7 +299,7 @@ def construct_company_data(business, business_type='SE'):
 
     # TODO: check if ok
     # Add business name
-    business_name_split = textwrap.wrap(business.name, 70, break_long_words=True)
+    business_name_split = split_text(business.name, 70, 4)
 
     for i, bn_part in enumerate(business_name_split):
         i = i + 1  # Start from 1
@@ -272,7 +315,7 @@ def construct_company_data(business, business_type='SE'):
             break  # Stop at max length
 
     # Add business address
-    addr_split = textwrap.wrap(business.address, 35, break_long_words=True)
+    addr_split = split_text(business.address, 35, 4)
 
     for i, addr_part in enumerate(addr_split):
         i = i + 1  # Start from 1
@@ -397,7 +440,7 @@ def construct_payment_data(total_with_tax):
                 },
                 'amount': {
                     '_name': 'D_5004',
-                    '_value': str(total_with_tax)
+                    '_value': format_amount(total_with_tax)
                 }
             }
         }
@@ -501,7 +544,7 @@ def construct_global_discount_data(discount_amount, discount_percentage):
                     },
                     'val': {
                         '_name': 'D_5004',
-                        '_value': str(discount_amount)
+                        '_value': format_amount(discount_amount)
                     }
                 }
             }
@@ -519,7 +562,7 @@ def construct_custom_text_data(text_format, text):
     :param text:
     :return:
     """
-    text_split = textwrap.wrap(text, 70, break_long_words=True)
+    text_split = split_text(text, 70, 5)
 
     custom_text = {
         '_name': 'S_FTX',
@@ -553,10 +596,16 @@ def construct_custom_text_data(text_format, text):
 
 
 def construct_item_data(item):
+    """
+    Segments are added in schema order:
+
+    S_LIN, S_PIA, S_IMD, S_MEA, S_QTY, S_ALI, S_DTM, S_GIN, S_QVR, S_FTX, G_SG27, G_SG28, G_SG29, G_SG31, G_SG33,
+    G_SG34, G_SG35, G_SG39, G_SG45, G_SG47
+    :param item:
+    :return:
+    """
     data = {
         '_name': 'G_SG26',
-        '_sorting': ['S_LIN', 'S_PIA', 'S_IMD', 'S_MEA', 'S_QTY', 'S_ALI', 'S_DTM', 'S_GIN', 'S_QVR', 'S_FTX', 'G_SG27',
-                     'G_SG28', 'G_SG29', 'G_SG31', 'G_SG33', 'G_SG34', 'G_SG35', 'G_SG39', 'G_SG45', 'G_SG47'],
         'info': {
             '_name': 'S_LIN',
             'row_num': {
@@ -608,7 +657,7 @@ def construct_item_data(item):
                     },
                     'amount': {
                         '_name': 'D_5004',
-                        '_value': "%.2f" % item.total_without_tax
+                        '_value': format_amount(item.total_without_tax)
                     }
                 }
             }
@@ -625,63 +674,7 @@ def construct_item_data(item):
                     },
                     'amount': {
                         '_name': 'D_5004',
-                        '_value': str(item.total_with_tax)
-                    }
-                }
-            }
-        },
-        'tax_info': {
-            '_name': 'G_SG34',
-            'taxes': {
-                '_name': 'S_TAX',
-                'id': {
-                    '_name': 'D_5283',
-                    '_value': '7'
-                },
-                'type': {
-                    '_name': 'C_C241',
-                    'value': {
-                        '_name': 'D_5153',
-                        '_value': 'VAT'
-                    }
-                },
-                'vat_percentage': {
-                    '_name': 'C_C243',
-                    'value': {
-                        '_name': 'D_5278',
-                        '_value': str(item.tax_rate)
-                    }
-                },
-                'tax_type': {
-                    '_name': 'D_5305',
-                    '_value': item.tax_rate_type
-                },
-            },
-            'tax_amounts_base': {
-                '_name': 'S_MOA',
-                'wrapper': {
-                    '_name': 'C_C516',
-                    'type': {
-                        '_name': 'D_5025',
-                        '_value': '125'
-                    },
-                    'amount': {
-                        '_name': 'D_5004',
-                        '_value': str(item.total_without_tax)
-                    }
-                }
-            },
-            'tax_amounts_tax': {
-                '_name': 'S_MOA',
-                'wrapper': {
-                    '_name': 'C_C516',
-                    'type': {
-                        '_name': 'D_5025',
-                        '_value': '124'
-                    },
-                    'amount': {
-                        '_name': 'D_5004',
-                        '_value': str(item.total_with_tax - item.total_without_tax)
+                        '_value': format_amount(item.total_with_tax)
                     }
                 }
             }
@@ -717,7 +710,7 @@ def construct_item_data(item):
                 },
                 'value': {
                     '_name': 'D_5118',
-                    '_value': "%.2f" % price_wo_tax
+                    '_value': format_amount(price_wo_tax)
                 },
                 'qty': {
                     '_name': 'D_5284',
@@ -757,6 +750,65 @@ def construct_item_data(item):
                 }
             }
         }
+
+    data['tax_info'] = {
+        '_name': 'G_SG34',
+        'taxes': {
+            '_name': 'S_TAX',
+            'id': {
+                '_name': 'D_5283',
+                '_value': '7'
+            },
+            'type': {
+                '_name': 'C_C241',
+                'value': {
+                    '_name': 'D_5153',
+                    '_value': 'VAT'
+                }
+            },
+            'vat_percentage': {
+                '_name': 'C_C243',
+                'value': {
+                    '_name': 'D_5278',
+                    '_value': format_amount(item.tax_rate)
+                }
+            },
+            'tax_type': {
+                '_name': 'D_5305',
+                '_value': item.tax_rate_type
+            },
+        },
+        'tax_amounts_base': {
+            '_name': 'S_MOA',
+            'wrapper': {
+                '_name': 'C_C516',
+                'type': {
+                    '_name': 'D_5025',
+                    '_value': '125'
+                },
+                'amount': {
+                    '_name': 'D_5004',
+                    '_value': format_amount(item.total_without_tax)
+                }
+            }
+        },
+        'tax_amounts_tax': {
+            '_name': 'S_MOA',
+            'wrapper': {
+                '_name': 'C_C516',
+                'type': {
+                    '_name': 'D_5025',
+                    '_value': '124'
+                },
+                'amount': {
+                    '_name': 'D_5004',
+                    '_value': format_amount(item.total_with_tax - item.total_without_tax)
+                }
+            }
+        }
+    }
+
+    if item.discount_percentage:
         data['discount'] = {
             '_name': 'G_SG39',
             'type': {
@@ -795,7 +847,7 @@ def construct_item_data(item):
                         },
                         'percentage': {
                             '_name': 'D_5004',
-                            '_value': str(item.discount_amount)
+                            '_value': format_amount(item.discount_amount)
                         }
                     }
                 }
@@ -825,7 +877,7 @@ def construct_tax_summary_data(tax_summary):
                 '_name': 'C_C243',
                 'tax_percentage': {
                     '_name': 'D_5278',
-                    '_value': str(tax_summary.tax_rate)
+                    '_value': format_amount(tax_summary.tax_rate)
                 }
             },
             'tax_type': {
@@ -843,7 +895,7 @@ def construct_tax_summary_data(tax_summary):
                 },
                 'amount': {
                     '_name': 'D_5004',
-                    '_value': str(tax_summary.tax_base)
+                    '_value': format_amount(tax_summary.tax_base)
                 }
             }
         },
@@ -857,7 +909,7 @@ def construct_tax_summary_data(tax_summary):
                 },
                 'amount': {
                     '_name': 'D_5004',
-                    '_value': str(tax_summary.tax_amount)
+                    '_value': format_amount(tax_summary.tax_amount)
                 }
             }
         }
@@ -879,7 +931,7 @@ def construct_sums_data(amount, sum_type):
                 },
                 'amount': {
                     '_name': 'D_5004',
-                    '_value': "%.2f" % amount
+                    '_value': format_amount(amount)
                 }
             }
         }
@@ -0,0 +1,336 @@
+"""
+Element engine for e-SLOG 1.6.1.
+
+Every construct_*_element function mirrors the construct_*_data function of the same name in definitions, but
+appends lxml elements to the parent directly instead of returning a dict for build_xml.
+"""
+from copy import deepcopy
+
+from lxml.etree import Element, SubElement
+
+from eracun_generator.cache import party_fragment
+from eracun_generator.formatting import format_amount, split_text
+
+
+def construct_invoice_element(invoice):
+    root = construct_root_element()
+
+    for _ in construct_invoice_segments(invoice, root[0]):
+        pass  # segments are appended to Racun as they are constructed
+
+    return root
+
+
+def construct_root_element():
+    NS = 'http://www.w3.org/2001/XMLSchema-instance'
+
+    root = Element('IzdaniRacunEnostavni', nsmap={
+        'ds': 'http://www.w3.org/2000/09/xmldsig#',
+        'xsd': 'http://uri.etsi.org/01903/v1.1.1#',
+        'xsi': NS
+    })
+    root.set("{%s}noNamespaceSchemaLocation" % NS, 'http://www.gzs.si/e-poslovanje/sheme/eSLOG_1-6_EnostavniRacun.xsd')
+
+    SubElement(root, 'Racun').set('Id', 'data')
+
+    return root
+
+
+def construct_invoice_segments(invoice, parent=None):
+    """
+    Yield the segment elements of Racun in document order.
+
+    Segments are appended to parent, or created as standalone elements when parent is None so they can be
+    serialized and released one at a time.
+    :param invoice:
+    :param parent: Racun element or None
+    :return:
+    """
+    yield construct_header_element(parent, invoice)
+    yield construct_date_element(parent, invoice.date_issued_code, invoice.date_issued)
+    yield construct_date_element(parent, invoice.date_of_service_code, invoice.date_of_service)
+    yield construct_currency_element(parent, invoice.currency)
+    yield construct_location_element(parent, invoice.location_code, invoice.location_address)
+    yield construct_cached_company_element(parent, invoice.issuer, 'II')
+    yield construct_cached_company_element(parent, invoice.recipient, 'BY')
+    yield construct_cached_company_element(parent, invoice.recipient, 'IV')
+    yield construct_payment_terms_element(parent, invoice.date_due_code, invoice.date_due)
+    yield construct_reference_element(parent, invoice.total_with_tax, invoice.payment_reference)
+
+    for reference_document in invoice.reference_documents:
+        yield construct_reference_document_element(parent, reference_document)
+
+    if invoice.global_discount_amount:
+        yield construct_global_discount_element(parent, invoice.global_discount_amount, invoice.global_discount_percentage)
+
+    if invoice.intro_text:
+        yield construct_custom_text_element(parent, 'AAI', 'GLAVA_TEKST', invoice.intro_text)
+
+    for item in invoice.document_items:
+        yield construct_item_element(parent, item)
+
+    for ts in invoice.tax_summaries:
+        yield construct_tax_summary_element(parent, ts)
+
+    # add final sums to invoice
+    # Total without discount
+    yield construct_sums_element(parent, amount=invoice.subtotal_net, sum_type='79')
+    # Discounts amount
+    yield construct_sums_element(parent, amount=invoice.subtotal_net - invoice.total_without_tax, sum_type='53')
+    # Tax base sums
+    yield construct_sums_element(parent, amount=invoice.total_without_tax, sum_type='125')
+    # Taxes amount
+    yield construct_sums_element(parent, amount=invoice.total_with_tax - invoice.total_without_tax, sum_type='176')
+    # Total amount - with taxes
+    yield construct_sums_element(parent, amount=invoice.total_with_tax, sum_type='86')
+
+    if invoice.outro_text:
+        yield construct_custom_text_element(parent, 'AAI', 'DODATNI_TEKST', invoice.outro_text)
+
+
+def construct_header_element(parent, invoice):
+    header = _segment(parent, 'GlavaRacuna')
+    _text(header, 'VrstaRacuna', invoice.invoice_type)
+    _text(header, 'StevilkaRacuna', invoice.invoice_number)
+    _text(header, 'FunkcijaRacuna', invoice.invoice_function)
+    _text(header, 'NacinPlacila', invoice.payment_type)
+    _text(header, 'KodaNamena', invoice.payment_purpose)
+
+    return header
+
+
+def construct_date_element(parent, date_code, date):
+    element = _segment(parent, 'DatumiRacuna')
+    _text(element, 'VrstaDatuma', date_code)
+    _text(element, 'DatumRacuna', date.isoformat())
+
+    return element
+
+
+def construct_currency_element(parent, currency):
+    element = _segment(parent, 'Valuta')
+    _text(element, 'VrstaValuteRacuna', '2')
+    _text(element, 'KodaValute', currency)
+
+    return element
+
+
+def construct_location_element(parent, location_code, location_address):
+    element = _segment(parent, 'Lokacije')
+    _text(element, 'VrstaLokacije', location_code)
+    _text(element, 'NazivLokacije', location_address)
+
+    return element
+
+
+def construct_cached_company_element(parent, business, business_type='II'):
+    """
+    Copy of the company element from the party cache, shared with the dict engine, see eracun_generator.cache.
+    """
+    element = deepcopy(party_fragment('v1', business, lambda: construct_company_element(None, business, business_type),
+                                      business_type))
+
+    if parent is not None:
+        parent.append(element)
+
+    return element
+
+
+def construct_company_element(parent, business, business_type='II'):
+    element = _segment(parent, 'PodatkiPodjetja')
+
+    info = SubElement(element, 'NazivNaslovPodjetja')
+    _text(info, 'VrstaPartnerja', business_type)
+
+    # Add business name
+    name = SubElement(info, 'NazivPartnerja')
+
+    for i, bn_part in enumerate(split_text(business.name, 35, 4), start=1):
+        _text(name, f"NazivPartnerja{i}", bn_part)
+
+    # Add business address
+    address = SubElement(info, 'Ulica')
+
+    for i, addr_part in enumerate(split_text(business.address, 35, 4), start=1):
+        _text(address, f"Ulica{i}", addr_part)
+
+    _text(info, 'Kraj', business.city)
+    _text(info, 'NazivDrzave', business.country)
+    _text(info, 'PostnaStevilka', str(business.zip_code))
+    _text(info, 'KodaDrzave', business.country_iso_code)
+
+    if business.iban:
+        bank_account_info = SubElement(SubElement(element, 'FinancniPodatkiPodjetja'), 'BancniRacun')
+        _text(bank_account_info, 'StevilkaBancnegaRacuna', business.iban)
+        _text(bank_account_info, 'BIC', business.bic)
+
+    if business.vat_id:
+        _company_reference(element, 'VA', str(business.vat_id))
+
+    if business.registration_number:
+        _company_reference(element, 'GN', str(business.registration_number))
+
+    return element
+
+
+def construct_payment_terms_element(parent, date_due_code, date_due):
+    element = _segment(parent, 'PlacilniPogoji')
+    _text(SubElement(element, 'PodatkiORokih'), 'VrstaPogoja', '3')
+
+    term_due = SubElement(element, 'PlacilniRoki')
+    _text(term_due, 'VrstaDatumaPlacilnegaRoka', date_due_code)
+    _text(term_due, 'Datum', date_due.isoformat())
+
+    return element
+
+
+def construct_reference_element(parent, total_with_tax, payment_reference):
+    element = _segment(parent, 'PovzetekZneskovRacuna')
+
+    invoice_amounts = SubElement(element, 'ZneskiRacuna')
+    _text(invoice_amounts, 'VrstaZneska', '9')  # Amount to be paid
+    _text(invoice_amounts, 'ZnesekRacuna', format_amount(total_with_tax))
+
+    reference = SubElement(element, 'SklicZaPlacilo')
+    _text(reference, 'SklicPlacila', 'PQ')
+    _text(reference, 'StevilkaSklica', payment_reference)
+
+    return element
+
+
+def construct_reference_document_element(parent, reference_document):
+    element = _segment(parent, 'ReferencniDokumenti')
+    element.set('VrstaDokumenta', reference_document.type_code)
+    _text(element, 'StevilkaDokumenta', reference_document.document_number)
+
+    return element
+
+
+def construct_global_discount_element(parent, discount_amount, discount_percentage):
+    element = _segment(parent, 'GlobalniPopusti')
+    _text(element, 'OpisPopusta', 'SKUPNI POPUST')
+    _text(element, 'TipPopusta', 'PP')
+    _text(element, 'OdstotekPopusta', str(discount_percentage))
+    _text(element, 'ZnesekPopusta', format_amount(discount_amount))
+
+    return element
+
+
+def construct_custom_text_element(parent, text_format, text_type, text):
+    """
+    Text must be split into 70 chars long strings.
+    :param parent:
+    :param text_format: AAI or other predefined formats
+    :param text_type:
+    :param text:
+    :return:
+    """
+    custom_text = _segment(parent, 'PoljubnoBesedilo')
+    _text(custom_text, 'VrstaBesedila', text_format)
+
+    content = SubElement(custom_text, 'Besedilo')
+    _text(content, 'Tekst1', text_type)
+
+    # Since Tekst1 is used for text_type we must enumerate from 2 onwards - we can't place any more than Tekst5 in XML.
+    for i, txt in enumerate(split_text(text, 70, 4), start=2):
+        _text(content, f"Tekst{i}", txt)
+
+    return custom_text
+
+
+def construct_item_element(parent, item):
+    element = _segment(parent, 'PostavkeRacuna')
+    _text(SubElement(element, 'Postavka'), 'StevilkaVrstice', str(item.row_number))
+
+    description = SubElement(element, 'OpisiArtiklov')
+    _text(description, 'KodaOpisaArtikla', 'F')
+    _text(SubElement(description, 'OpisArtikla'), 'OpisArtikla1', item.item_name[:35])  # Only 35 chars...
+
+    quantity = SubElement(element, 'KolicinaArtikla')
+    _text(quantity, 'VrstaKolicine', item.quantity_type)
+    _text(quantity, 'Kolicina', str(item.quantity))
+    _text(quantity, 'EnotaMere', item.unit)
+
+    _item_amount(element, '203', format_amount(item.price_without_tax * item.quantity))  # Total before discount
+    _item_amount(element, '38', format_amount(item.total_with_tax))  # Total with discount
+
+    _text(SubElement(element, 'CenaPostavke'), 'Cena', str(item.price_without_tax))
+
+    tax_info = SubElement(element, 'DavkiPostavke')
+
+    taxes = SubElement(tax_info, 'DavkiNaPostavki')
+    _text(taxes, 'VrstaDavkaPostavke', 'VAT')
+    _text(taxes, 'OdstotekDavkaPostavke', format_amount(item.tax_rate))
+
+    for amount_type, amount in (('125', item.total_without_tax), ('124', item.total_with_tax - item.total_without_tax)):
+        tax_amounts = SubElement(tax_info, 'ZneskiDavkovPostavke')
+        _text(tax_amounts, 'VrstaZneskaDavkaPostavke', amount_type)
+        _text(tax_amounts, 'Znesek', format_amount(amount))
+
+    if item.discount_percentage:
+        discount = SubElement(element, 'OdstotkiPostavk')
+        _text(discount, 'Identifikator', 'A')  # Discount
+        _text(discount, 'VrstaOdstotkaPostavke', '12')  # Discount
+        _text(discount, 'OdstotekPostavke', str(item.discount_percentage))
+        _text(discount, 'VrstaZneskaOdstotka', '204')
+        _text(discount, 'ZnesekOdstotka', format_amount(item.discount_amount))
+
+    return element
+
+
+def construct_tax_summary_element(parent, tax_summary):
+    element = _segment(parent, 'PovzetekDavkovRacuna')
+
+    summary = SubElement(element, 'DavkiRacuna')
+    _text(summary, 'VrstaDavka', 'VAT')
+    _text(summary, 'OdstotekDavka', format_amount(tax_summary.tax_rate))
+
+    # Osnova, Tax amount
+    for amount_type, amount in (('125', tax_summary.tax_base), ('124', tax_summary.tax_amount)):
+        amounts = SubElement(element, 'ZneskiDavkov')
+        _text(amounts, 'VrstaZneskaDavka', amount_type)
+        _text(amounts, 'ZnesekDavka', format_amount(amount))
+
+    return element
+
+
+def construct_sums_element(parent, amount, sum_type, ref=None):
+    element = _segment(parent, 'PovzetekZneskovRacuna')
+
+    amounts = SubElement(element, 'ZneskiRacuna')
+    _text(amounts, 'VrstaZneska', str(sum_type))
+    _text(amounts, 'ZnesekRacuna', format_amount(amount))
+
+    reference = SubElement(element, 'SklicZaPlacilo')
+    _text(reference, 'SklicPlacila', 'PQ')
+
+    if ref is not None:
+        _text(reference, 'StevilkaSklica', ref)
+
+    return element
+
+
+def _segment(parent, tag):
+    if parent is None:
+        return Element(tag)
+
+    return SubElement(parent, tag)
+
+
+def _text(parent, tag, text):
+    element = SubElement(parent, tag)
+    element.text = text
+
+    return element
+
+
+def _item_amount(parent, amount_type, amount):
+    amounts = SubElement(parent, 'ZneskiPostavke')
+    _text(amounts, 'VrstaZneskaPostavke', amount_type)
+    _text(amounts, 'ZnesekPostavke', amount)
+
+
+def _company_reference(parent, reference_type, reference):
+    element = SubElement(parent, 'ReferencniPodatkiPodjetja')
+    _text(element, 'VrstaPodatkaPodjetja', reference_type)
+    _text(element, 'PodatekPodjetja', reference)
@@ -0,0 +1,389 @@
+"""
+Element engine for e-SLOG 2.0.
+
+Every construct_*_element function mirrors the construct_*_data function of the same name in definitionsV2, but
+appends lxml elements to the parent directly, in schema order, instead of returning a dict for build_xml.
+"""
+from copy import deepcopy
+from decimal import Decimal
+
+from lxml.etree import Element, SubElement
+
+from eracun_generator.cache import party_fragment
+from eracun_generator.formatting import format_amount, split_text
+
+
+def construct_invoice_element(invoice):
+    root = construct_root_element()
+
+    for _ in construct_invoice_segments(invoice, root[0]):
+        pass  # segments are appended to M_INVOIC as they are constructed
+
+    return root
+
+
+def construct_root_element():
+    NS = 'http://www.w3.org/2001/XMLSchema-instance'
+
+    root = Element('Invoice', nsmap={
+        'xs4xs': 'http://www.w3.org/2001/XMLSchema',
+        'in': 'http://uri.etsi.org/01903/v1.1.1#',
+        'ds': 'http://www.w3.org/2000/09/xmldsig#',
+        'xsi': NS
+    })
+    root.set('xmlns', 'urn:eslog:2.00')
+    root.set("{%s}noNamespaceSchemaLocation" % NS, 'http://www.roseslovenia.eu/e_files/news/eSLOG20_INVOIC_v200.xsd')
+
+    SubElement(root, 'M_INVOIC').set('Id', 'data')
+
+    return root
+
+
+def construct_invoice_segments(invoice, parent=None):
+    """
+    Yield the segment elements of M_INVOIC in schema order.
+
+    Segments are appended to parent, or created as standalone elements when parent is None so they can be
+    serialized and released one at a time.
+    :param invoice:
+    :param parent: M_INVOIC element or None
+    :return:
+    """
+    yield construct_document_header_element(parent, invoice)
+    yield construct_header_element(parent, invoice)
+    yield construct_date_element(parent, invoice.date_issued_code, invoice.date_issued)
+    yield construct_date_element(parent, invoice.date_of_service_code, invoice.date_of_service)
+    yield construct_payment_type_element(parent, invoice)
+    yield construct_payment_purpose_element(parent, invoice)
+
+    if invoice.intro_text:
+        yield construct_custom_text_element(parent, 'GEN', invoice.intro_text)
+
+    if invoice.outro_text:
+        yield construct_custom_text_element(parent, 'GEN', invoice.outro_text)
+
+    if invoice.payment_reference != None:
+        yield construct_payment_reference_element(parent, invoice.payment_reference)
+
+    for reference_document in invoice.reference_documents:
+        yield construct_reference_document_element(parent, reference_document)
+
+    yield construct_cached_company_element(parent, invoice.issuer, 'SE')
+    yield construct_cached_company_element(parent, invoice.recipient, 'BY')
+    yield construct_currency_element(parent, invoice.currency)
+    yield construct_payment_terms_element(parent, invoice.date_due_code, invoice.date_due)
+
+    if invoice.global_discount_amount:
+        yield construct_global_discount_element(parent, invoice.global_discount_amount, invoice.global_discount_percentage)
+
+    for item in invoice.document_items:
+        yield construct_item_element(parent, item)
+
+    yield construct_payment_element(parent, invoice.total_with_tax)
+
+    # add final sums to invoice
+    # Total without discount
+    yield construct_sums_element(parent, amount=invoice.subtotal_net, sum_type='79')
+    # Discounts amount
+    yield construct_sums_element(parent, amount=invoice.subtotal_net - invoice.total_without_tax, sum_type='260')
+    # Tax base sums
+    yield construct_sums_element(parent, amount=invoice.total_without_tax, sum_type='389')
+    # Taxes amount
+    yield construct_sums_element(parent, amount=invoice.total_with_tax - invoice.total_without_tax, sum_type='176')
+    # Total amount - with taxes
+    yield construct_sums_element(parent, amount=invoice.total_with_tax, sum_type='388')
+
+    for ts in invoice.tax_summaries:
+        yield construct_tax_summary_element(parent, ts)
+
+
+def construct_document_header_element(parent, invoice):
+    header = _segment(parent, 'S_UNH')
+    _text(header, 'D_0062', invoice.invoice_number[-14:])  # last 14 chars if longer...else whole string
+
+    data = SubElement(header, 'C_S009')
+    _text(data, 'D_0065', 'INVOIC')
+    _text(data, 'D_0052', 'D')
+    _text(data, 'D_0054', '01B')
+    _text(data, 'D_0051', 'UN')
+
+    return header
+
+
+def construct_header_element(parent, invoice):
+    header = _segment(parent, 'S_BGM')
+    _text(SubElement(header, 'C_C002'), 'D_1001', invoice.invoice_type)
+    _text(SubElement(header, 'C_C106'), 'D_1004', invoice.invoice_number)
+
+    return header
+
+
+def construct_payment_type_element(parent, invoice):
+    header = _segment(parent, 'S_FTX')
+    _text(header, 'D_4451', 'PAI')
+    _text(SubElement(header, 'C_C108'), 'D_4440', invoice.payment_type)
+
+    return header
+
+
+def construct_payment_purpose_element(parent, invoice):
+    header = _segment(parent, 'S_FTX')
+    _text(header, 'D_4451', 'ALQ')
+    _text(SubElement(header, 'C_C108'), 'D_4440', invoice.payment_purpose)
+
+    return header
+
+
+def construct_date_element(parent, date_code, date):
+    element = _segment(parent, 'S_DTM')
+    wrapper = SubElement(element, 'C_C507')
+    _text(wrapper, 'D_2005', date_code)
+    _text(wrapper, 'D_2380', date.strftime('%Y-%m-%d'))
+
+    return element
+
+
+def construct_currency_element(parent, currency):
+    element = _segment(parent, 'G_SG7')
+    wrapper = SubElement(SubElement(element, 'S_CUX'), 'C_C504')
+    _text(wrapper, 'D_6347', '2')
+    _text(wrapper, 'D_6345', currency)
+
+    return element
+
+
+def construct_cached_company_element(parent, business, business_type='SE'):
+    """
+    Copy of the company element from the party cache, shared with the dict engine, see eracun_generator.cache.
+    """
+    element = deepcopy(party_fragment('v2', business, lambda: construct_company_element(None, business, business_type),
+                                      business_type))
+
+    if parent is not None:
+        parent.append(element)
+
+    return element
+
+
+def construct_company_element(parent, business, business_type='SE'):
+    element = _segment(parent, 'G_SG2')
+
+    info = SubElement(element, 'S_NAD')
+    _text(info, 'D_3035', business_type)
+
+    # Add business name
+    name = SubElement(info, 'C_C080')
+
+    for i, bn_part in enumerate(split_text(business.name, 70, 4), start=1):
+        _text(name, 'D_3036' if i == 1 else f"D_3036_{i}", bn_part)
+
+    # Add business address
+    address = SubElement(info, 'C_C059')
+
+    for i, addr_part in enumerate(split_text(business.address, 35, 4), start=1):
+        _text(address, 'D_3042' if i == 1 else f"D_3042_{i}", addr_part)
+
+    _text(info, 'D_3164', business.city)
+    _text(info, 'D_3251', str(business.zip_code))
+    _text(info, 'D_3207', business.country_iso_code)
+
+    if business.iban:
+        financial_info = SubElement(element, 'S_FII')
+        _text(financial_info, 'D_3035', 'RB' if business_type == 'SE' else 'BB')  # RB - Receiving Bank or BB - Buyer Bank
+
+        bank_account_info = SubElement(financial_info, 'C_C078')
+        _text(bank_account_info, 'D_3194', business.iban)
+        _text(bank_account_info, 'D_3192', business.name[:34])
+
+        _text(SubElement(financial_info, 'C_C088'), 'D_3433', business.bic)
+
+    if business.vat_id:
+        _reference(element, 'G_SG3', 'AHP', str(business.vat_id))
+
+    if business.registration_number:
+        _reference(element, 'G_SG3', '0199', str(business.registration_number))
+
+    return element
+
+
+def construct_payment_terms_element(parent, date_due_code, date_due):
+    element = _segment(parent, 'G_SG8')
+    _text(SubElement(element, 'S_PAT'), 'D_4279', '1')
+
+    wrapper = SubElement(SubElement(element, 'S_DTM'), 'C_C507')
+    _text(wrapper, 'D_2005', date_due_code)
+    _text(wrapper, 'D_2380', date_due.strftime('%Y-%m-%d'))
+
+    return element
+
+
+def construct_payment_element(parent, total_with_tax):
+    element = _segment(parent, 'G_SG50')
+    _amount(element, '9', format_amount(total_with_tax))  # Amount to be paid
+
+    return element
+
+
+def construct_payment_reference_element(parent, payment_reference):
+    return _reference(parent, 'G_SG1', 'PQ', payment_reference)
+
+
+def construct_reference_document_element(parent, reference_document):
+    return _reference(parent, 'G_SG1', reference_document.type_code, reference_document.document_number)
+
+
+def construct_global_discount_element(parent, discount_amount, discount_percentage):
+    element = _segment(parent, 'G_SG16')
+
+    description = SubElement(element, 'S_ALC')
+    _text(description, 'D_5463', 'A')
+    wrapper = SubElement(description, 'C_C552')
+    _text(wrapper, 'D_1230', 'SKUPNI POPUST')
+    _text(wrapper, 'D_5189', '42')  # check if correct
+
+    wrapper = SubElement(SubElement(SubElement(element, 'G_SG19'), 'S_PCD'), 'C_C501')
+    _text(wrapper, 'D_5245', '1')
+    _text(wrapper, 'D_5482', str(discount_percentage) if discount_percentage else "")
+
+    _amount(SubElement(element, 'G_SG20'), '204', format_amount(discount_amount))
+
+    return element
+
+
+def construct_custom_text_element(parent, text_format, text):
+    """
+    Text must be split into 70 chars long strings.
+    :param parent:
+    :param text_format: AAI or other predefined formats
+    :param text:
+    :return:
+    """
+    custom_text = _segment(parent, 'S_FTX')
+    _text(custom_text, 'D_4451', text_format)
+
+    content = SubElement(custom_text, 'C_C108')
+
+    # We can't place any more than 5 text parts in XML.
+    for i, txt in enumerate(split_text(text, 70, 5), start=1):
+        _text(content, 'D_4440' if i == 1 else f"D_4440_{i}", txt)
+
+    return custom_text
+
+
+def construct_item_element(parent, item):
+    element = _segment(parent, 'G_SG26')
+
+    info = SubElement(element, 'S_LIN')
+    _text(info, 'D_1082', str(item.row_number))
+
+    if item.ean != None:
+        ean = SubElement(info, 'C_C212')
+        _text(ean, 'D_7140', str(item.ean))
+        _text(ean, 'D_7143', '0160')  # type ean
+
+    description = SubElement(element, 'S_IMD')
+    _text(description, 'D_7077', item.item_description_code)
+    _text(SubElement(description, 'C_C273'), 'D_7008', item.item_name[:35])  # Only 35 chars...
+
+    quantity = SubElement(SubElement(element, 'S_QTY'), 'C_C186')
+    _text(quantity, 'D_6063', item.quantity_type)
+    _text(quantity, 'D_6060', str(item.quantity))
+    _text(quantity, 'D_6411', item.unit)
+
+    # Line NET amount - including discounts and charges on line level
+    _amount(SubElement(element, 'G_SG27'), '203', format_amount(item.total_without_tax))
+    # Total before discount
+    _amount(SubElement(element, 'G_SG27'), '38', format_amount(item.total_with_tax))
+
+    price_wo_tax = item.price_without_tax
+    if item.discount_percentage:
+        price_wo_tax = price_wo_tax * Decimal(1 - (item.discount_percentage / 100))
+
+    _price(element, 'AAA', format_amount(price_wo_tax))
+
+    if item.discount_percentage:
+        _price(element, 'AAB', str(item.price_without_tax))
+
+    tax_info = SubElement(element, 'G_SG34')
+    _tax(tax_info, format_amount(item.tax_rate), item.tax_rate_type)
+    _amount(tax_info, '125', format_amount(item.total_without_tax))
+    _amount(tax_info, '124', format_amount(item.total_with_tax - item.total_without_tax))
+
+    if item.discount_percentage:
+        discount = SubElement(element, 'G_SG39')
+        _text(SubElement(discount, 'S_ALC'), 'D_5463', 'A')  # Discount
+
+        percentage = SubElement(SubElement(SubElement(discount, 'G_SG41'), 'S_PCD'), 'C_C501')
+        _text(percentage, 'D_5245', '1')  # Discount
+        _text(percentage, 'D_5482', str(item.discount_percentage))
+
+        _amount(SubElement(discount, 'G_SG42'), '204', format_amount(item.discount_amount))  # Discount
+
+    return element
+
+
+def construct_tax_summary_element(parent, tax_summary):
+    element = _segment(parent, 'G_SG52')
+    _tax(element, format_amount(tax_summary.tax_rate), tax_summary.tax_type)
+    _amount(element, '125', format_amount(tax_summary.tax_base))  # Osnova
+    _amount(element, '124', format_amount(tax_summary.tax_amount))  # Tax amount
+
+    return element
+
+
+def construct_sums_element(parent, amount, sum_type):
+    element = _segment(parent, 'G_SG50')
+    _amount(element, str(sum_type), format_amount(amount))
+
+    return element
+
+
+def _segment(parent, tag):
+    if parent is None:
+        return Element(tag)
+
+    return SubElement(parent, tag)
+
+
+def _text(parent, tag, text):
+    element = SubElement(parent, tag)
+    element.text = text
+
+    return element
+
+
+def _amount(parent, amount_type, amount):
+    """
+    S_MOA segment with C_C516 amount type and value.
+    """
+    wrapper = SubElement(SubElement(parent, 'S_MOA'), 'C_C516')
+    _text(wrapper, 'D_5025', amount_type)
+    _text(wrapper, 'D_5004', amount)
+
+
+def _price(parent, price_type, price):
+    wrapper = SubElement(SubElement(SubElement(parent, 'G_SG29'), 'S_PRI'), 'C_C509')
+    _text(wrapper, 'D_5125', price_type)
+    _text(wrapper, 'D_5118', price)
+    _text(wrapper, 'D_5284', '1')
+    _text(wrapper, 'D_6411', 'C62')
+
+
+def _tax(parent, tax_rate, tax_type):
+    taxes = SubElement(parent, 'S_TAX')
+    _text(taxes, 'D_5283', '7')
+    _text(SubElement(taxes, 'C_C241'), 'D_5153', 'VAT')
+    _text(SubElement(taxes, 'C_C243'), 'D_5278', tax_rate)
+    _text(taxes, 'D_5305', tax_type)
+
+
+def _reference(parent, group, reference_type, reference):
+    """
+    Segment group with S_RFF reference of the given type.
+    """
+    element = _segment(parent, group)
+    wrapper = SubElement(SubElement(element, 'S_RFF'), 'C_C506')
+    _text(wrapper, 'D_1153', reference_type)
+    _text(wrapper, 'D_1154', reference)
+
+    return element
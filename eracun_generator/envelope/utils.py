@@ -1,7 +1,23 @@
+import hashlib
+import os
+
 from datetime import datetime, timezone
 
+from eracun_generator.builder import build_xml
+from eracun_generator.cache import party_fragment
+from eracun_generator.formatting import format_amount
+
+CHUNK_SIZE = 1024 * 1024  # attachments are hashed 1 MB at a time
+
+
+def convert_invoice_to_envelope(invoice, attachments, sender_bic, recipient_bic, attachments_hash=None, attachments_size=0,
+                                cached_parties=False):
+    """
+    :param cached_parties: give the parties as {'_element': element} from the party cache instead of dicts, for
+                           callers converting the data with build_xml right away
+    """
+    party = _cached_party if cached_parties else _party
 
-def convert_invoice_to_envelope(invoice, attachments, sender_bic, recipient_bic):
     NS = 'http://www.w3.org/2001/XMLSchema-instance'
 
     envelope = {
@@ -10,8 +26,8 @@ def convert_invoice_to_envelope(invoice, attachments, sender_bic, recipient_bic)
             'xsi': NS,
             'xsd': 'http://www.w3.org/2001/XMLSchema',
         },
-        'sender': _construct_sender_receiver_data(invoice.issuer, 'sender', sender_bic),
-        'receiver': _construct_sender_receiver_data(invoice.recipient, 'receiver', recipient_bic),
+        'sender': party(_construct_sender_receiver_data, invoice.issuer, 'sender', sender_bic),
+        'receiver': party(_construct_sender_receiver_data, invoice.recipient, 'receiver', recipient_bic),
         'document_data': {
             '_name': 'doc_data',
             'type': {
@@ -41,15 +57,15 @@ def convert_invoice_to_envelope(invoice, attachments, sender_bic, recipient_bic)
                 '_name': 'payment_method',
                 '_value': invoice.payment_type
             },
-            'creditor': _construct_creditor_debtor_data(invoice.issuer, 'creditor'),
-            'debtor': _construct_creditor_debtor_data(invoice.recipient, 'debtor'),
+            'creditor': party(_construct_creditor_debtor_data, invoice.issuer, 'creditor'),
+            'debtor': party(_construct_creditor_debtor_data, invoice.recipient, 'debtor'),
             'execution_time': {
                 '_name': 'requested_execution_date',
                 '_value': invoice.date_issued.strftime('%Y-%m-%d')
             },
             'amount': {
                 '_name': 'amount',
-                '_value': str(invoice.total_with_tax)
+                '_value': format_amount(invoice.total_with_tax)
             },
             'currency': {
                 '_name': 'currency',
@@ -75,11 +91,11 @@ def convert_invoice_to_envelope(invoice, attachments, sender_bic, recipient_bic)
             '_name': 'attachments',
             'hash': {
                 '_name': 'hash',
-                '_value': '0000000000000000000000000000000000000000',
+                '_value': attachments_hash or '0000000000000000000000000000000000000000',
             },
             'size': {
                 '_name': 'size',
-                '_value': '0'
+                '_value': str(attachments_size)
             },
             'count': {
                 '_name': 'count',
@@ -108,6 +124,20 @@ def convert_invoice_to_envelope(invoice, attachments, sender_bic, recipient_bic)
     return envelope
 
 
+def _party(construct, entity, *args):
+    return construct(entity, *args)
+
+
+def _cached_party(construct, entity, *args):
+    """
+    Party data as a prebuilt element from the party cache, see eracun_generator.cache.
+    """
+    element = party_fragment(f'envelope.{construct.__name__}', entity, lambda: build_xml(construct(entity, *args)),
+                             *args)
+
+    return {'_element': element}
+
+
 def _construct_sender_receiver_data(entity, entity_type='sender', bic=None):
     data = {
         '_name': entity_type,
@@ -177,3 +207,62 @@ def _construct_creditor_debtor_data(entity,  entity_type='creditor'):
     }
 
     return data
+
+
+def digest_attachments(attachments):
+    """
+    Compute the size of every attachment and the SHA-1 hash and size of all attachments together.
+
+    Attachments are (filename, type) or (filename, type, source) tuples. Source is the attachment content as bytes,
+    a path or a binary file object, or just its size in bytes as an int or a string of digits. Strings are paths
+    unless they are all digits, pass a pathlib.Path for a file named only with digits. Paths and file objects are
+    read once, in chunks, and are never loaded whole. The hash covers the contents of all attachments in order and
+    is None when the content of any attachment is not available. Attachments without a source or with source None
+    have size 0 and make the total size unknown, None.
+
+    :param attachments:
+    :return: tuple of list of (filename, type, size) tuples, hex digest and total size
+    """
+    digest = hashlib.sha1()
+    hashed = True
+    sized = []
+    total_size = 0
+
+    for attachment in attachments:
+        filename, attachment_type = attachment[:2]
+        source = attachment[2] if len(attachment) > 2 else None
+
+        if source is None:
+            hashed = False
+            total_size = None
+            size = 0
+        elif isinstance(source, int) or isinstance(source, str) and source.isdigit():
+            hashed = False
+            size = int(source)
+        else:
+            size = 0
+
+            for chunk in iter_content(source):
+                digest.update(chunk)
+                size += len(chunk)
+
+        sized.append((filename, attachment_type, size))
+
+        if total_size is not None:
+            total_size += size
+
+    return sized, digest.hexdigest() if hashed else None, total_size
+
+
+def iter_content(source):
+    """
+    Yield the content of bytes, a path or a binary file object. Paths and file objects are read in chunks of
+    CHUNK_SIZE. Strings are always paths here, digest_attachments takes strings of digits as sizes before.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield source
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as fp:
+            yield from iter(lambda: fp.read(CHUNK_SIZE), b'')
+    else:
+        yield from iter(lambda: source.read(CHUNK_SIZE), b'')
@@ -0,0 +1,123 @@
+"""
+Formatting of amounts and texts for the e-Slog definitions and engines.
+"""
+import re
+import textwrap
+
+from decimal import Context, Decimal, ROUND_HALF_UP
+
+CENT = Decimal('0.01')
+
+# Independent of the current context, which applications may have changed, and wide enough for any amount
+_context = Context(prec=100, rounding=ROUND_HALF_UP)
+
+# Formatted ints and floats by value, e.g. tax rates like 22, 9.5 and 0 or amounts passed as floats
+CACHE_SIZE = 1024
+_cache = {}
+
+
+def format_amount(value):
+    """
+    Format the amount with two decimals, rounded half up.
+
+    Decimals are rounded exactly, "%.2f" converted them to float and rounded the binary value half even, so
+    Decimal('0.125') is now 0.13 instead of 0.12. Ints and floats are converted to Decimal from their shortest repr,
+    so float 1.005 is 1.01 like Decimal('1.005'), where "%.2f" gave 1.00.
+    :param value: Decimal, int or float
+    :return: str
+    """
+    if type(value) is Decimal:
+        # Hashing a Decimal costs more than formatting it, so Decimals are not cached
+        return str(value.quantize(CENT, ROUND_HALF_UP, _context))
+
+    try:
+        return _cache[value]
+    except KeyError:
+        pass
+
+    text = str(Decimal(str(value)).quantize(CENT, ROUND_HALF_UP, _context))
+
+    if value:  # -0.0 equals 0 as a key but is formatted as -0.00
+        if len(_cache) >= CACHE_SIZE:
+            _cache.clear()
+
+        _cache[value] = text
+
+    return text
+
+
+# Segments of texts by (text, width, count), company names, addresses and intro and outro texts repeat across invoices
+TEXT_CACHE_SIZE = 1024
+_text_cache = {}
+
+_chunks = re.compile(' +|[^ ]+')
+
+
+def split_text(text, width, count):
+    """
+    Split the text into at most count segments of at most width characters, for names, addresses and texts that
+    e-Slog spreads over numbered fields.
+
+    Segments are the first count lines of textwrap.wrap(text, width, break_long_words=True). Texts of printable
+    characters without hyphens, almost all of them, are split without textwrap and only up to the last segment kept,
+    the rest are wrapped with textwrap.
+    :param text: str
+    :param width: maximum length of a segment
+    :param count: maximum number of segments
+    :return: tuple of str
+    """
+    key = (text, width, count)
+
+    try:
+        return _text_cache[key]
+    except KeyError:
+        pass
+
+    if text.isprintable() and '-' not in text:
+        segments = _split_words(text, width, count)
+    else:
+        segments = tuple(textwrap.wrap(text, width, break_long_words=True)[:count])
+
+    if len(_text_cache) >= TEXT_CACHE_SIZE:
+        _text_cache.clear()
+
+    _text_cache[key] = segments
+
+    return segments
+
+
+def _split_words(text, width, count):
+    """
+    TextWrapper._wrap_chunks for text where the only whitespace is spaces and words can't be broken on hyphens. Words
+    and runs of spaces are read from the text only until the last segment is filled.
+    """
+    chunks = (match.group() for match in _chunks.finditer(text))
+    chunk = next(chunks, None)
+    segments = []
+
+    while chunk is not None and len(segments) < count:
+        # Spaces at the start of every segment but the first are dropped
+        if segments and not chunk.strip(' '):
+            chunk = next(chunks, None)
+
+        line = []
+        length = 0
+
+        while chunk is not None and length + len(chunk) <= width:
+            length += len(chunk)
+            line.append(chunk)
+            chunk = next(chunks, None)
+
+        # Fill the rest of the segment with the start of a word longer than a segment
+        if chunk is not None and len(chunk) > width:
+            space_left = width - length
+            line.append(chunk[:space_left])
+            chunk = chunk[space_left:]
+
+        if line and not line[-1].strip(' '):
+            del line[-1]
+
+        if line:
+            segments.append(''.join(line))
+
+    return tuple(segments)
@@ -0,0 +1,147 @@
+"""
+Per-stage timing of the render pipeline.
+
+Hooks are callables receiving (stage, duration, item_count, output_size) after every stage of Invoice.render_xml
+and Invoice.render_envelope. Durations are in seconds. output_size is the number of bytes written by serialize
+stages or hashed by envelope.digest and None otherwise.
+
+Render stages are construct, build, sign, validate and serialize. Envelope stages are envelope.digest,
+envelope.construct, envelope.build, envelope.validate and envelope.serialize.
+
+When no hook is installed the pipeline does not read the clock at all. Hooks are installed per process, so they
+don't see invoices rendered in render_many worker processes.
+"""
+from contextlib import contextmanager
+from time import perf_counter
+
+_hooks = []
+
+
+def add_hook(hook):
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+@contextmanager
+def installed(hook):
+    """
+    Install the hook for the duration of the with block.
+
+        with installed(StageAggregator()) as aggregator:
+            for invoice in invoices:
+                invoice.render_xml()
+
+        print(aggregator.summary())
+    """
+    add_hook(hook)
+
+    try:
+        yield hook
+    finally:
+        remove_hook(hook)
+
+
+def stopwatch(item_count):
+    """
+    Return a Stopwatch for one render when hooks are installed, otherwise None.
+    """
+    return Stopwatch(item_count) if _hooks else None
+
+
+class Stopwatch:
+    def __init__(self, item_count):
+        self.item_count = item_count
+        self.started = perf_counter()
+
+    def lap(self, stage, output_size=None):
+        """
+        Report the time since the previous lap as the duration of stage to every hook.
+        """
+        duration = perf_counter() - self.started
+
+        for hook in _hooks:
+            hook(stage, duration, self.item_count, output_size)
+
+        self.started = perf_counter()  # time spent in hooks is not part of the next stage
+
+
+class StageStats:
+    """
+    Duration histogram of a single stage with power of two microsecond buckets.
+
+    Bucket i counts durations from 2 ** (i - 1) up to 2 ** i microseconds.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.items = 0
+        self.output_size = 0
+        self.buckets = []
+
+    def add(self, duration, item_count=0, output_size=None):
+        bucket = int(duration * 1000000).bit_length()
+
+        if bucket >= len(self.buckets):
+            self.buckets.extend([0] * (bucket + 1 - len(self.buckets)))
+
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += duration
+        self.min = duration if self.min is None else min(self.min, duration)
+        self.max = duration if self.max is None else max(self.max, duration)
+        self.items += item_count or 0
+        self.output_size += output_size or 0
+
+    def percentile(self, percent):
+        """
+        Upper bound in seconds of the bucket holding the given percentile.
+        """
+        rank = percent / 100 * self.count
+        seen = 0
+
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+
+            if count and seen >= rank:
+                return min(2 ** bucket / 1000000, self.max)
+
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_s': self.total,
+            'mean_s': self.total / self.count if self.count else None,
+            'min_s': self.min,
+            'max_s': self.max,
+            'p50_s': self.percentile(50),
+            'p90_s': self.percentile(90),
+            'p99_s': self.percentile(99),
+            'items': self.items,
+            'output_size': self.output_size,
+            'histogram_us': {2 ** bucket: count for bucket, count in enumerate(self.buckets) if count},
+        }
+
+
+class StageAggregator:
+    """
+    Hook that accumulates a StageStats histogram for every stage over a batch of renders.
+    """
+    def __init__(self):
+        self.stages = {}
+
+    def __call__(self, stage, duration, item_count, output_size):
+        stats = self.stages.get(stage)
+
+        if stats is None:
+            stats = self.stages[stage] = StageStats()
+
+        stats.add(duration, item_count, output_size)
+
+    def summary(self):
+        return {stage: stats.summary() for stage, stats in self.stages.items()}
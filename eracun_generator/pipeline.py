@@ -0,0 +1,250 @@
+"""
+asyncio pipeline rendering, signing and sending many invoices.
+
+Every invoice goes through the stages
+
+    render    construct the invoice tree, see Invoice.render_xml for the engines
+    sign      sign the tree when a signing context is given, validate it when asked to and serialize it
+    envelope  render the envelope of the signed invoice, skipped unless envelope is set
+    sink      hand the invoice, its XML and envelope to the sink
+
+Stages are connected with bounded queues and every stage has its own number of workers, so the slow signing stage
+can be given more of them. When a stage falls behind its input queue fills up and the stages before it wait, down
+to reading the invoices, so memory stays bounded however slow the sink is.
+
+    async def sink(invoice, xml, envelope):
+        await storage.put(invoice.invoice_number, xml, envelope)
+
+    pipeline = Pipeline(sink, signing_context=signing_context, sign_workers=4)
+    summary = await pipeline.run(invoices)
+
+The render, sign and envelope stages, and sinks that are plain functions, run in a thread pool. Element trees are
+passed between the stages, so the executor can't be a process pool.
+"""
+import asyncio
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from time import perf_counter
+
+from eracun_generator.streaming import XML_DECLARATION
+
+# Put into the queue of a stage once per worker to stop them
+_DONE = object()
+
+
+class Job:
+    """
+    Invoice on its way through the pipeline. xml is the built tree after render and UTF-8 encoded bytes after sign.
+    """
+    __slots__ = ('invoice', 'xml', 'envelope')
+
+    def __init__(self, invoice):
+        self.invoice = invoice
+        self.xml = None
+        self.envelope = None
+
+
+class Stage:
+    """
+    Workers of a single pipeline stage with their input queue and statistics.
+    """
+    def __init__(self, name, function, workers, queue_size):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue = None
+
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.max_queue_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+
+    async def put(self, job):
+        """
+        Queue the job, waiting while the queue is full.
+        """
+        await self.queue.put(job)
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    async def get(self):
+        self._depth_total += self.queue.qsize()
+        self._depth_samples += 1
+
+        return await self.queue.get()
+
+    def summary(self, elapsed):
+        """
+        :param elapsed: duration of the pipeline run so far, in seconds
+        """
+        return {
+            'workers': self.workers,
+            'processed': self.processed,
+            'failed': self.failed,
+            'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+            'max_queue_depth': self.max_queue_depth,
+            'mean_queue_depth': self._depth_total / self._depth_samples if self._depth_samples else 0,
+            'busy_s': self.busy,
+            'invoices_per_s': self.processed / elapsed if elapsed else None,
+            'utilization': self.busy / (self.workers * elapsed) if elapsed else None,
+        }
+
+
+class Pipeline:
+    def __init__(self, sink, v2=True, engine='dict', signing_context=None, validate=False, envelope=False,
+                 attachments=None, sender_bic=None, recipient_bic=None, render_workers=1, sign_workers=1,
+                 envelope_workers=1, sink_workers=1, queue_size=8, executor=None):
+        """
+        :param sink: coroutine function or function called with (invoice, xml, envelope) for every invoice. xml and
+                     envelope are UTF-8 encoded bytes, envelope is None unless envelope is set.
+        :param v2: set to False to use e-Slog v1.6.1
+        :param engine: see Invoice.render_xml
+        :param signing_context: SigningContext used to sign every invoice
+        :param validate: validate invoices and envelopes against their XSD schemas
+        :param envelope: render an envelope for every invoice
+        :param attachments: function returning the attachments of an invoice, see Invoice.render_envelope_bytes
+        :param sender_bic: see Invoice.render_envelope_bytes
+        :param recipient_bic: see Invoice.render_envelope_bytes
+        :param render_workers: number of render workers
+        :param sign_workers: number of sign workers
+        :param envelope_workers: number of envelope workers
+        :param sink_workers: number of invoices handed to the sink at once
+        :param queue_size: maximum number of invoices waiting in front of every stage
+        :param executor: thread pool running the stages, by default one with a thread for every worker is created
+                         for every run
+        """
+        self.sink = sink
+        self.v2 = v2
+        self.engine = engine
+        self.signing_context = signing_context
+        self.validate = validate
+        self.attachments = attachments
+        self.sender_bic = sender_bic
+        self.recipient_bic = recipient_bic
+        self.executor = executor
+
+        self.stages = [
+            Stage('render', self._render, render_workers, queue_size),
+            Stage('sign', self._sign, sign_workers, queue_size),
+        ]
+
+        if envelope:
+            self.stages.append(Stage('envelope', self._envelope, envelope_workers, queue_size))
+
+        self.stages.append(Stage('sink', self._sink, sink_workers, queue_size))
+
+        # (invoice, stage name, formatted traceback) of every failed invoice
+        self.errors = []
+
+        self._started = None
+        self._finished = None
+        self._loop_executor = None
+
+    async def run(self, invoices):
+        """
+        Send the invoices through the pipeline. Invoices that fail in a stage are recorded in errors and don't stop
+        the run.
+        :param invoices: iterable or asynchronous iterable of Invoice objects
+        :return: summary, see summary
+        """
+        self._loop_executor = self.executor or ThreadPoolExecutor(sum(stage.workers for stage in self.stages))
+        self._started, self._finished = perf_counter(), None
+
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(stage.queue_size)
+
+        next_stages = self.stages[1:] + [None]
+        workers = [[asyncio.ensure_future(self._work(stage, next_stage)) for _ in range(stage.workers)]
+                   for stage, next_stage in zip(self.stages, next_stages)]
+
+        try:
+            if hasattr(invoices, '__aiter__'):
+                async for invoice in invoices:
+                    await self.stages[0].put(Job(invoice))
+            else:
+                for invoice in invoices:
+                    await self.stages[0].put(Job(invoice))
+
+            # Stop the stages in order, every one after the stage before it has passed on all invoices
+            for stage, stage_workers in zip(self.stages, workers):
+                for _ in stage_workers:
+                    await stage.queue.put(_DONE)
+
+                await asyncio.gather(*stage_workers)
+        finally:
+            for stage_workers in workers:
+                for worker in stage_workers:
+                    worker.cancel()
+
+            if self.executor is None:
+                self._loop_executor.shutdown(wait=False)
+
+            self._finished = perf_counter()
+
+        return self.summary()
+
+    def summary(self):
+        """
+        Statistics of every stage, also while the pipeline is running.
+        :return: dict with the elapsed time, number of failed invoices and a dict of stage name -> stage summary
+                 with the number of workers, processed and failed invoices, current, maximum and mean depth of the
+                 input queue, time spent working, throughput and utilization of the workers
+        """
+        if self._started is None:
+            elapsed = 0
+        else:
+            elapsed = (self._finished or perf_counter()) - self._started
+
+        return {
+            'elapsed_s': elapsed,
+            'failed': len(self.errors),
+            'stages': {stage.name: stage.summary(elapsed) for stage in self.stages},
+        }
+
+    async def _work(self, stage, next_stage):
+        while True:
+            job = await stage.get()
+
+            if job is _DONE:
+                return
+
+            started = perf_counter()
+
+            try:
+                await stage.function(job)
+            except Exception:
+                stage.failed += 1
+                self.errors.append((job.invoice, stage.name, traceback.format_exc()))
+                continue
+            finally:
+                stage.busy += perf_counter() - started
+
+            stage.processed += 1
+
+            if next_stage is not None:
+                await next_stage.put(job)
+
+    def _run(self, function, *args):
+        return asyncio.get_running_loop().run_in_executor(self._loop_executor, partial(function, *args))
+
+    async def _render(self, job):
+        job.xml = await self._run(job.invoice._construct_xml, self.v2, self.engine, None)
+
+    async def _sign(self, job):
+        xml = await self._run(job.invoice._serialize_xml, job.xml, self.v2, self.signing_context, self.validate, None)
+        job.xml = XML_DECLARATION + xml
+
+    async def _envelope(self, job):
+        attachments = self.attachments(job.invoice) if self.attachments else None
+        job.envelope = await self._run(job.invoice.render_envelope_bytes, attachments, self.sender_bic,
+                                       self.recipient_bic, job.xml, self.validate)
+
+    async def _sink(self, job):
+        if asyncio.iscoroutinefunction(self.sink):
+            await self.sink(job.invoice, job.xml, job.envelope)
+        else:
+            await self._run(self.sink, job.invoice, job.xml, job.envelope)
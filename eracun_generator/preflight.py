@@ -0,0 +1,212 @@
+"""
+Pre-flight checks of Invoice objects before rendering.
+
+Catches the data problems that get invoices rejected - values the renderers cut to fit the schema, invalid bank
+details, missing references and totals that don't add up - on the model objects alone, without building any XML.
+
+    issues = check_invoice(invoice)
+
+    for issue in issues:
+        print(issue.field, issue.code, issue.message)
+"""
+import re
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+
+from eracun_generator.formatting import split_text
+
+# Longest values the renderers write without cutting them
+NAME_LENGTH = 70  # envelope names and addresses, e-Slog 2.0 name parts
+ITEM_NAME_LENGTH = 35
+TEXT_WIDTH = 70
+TEXT_SEGMENTS = {True: 5, False: 4}  # segments of intro and outro text in e-Slog 2.0 and 1.6.1
+
+BIC_PATTERN = re.compile(r'[A-Z]{6}[A-Z0-9]{2}([A-Z0-9]{3})?$')
+IBAN_PATTERN = re.compile(r'[A-Z]{2}[0-9]{2}[A-Z0-9]{11,30}$')
+
+CENT = Decimal('0.01')
+
+MISSING = 'missing'
+TOO_LONG = 'too_long'
+INVALID = 'invalid'
+MISMATCH = 'mismatch'
+
+
+class Issue:
+    """
+    Problem with a single field. Items are referred to by their position, e.g. document_items[3].item_name.
+    """
+    __slots__ = ('field', 'code', 'message')
+
+    def __init__(self, field, code, message):
+        self.field = field
+        self.code = code
+        self.message = message
+
+    def __repr__(self):
+        return f'Issue({self.field!r}, {self.code!r}, {self.message!r})'
+
+
+def check_invoices(invoices, v2=True):
+    """
+    Check a batch of invoices.
+    :param invoices: iterable of Invoice objects
+    :param v2: set to False to check for e-Slog v1.6.1
+    :return: generator of (invoice, issues) tuples, issues is an empty list for invoices without problems
+    """
+    for invoice in invoices:
+        yield invoice, check_invoice(invoice, v2)
+
+
+def check_invoice(invoice, v2=True):
+    """
+    Check the invoice, its businesses, items and totals.
+    :param invoice:
+    :param v2: set to False to check for e-Slog v1.6.1
+    :return: list of Issue objects, empty when there are no problems
+    """
+    issues = []
+
+    for field in ('invoice_number', 'date_issued', 'date_of_service', 'date_due', 'currency'):
+        if not getattr(invoice, field):
+            issues.append(Issue(field, MISSING, f'{field} is required'))
+
+    if not invoice.payment_reference:
+        issues.append(Issue('payment_reference', MISSING, 'payment_reference is required'))
+
+    for field in ('intro_text', 'outro_text'):
+        text = getattr(invoice, field)
+
+        # Split the way the renderers do, words are not broken so fewer characters can fill all segments
+        if text and len(split_text(text, TEXT_WIDTH, TEXT_SEGMENTS[v2] + 1)) > TEXT_SEGMENTS[v2]:
+            issues.append(Issue(field, TOO_LONG, f'{field} needs more than {TEXT_SEGMENTS[v2]} lines of {TEXT_WIDTH} '
+                                                 f'characters and will be cut'))
+
+    for field in ('issuer', 'recipient'):
+        business = getattr(invoice, field)
+
+        if business is None:
+            issues.append(Issue(field, MISSING, f'{field} is required'))
+        else:
+            issues.extend(check_business(business, field))
+
+    issues.extend(check_items(invoice.document_items))
+    issues.extend(check_totals(invoice))
+
+    return issues
+
+
+def check_business(business, prefix='business'):
+    """
+    :param business:
+    :param prefix: name of the business in the field of the issues, e.g. issuer
+    :return: list of Issue objects
+    """
+    issues = []
+
+    for field in ('name', 'address', 'city', 'zip_code', 'country_iso_code'):
+        if not getattr(business, field):
+            issues.append(Issue(f'{prefix}.{field}', MISSING, f'{field} is required'))
+
+    for field in ('name', 'address'):
+        value = getattr(business, field)
+
+        if value and len(value) > NAME_LENGTH:
+            issues.append(Issue(f'{prefix}.{field}', TOO_LONG,
+                                f'{field} is longer than {NAME_LENGTH} characters and will be cut in the envelope'))
+
+    if business.iban and not valid_iban(business.iban):
+        issues.append(Issue(f'{prefix}.iban', INVALID, f'{business.iban} is not a valid IBAN'))
+
+    if business.bic and not BIC_PATTERN.match(business.bic):
+        issues.append(Issue(f'{prefix}.bic', INVALID, f'{business.bic} is not a valid BIC'))
+
+    if business.iban and not business.bic:
+        issues.append(Issue(f'{prefix}.bic', MISSING, 'bic is required with iban'))
+
+    return issues
+
+
+def check_items(items):
+    """
+    :param items: list of InvoiceItem objects or ItemColumns
+    :return: list of Issue objects
+    """
+    issues = []
+
+    # Read the name column of an ItemColumns store directly, without filling an item per row
+    names = getattr(items, 'item_name', None)
+
+    if names is None:
+        names = [item.item_name for item in items]
+
+    for i, name in enumerate(names):
+        if not name:
+            issues.append(Issue(f'document_items[{i}].item_name', MISSING, 'item_name is required'))
+        elif len(name) > ITEM_NAME_LENGTH:
+            issues.append(Issue(f'document_items[{i}].item_name', TOO_LONG,
+                                f'item_name is longer than {ITEM_NAME_LENGTH} characters and will be cut'))
+
+    return issues
+
+
+def check_totals(invoice):
+    """
+    Check that the item totals, tax summaries and invoice totals agree, to the cent.
+    :param invoice:
+    :return: list of Issue objects
+    """
+    issues = []
+
+    if invoice.total_without_tax is None or invoice.total_with_tax is None:
+        return [Issue(field, MISSING, f'{field} is required, see Invoice.finalize_totals')
+                for field in ('total_without_tax', 'total_with_tax') if getattr(invoice, field) is None]
+
+    total_without_tax = _cents(invoice.total_without_tax)
+    total_with_tax = _cents(invoice.total_with_tax)
+
+    expected = _cents(invoice.subtotal_net - _decimal(invoice.global_discount_amount or 0))
+
+    if total_without_tax != expected:
+        issues.append(Issue('total_without_tax', MISMATCH,
+                            f'{total_without_tax} does not match the items total less global discount {expected}'))
+
+    if invoice.tax_summaries:
+        tax_base = _cents(sum(_decimal(ts.tax_base) for ts in invoice.tax_summaries))
+        tax_amount = _cents(sum(_decimal(ts.tax_amount) for ts in invoice.tax_summaries))
+
+        if tax_base != total_without_tax:
+            issues.append(Issue('tax_summaries', MISMATCH,
+                                f'tax bases add up to {tax_base}, total_without_tax is {total_without_tax}'))
+
+        expected = total_without_tax + tax_amount
+
+        if total_with_tax != expected:
+            issues.append(Issue('total_with_tax', MISMATCH,
+                                f'{total_with_tax} is not total_without_tax plus taxes {expected}'))
+    else:
+        issues.append(Issue('tax_summaries', MISSING, 'at least one tax summary is required'))
+
+    return issues
+
+
+@lru_cache(maxsize=1024)
+def valid_iban(iban):
+    """
+    Check the format and the ISO 13616 mod 97 checksum of an IBAN without spaces.
+    """
+    if not IBAN_PATTERN.match(iban):
+        return False
+
+    # Move the country code and check digits to the end and replace letters with numbers, A = 10 ... Z = 35
+    digits = ''.join(str(int(char, 36)) for char in iban[4:] + iban[:4])
+
+    return int(digits) % 97 == 1
+
+
+def _decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _cents(value):
+    return _decimal(value).quantize(CENT, ROUND_HALF_UP)
@@ -0,0 +1,66 @@
+"""
+Prebuilt element templates cloned for every invoice.
+
+Most segments of an invoice have the same structure from one invoice to the next and differ only in a few values.
+A Prototype holds such a segment built once, with {name} placeholders in place of the values, and the positions of
+the placeholders as handles to its slots. Cloning copies the template in libxml2 and fills the slots, which is
+several times faster than creating every element again.
+
+    DATE = Prototype(date_template)  # builds S_DTM with {date_code} and {date} slots
+    DATE.clone(parent, (date_code, date.strftime('%Y-%m-%d')))
+
+Templates are built on the first clone, so importing the prototype engines stays cheap.
+"""
+from copy import deepcopy
+
+
+class Prototype:
+    def __init__(self, build, *args):
+        """
+        :param build: function returning the template, an element with the text of every variable element set to
+                      a {name} placeholder
+        :param args: arguments of build
+        """
+        self.build = build
+        self.args = args
+        self.template = None
+        self.positions = None
+        self.slots = None
+
+    def compile(self):
+        template = self.build(*self.args)
+        nodes = list(template.iter())
+
+        self.positions = tuple(i for i, node in enumerate(nodes) if _is_placeholder(node.text))
+        self.slots = tuple(nodes[i].text[1:-1] for i in self.positions)
+        self.template = template  # set last, clone relies on it to tell that the slots are known
+
+    def clone(self, parent=None, values=()):
+        """
+        Copy the template and fill its slots.
+        :param parent: element the copy is appended to, or None
+        :param values: text of every slot, in the order of self.slots
+        :return: the copy
+        """
+        if self.template is None:
+            self.compile()
+
+        if len(values) != len(self.positions):
+            raise ValueError(f'expected values for {self.slots}, got {len(values)}')
+
+        element = deepcopy(self.template)
+
+        if parent is not None:
+            parent.append(element)
+
+        if values:
+            nodes = list(element.iter())
+
+            for position, value in zip(self.positions, values):
+                nodes[position].text = value
+
+        return element
+
+
+def _is_placeholder(text):
+    return text is not None and len(text) > 2 and text[0] == '{' and text[-1] == '}'
@@ -0,0 +1,275 @@
+"""
+Prototype engine for e-SLOG 1.6.1.
+
+Every construct_*_element function mirrors the function of the same name in elements, but clones a prebuilt
+Prototype of the segment and fills in its values instead of creating every element. Segments whose structure
+depends on the data, companies, texts and the global discount, are constructed by elements.
+"""
+from lxml.etree import Element, SubElement
+
+from eracun_generator import elements
+from eracun_generator.elements import _item_amount, _text
+from eracun_generator.formatting import format_amount
+from eracun_generator.prototype import Prototype
+
+construct_cached_company_element = elements.construct_cached_company_element
+construct_custom_text_element = elements.construct_custom_text_element
+construct_global_discount_element = elements.construct_global_discount_element
+
+
+def construct_invoice_element(invoice):
+    root = construct_root_element()
+
+    for _ in construct_invoice_segments(invoice, root[0]):
+        pass  # segments are appended to Racun as they are constructed
+
+    return root
+
+
+def construct_root_element():
+    return ROOT.clone()
+
+
+def construct_invoice_segments(invoice, parent=None):
+    """
+    Yield the segment elements of Racun in document order, see elements.construct_invoice_segments.
+    """
+    yield construct_header_element(parent, invoice)
+    yield construct_date_element(parent, invoice.date_issued_code, invoice.date_issued)
+    yield construct_date_element(parent, invoice.date_of_service_code, invoice.date_of_service)
+    yield construct_currency_element(parent, invoice.currency)
+    yield construct_location_element(parent, invoice.location_code, invoice.location_address)
+    yield construct_cached_company_element(parent, invoice.issuer, 'II')
+    yield construct_cached_company_element(parent, invoice.recipient, 'BY')
+    yield construct_cached_company_element(parent, invoice.recipient, 'IV')
+    yield construct_payment_terms_element(parent, invoice.date_due_code, invoice.date_due)
+    yield construct_reference_element(parent, invoice.total_with_tax, invoice.payment_reference)
+
+    for reference_document in invoice.reference_documents:
+        yield construct_reference_document_element(parent, reference_document)
+
+    if invoice.global_discount_amount:
+        yield construct_global_discount_element(parent, invoice.global_discount_amount, invoice.global_discount_percentage)
+
+    if invoice.intro_text:
+        yield construct_custom_text_element(parent, 'AAI', 'GLAVA_TEKST', invoice.intro_text)
+
+    for item in invoice.document_items:
+        yield construct_item_element(parent, item)
+
+    for ts in invoice.tax_summaries:
+        yield construct_tax_summary_element(parent, ts)
+
+    yield construct_sums_element(parent, amount=invoice.subtotal_net, sum_type='79')
+    yield construct_sums_element(parent, amount=invoice.subtotal_net - invoice.total_without_tax, sum_type='53')
+    yield construct_sums_element(parent, amount=invoice.total_without_tax, sum_type='125')
+    yield construct_sums_element(parent, amount=invoice.total_with_tax - invoice.total_without_tax, sum_type='176')
+    yield construct_sums_element(parent, amount=invoice.total_with_tax, sum_type='86')
+
+    if invoice.outro_text:
+        yield construct_custom_text_element(parent, 'AAI', 'DODATNI_TEKST', invoice.outro_text)
+
+
+def construct_header_element(parent, invoice):
+    return HEADER.clone(parent, (invoice.invoice_type, invoice.invoice_number, invoice.invoice_function,
+                                 invoice.payment_type, invoice.payment_purpose))
+
+
+def construct_date_element(parent, date_code, date):
+    return DATE.clone(parent, (date_code, date.isoformat()))
+
+
+def construct_currency_element(parent, currency):
+    return CURRENCY.clone(parent, (currency,))
+
+
+def construct_location_element(parent, location_code, location_address):
+    return LOCATION.clone(parent, (location_code, location_address))
+
+
+def construct_payment_terms_element(parent, date_due_code, date_due):
+    return PAYMENT_TERMS.clone(parent, (date_due_code, date_due.isoformat()))
+
+
+def construct_reference_element(parent, total_with_tax, payment_reference):
+    return REFERENCE.clone(parent, (format_amount(total_with_tax), payment_reference))
+
+
+def construct_reference_document_element(parent, reference_document):
+    element = REFERENCE_DOCUMENT.clone(parent, (reference_document.document_number,))
+    element.set('VrstaDokumenta', reference_document.type_code)
+
+    return element
+
+
+def construct_item_element(parent, item):
+    has_discount = bool(item.discount_percentage)
+
+    values = [str(item.row_number), item.item_name[:35], item.quantity_type, str(item.quantity), item.unit,
+              format_amount(item.price_without_tax * item.quantity), format_amount(item.total_with_tax),
+              str(item.price_without_tax), format_amount(item.tax_rate), format_amount(item.total_without_tax),
+              format_amount(item.total_with_tax - item.total_without_tax)]
+
+    if has_discount:
+        values += [str(item.discount_percentage), format_amount(item.discount_amount)]
+
+    return ITEMS[has_discount].clone(parent, values)
+
+
+def construct_tax_summary_element(parent, tax_summary):
+    return TAX_SUMMARY.clone(parent, (format_amount(tax_summary.tax_rate), format_amount(tax_summary.tax_base),
+                                      format_amount(tax_summary.tax_amount)))
+
+
+def construct_sums_element(parent, amount, sum_type, ref=None):
+    if ref is not None:
+        return elements.construct_sums_element(parent, amount, sum_type, ref)
+
+    return SUMS.clone(parent, (str(sum_type), format_amount(amount)))
+
+
+def _header_template():
+    header = Element('GlavaRacuna')
+    _text(header, 'VrstaRacuna', '{invoice_type}')
+    _text(header, 'StevilkaRacuna', '{invoice_number}')
+    _text(header, 'FunkcijaRacuna', '{invoice_function}')
+    _text(header, 'NacinPlacila', '{payment_type}')
+    _text(header, 'KodaNamena', '{payment_purpose}')
+
+    return header
+
+
+def _date_template():
+    element = Element('DatumiRacuna')
+    _text(element, 'VrstaDatuma', '{date_code}')
+    _text(element, 'DatumRacuna', '{date}')
+
+    return element
+
+
+def _currency_template():
+    element = Element('Valuta')
+    _text(element, 'VrstaValuteRacuna', '2')
+    _text(element, 'KodaValute', '{currency}')
+
+    return element
+
+
+def _location_template():
+    element = Element('Lokacije')
+    _text(element, 'VrstaLokacije', '{location_code}')
+    _text(element, 'NazivLokacije', '{location_address}')
+
+    return element
+
+
+def _payment_terms_template():
+    element = Element('PlacilniPogoji')
+    _text(SubElement(element, 'PodatkiORokih'), 'VrstaPogoja', '3')
+
+    term_due = SubElement(element, 'PlacilniRoki')
+    _text(term_due, 'VrstaDatumaPlacilnegaRoka', '{date_due_code}')
+    _text(term_due, 'Datum', '{date_due}')
+
+    return element
+
+
+def _reference_template():
+    element = Element('PovzetekZneskovRacuna')
+
+    invoice_amounts = SubElement(element, 'ZneskiRacuna')
+    _text(invoice_amounts, 'VrstaZneska', '9')
+    _text(invoice_amounts, 'ZnesekRacuna', '{total_with_tax}')
+
+    reference = SubElement(element, 'SklicZaPlacilo')
+    _text(reference, 'SklicPlacila', 'PQ')
+    _text(reference, 'StevilkaSklica', '{payment_reference}')
+
+    return element
+
+
+def _reference_document_template():
+    element = Element('ReferencniDokumenti')
+    _text(element, 'StevilkaDokumenta', '{document_number}')
+
+    return element
+
+
+def _item_template(has_discount):
+    element = Element('PostavkeRacuna')
+    _text(SubElement(element, 'Postavka'), 'StevilkaVrstice', '{row_number}')
+
+    description = SubElement(element, 'OpisiArtiklov')
+    _text(description, 'KodaOpisaArtikla', 'F')
+    _text(SubElement(description, 'OpisArtikla'), 'OpisArtikla1', '{item_name}')
+
+    quantity = SubElement(element, 'KolicinaArtikla')
+    _text(quantity, 'VrstaKolicine', '{quantity_type}')
+    _text(quantity, 'Kolicina', '{quantity}')
+    _text(quantity, 'EnotaMere', '{unit}')
+
+    _item_amount(element, '203', '{total_before_discount}')
+    _item_amount(element, '38', '{total_with_tax}')
+
+    _text(SubElement(element, 'CenaPostavke'), 'Cena', '{price_without_tax}')
+
+    tax_info = SubElement(element, 'DavkiPostavke')
+
+    taxes = SubElement(tax_info, 'DavkiNaPostavki')
+    _text(taxes, 'VrstaDavkaPostavke', 'VAT')
+    _text(taxes, 'OdstotekDavkaPostavke', '{tax_rate}')
+
+    for amount_type, amount in (('125', '{tax_base}'), ('124', '{tax_amount}')):
+        tax_amounts = SubElement(tax_info, 'ZneskiDavkovPostavke')
+        _text(tax_amounts, 'VrstaZneskaDavkaPostavke', amount_type)
+        _text(tax_amounts, 'Znesek', amount)
+
+    if has_discount:
+        discount = SubElement(element, 'OdstotkiPostavk')
+        _text(discount, 'Identifikator', 'A')
+        _text(discount, 'VrstaOdstotkaPostavke', '12')
+        _text(discount, 'OdstotekPostavke', '{discount_percentage}')
+        _text(discount, 'VrstaZneskaOdstotka', '204')
+        _text(discount, 'ZnesekOdstotka', '{discount_amount}')
+
+    return element
+
+
+def _tax_summary_template():
+    element = Element('PovzetekDavkovRacuna')
+
+    summary = SubElement(element, 'DavkiRacuna')
+    _text(summary, 'VrstaDavka', 'VAT')
+    _text(summary, 'OdstotekDavka', '{tax_rate}')
+
+    for amount_type, amount in (('125', '{tax_base}'), ('124', '{tax_amount}')):
+        amounts = SubElement(element, 'ZneskiDavkov')
+        _text(amounts, 'VrstaZneskaDavka', amount_type)
+        _text(amounts, 'ZnesekDavka', amount)
+
+    return element
+
+
+def _sums_template():
+    element = Element('PovzetekZneskovRacuna')
+
+    amounts = SubElement(element, 'ZneskiRacuna')
+    _text(amounts, 'VrstaZneska', '{sum_type}')
+    _text(amounts, 'ZnesekRacuna', '{amount}')
+
+    _text(SubElement(element, 'SklicZaPlacilo'), 'SklicPlacila', 'PQ')
+
+    return element
+
+
+ROOT = Prototype(elements.construct_root_element)
+HEADER = Prototype(_header_template)
+DATE = Prototype(_date_template)
+CURRENCY = Prototype(_currency_template)
+LOCATION = Prototype(_location_template)
+PAYMENT_TERMS = Prototype(_payment_terms_template)
+REFERENCE = Prototype(_reference_template)
+REFERENCE_DOCUMENT = Prototype(_reference_document_template)
+ITEMS = {has_discount: Prototype(_item_template, has_discount) for has_discount in (False, True)}
+TAX_SUMMARY = Prototype(_tax_summary_template)
+SUMS = Prototype(_sums_template)
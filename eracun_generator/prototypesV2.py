@@ -0,0 +1,294 @@
+"""
+Prototype engine for e-SLOG 2.0.
+
+Every construct_*_element function mirrors the function of the same name in elementsV2, but clones a prebuilt
+Prototype of the segment and fills in its values instead of creating every element. Segments whose structure
+depends on the data, companies, texts and the global discount, are constructed by elementsV2.
+"""
+from decimal import Decimal
+
+from lxml.etree import Element, SubElement
+
+from eracun_generator import elementsV2
+from eracun_generator.elementsV2 import _amount, _price, _reference, _tax, _text
+from eracun_generator.formatting import format_amount
+from eracun_generator.prototype import Prototype
+
+construct_cached_company_element = elementsV2.construct_cached_company_element
+construct_custom_text_element = elementsV2.construct_custom_text_element
+construct_global_discount_element = elementsV2.construct_global_discount_element
+
+
+def construct_invoice_element(invoice):
+    root = construct_root_element()
+
+    for _ in construct_invoice_segments(invoice, root[0]):
+        pass  # segments are appended to M_INVOIC as they are constructed
+
+    return root
+
+
+def construct_root_element():
+    return ROOT.clone()
+
+
+def construct_invoice_segments(invoice, parent=None):
+    """
+    Yield the segment elements of M_INVOIC in schema order, see elementsV2.construct_invoice_segments.
+    """
+    yield construct_document_header_element(parent, invoice)
+    yield construct_header_element(parent, invoice)
+    yield construct_date_element(parent, invoice.date_issued_code, invoice.date_issued)
+    yield construct_date_element(parent, invoice.date_of_service_code, invoice.date_of_service)
+    yield construct_payment_type_element(parent, invoice)
+    yield construct_payment_purpose_element(parent, invoice)
+
+    if invoice.intro_text:
+        yield construct_custom_text_element(parent, 'GEN', invoice.intro_text)
+
+    if invoice.outro_text:
+        yield construct_custom_text_element(parent, 'GEN', invoice.outro_text)
+
+    if invoice.payment_reference != None:
+        yield construct_payment_reference_element(parent, invoice.payment_reference)
+
+    for reference_document in invoice.reference_documents:
+        yield construct_reference_document_element(parent, reference_document)
+
+    yield construct_cached_company_element(parent, invoice.issuer, 'SE')
+    yield construct_cached_company_element(parent, invoice.recipient, 'BY')
+    yield construct_currency_element(parent, invoice.currency)
+    yield construct_payment_terms_element(parent, invoice.date_due_code, invoice.date_due)
+
+    if invoice.global_discount_amount:
+        yield construct_global_discount_element(parent, invoice.global_discount_amount, invoice.global_discount_percentage)
+
+    for item in invoice.document_items:
+        yield construct_item_element(parent, item)
+
+    yield construct_payment_element(parent, invoice.total_with_tax)
+
+    yield construct_sums_element(parent, amount=invoice.subtotal_net, sum_type='79')
+    yield construct_sums_element(parent, amount=invoice.subtotal_net - invoice.total_without_tax, sum_type='260')
+    yield construct_sums_element(parent, amount=invoice.total_without_tax, sum_type='389')
+    yield construct_sums_element(parent, amount=invoice.total_with_tax - invoice.total_without_tax, sum_type='176')
+    yield construct_sums_element(parent, amount=invoice.total_with_tax, sum_type='388')
+
+    for ts in invoice.tax_summaries:
+        yield construct_tax_summary_element(parent, ts)
+
+
+def construct_document_header_element(parent, invoice):
+    return DOCUMENT_HEADER.clone(parent, (invoice.invoice_number[-14:],))
+
+
+def construct_header_element(parent, invoice):
+    return HEADER.clone(parent, (invoice.invoice_type, invoice.invoice_number))
+
+
+def construct_payment_type_element(parent, invoice):
+    return PAYMENT_TYPE.clone(parent, (invoice.payment_type,))
+
+
+def construct_payment_purpose_element(parent, invoice):
+    return PAYMENT_PURPOSE.clone(parent, (invoice.payment_purpose,))
+
+
+def construct_date_element(parent, date_code, date):
+    return DATE.clone(parent, (date_code, date.strftime('%Y-%m-%d')))
+
+
+def construct_currency_element(parent, currency):
+    return CURRENCY.clone(parent, (currency,))
+
+
+def construct_payment_terms_element(parent, date_due_code, date_due):
+    return PAYMENT_TERMS.clone(parent, (date_due_code, date_due.strftime('%Y-%m-%d')))
+
+
+def construct_payment_element(parent, total_with_tax):
+    return SUMS['9'].clone(parent, (format_amount(total_with_tax),))
+
+
+def construct_payment_reference_element(parent, payment_reference):
+    return REFERENCE.clone(parent, ('PQ', payment_reference))
+
+
+def construct_reference_document_element(parent, reference_document):
+    return REFERENCE.clone(parent, (reference_document.type_code, reference_document.document_number))
+
+
+def construct_item_element(parent, item):
+    has_ean = item.ean != None
+    has_discount = bool(item.discount_percentage)
+
+    values = [str(item.row_number)]
+
+    if has_ean:
+        values.append(str(item.ean))
+
+    price_wo_tax = item.price_without_tax
+    if has_discount:
+        price_wo_tax = price_wo_tax * Decimal(1 - (item.discount_percentage / 100))
+
+    values += [item.item_description_code, item.item_name[:35], item.quantity_type, str(item.quantity), item.unit,
+               format_amount(item.total_without_tax), format_amount(item.total_with_tax), format_amount(price_wo_tax)]
+
+    if has_discount:
+        values.append(str(item.price_without_tax))
+
+    values += [format_amount(item.tax_rate), item.tax_rate_type, format_amount(item.total_without_tax),
+               format_amount(item.total_with_tax - item.total_without_tax)]
+
+    if has_discount:
+        values += [str(item.discount_percentage), format_amount(item.discount_amount)]
+
+    return ITEMS[has_ean, has_discount].clone(parent, values)
+
+
+def construct_tax_summary_element(parent, tax_summary):
+    return TAX_SUMMARY.clone(parent, (format_amount(tax_summary.tax_rate), tax_summary.tax_type, format_amount(tax_summary.tax_base),
+                                      format_amount(tax_summary.tax_amount)))
+
+
+def construct_sums_element(parent, amount, sum_type):
+    if str(sum_type) not in SUMS:
+        return elementsV2.construct_sums_element(parent, amount, sum_type)
+
+    return SUMS[str(sum_type)].clone(parent, (format_amount(amount),))
+
+
+def _document_header_template():
+    header = Element('S_UNH')
+    _text(header, 'D_0062', '{invoice_number}')
+
+    data = SubElement(header, 'C_S009')
+    _text(data, 'D_0065', 'INVOIC')
+    _text(data, 'D_0052', 'D')
+    _text(data, 'D_0054', '01B')
+    _text(data, 'D_0051', 'UN')
+
+    return header
+
+
+def _header_template():
+    header = Element('S_BGM')
+    _text(SubElement(header, 'C_C002'), 'D_1001', '{invoice_type}')
+    _text(SubElement(header, 'C_C106'), 'D_1004', '{invoice_number}')
+
+    return header
+
+
+def _text_key_template(key):
+    header = Element('S_FTX')
+    _text(header, 'D_4451', key)
+    _text(SubElement(header, 'C_C108'), 'D_4440', '{value}')
+
+    return header
+
+
+def _date_template():
+    element = Element('S_DTM')
+    wrapper = SubElement(element, 'C_C507')
+    _text(wrapper, 'D_2005', '{date_code}')
+    _text(wrapper, 'D_2380', '{date}')
+
+    return element
+
+
+def _currency_template():
+    element = Element('G_SG7')
+    wrapper = SubElement(SubElement(element, 'S_CUX'), 'C_C504')
+    _text(wrapper, 'D_6347', '2')
+    _text(wrapper, 'D_6345', '{currency}')
+
+    return element
+
+
+def _payment_terms_template():
+    element = Element('G_SG8')
+    _text(SubElement(element, 'S_PAT'), 'D_4279', '1')
+
+    wrapper = SubElement(SubElement(element, 'S_DTM'), 'C_C507')
+    _text(wrapper, 'D_2005', '{date_due_code}')
+    _text(wrapper, 'D_2380', '{date_due}')
+
+    return element
+
+
+def _item_template(has_ean, has_discount):
+    element = Element('G_SG26')
+
+    info = SubElement(element, 'S_LIN')
+    _text(info, 'D_1082', '{row_number}')
+
+    if has_ean:
+        ean = SubElement(info, 'C_C212')
+        _text(ean, 'D_7140', '{ean}')
+        _text(ean, 'D_7143', '0160')
+
+    description = SubElement(element, 'S_IMD')
+    _text(description, 'D_7077', '{item_description_code}')
+    _text(SubElement(description, 'C_C273'), 'D_7008', '{item_name}')
+
+    quantity = SubElement(SubElement(element, 'S_QTY'), 'C_C186')
+    _text(quantity, 'D_6063', '{quantity_type}')
+    _text(quantity, 'D_6060', '{quantity}')
+    _text(quantity, 'D_6411', '{unit}')
+
+    _amount(SubElement(element, 'G_SG27'), '203', '{total_without_tax}')
+    _amount(SubElement(element, 'G_SG27'), '38', '{total_with_tax}')
+
+    _price(element, 'AAA', '{price}')
+
+    if has_discount:
+        _price(element, 'AAB', '{price_without_tax}')
+
+    tax_info = SubElement(element, 'G_SG34')
+    _tax(tax_info, '{tax_rate}', '{tax_rate_type}')
+    _amount(tax_info, '125', '{tax_base}')
+    _amount(tax_info, '124', '{tax_amount}')
+
+    if has_discount:
+        discount = SubElement(element, 'G_SG39')
+        _text(SubElement(discount, 'S_ALC'), 'D_5463', 'A')
+
+        percentage = SubElement(SubElement(SubElement(discount, 'G_SG41'), 'S_PCD'), 'C_C501')
+        _text(percentage, 'D_5245', '1')
+        _text(percentage, 'D_5482', '{discount_percentage}')
+
+        _amount(SubElement(discount, 'G_SG42'), '204', '{discount_amount}')
+
+    return element
+
+
+def _tax_summary_template():
+    element = Element('G_SG52')
+    _tax(element, '{tax_rate}', '{tax_type}')
+    _amount(element, '125', '{tax_base}')
+    _amount(element, '124', '{tax_amount}')
+
+    return element
+
+
+def _sums_template(sum_type):
+    element = Element('G_SG50')
+    _amount(element, sum_type, '{amount}')
+
+    return element
+
+
+ROOT = Prototype(elementsV2.construct_root_element)
+DOCUMENT_HEADER = Prototype(_document_header_template)
+HEADER = Prototype(_header_template)
+PAYMENT_TYPE = Prototype(_text_key_template, 'PAI')
+PAYMENT_PURPOSE = Prototype(_text_key_template, 'ALQ')
+DATE = Prototype(_date_template)
+REFERENCE = Prototype(_reference, None, 'G_SG1', '{reference_type}', '{reference}')
+CURRENCY = Prototype(_currency_template)
+PAYMENT_TERMS = Prototype(_payment_terms_template)
+ITEMS = {(has_ean, has_discount): Prototype(_item_template, has_ean, has_discount)
+         for has_ean in (False, True) for has_discount in (False, True)}
+TAX_SUMMARY = Prototype(_tax_summary_template)
+# Payment amount and sums
+SUMS = {sum_type: Prototype(_sums_template, sum_type) for sum_type in ('9', '79', '260', '389', '176', '388')}
@@ -0,0 +1,374 @@
+"""
+Read e-SLOG 2.0 (M_INVOIC) and e-SLOG 1.6.1 (IzdaniRacunEnostavni) documents back into Invoice objects.
+
+Documents are parsed incrementally. Every segment of the invoice element is read into the Invoice as soon as it
+is complete and is then removed from the tree, so memory used by the XML stays flat regardless of the number of
+items. Element names are the ones written by definitions and definitionsV2.
+
+Rendering a read invoice with render_xml in the same version gives the document it was read from, unsigned. The
+invoice holds the values as written: amounts with two decimals, sums such as the total before discounts read from
+the document rather than recomputed from the items, and names, addresses and texts split over numbered fields joined
+with a single space. Values the format doesn't carry are None, e.g. country and location_address in e-SLOG 2.0.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from io import BytesIO
+
+from lxml import etree
+
+from eracun_generator.core import Business, Invoice
+
+INVOICE_TAGS = ('M_INVOIC', 'Racun')
+
+
+def read_invoice(source, columnar_items=False):
+    """
+    Read an unsigned or signed e-SLOG document.
+    :param source: path, binary file object or the document as bytes
+    :param columnar_items: see Invoice
+    :return: Invoice
+    """
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+
+    invoice = Invoice(issuer=None, recipient=None, invoice_number=None, total_without_tax=None, total_with_tax=None,
+                      location_address=None, date_issued=None, date_of_service=None, date_due=None,
+                      payment_reference=None, columnar_items=columnar_items)
+    invoice.location_code = None
+
+    events = etree.iterparse(source, events=('end',), tag=['{*}%s' % tag for tag in SEGMENTS], resolve_entities=False,
+                             no_network=True)
+
+    for _, element in events:
+        parent = element.getparent()
+
+        if parent is None or _local(parent.tag) not in INVOICE_TAGS:
+            continue
+
+        read_segment = SEGMENTS.get(_local(element.tag))
+
+        if read_segment is not None:
+            read_segment(invoice, element)
+
+        # Release the segment and everything before it
+        element.clear()
+
+        while element.getprevious() is not None:
+            del parent[0]
+
+    invoice.additional_remittance_information = f'Racun st. {invoice.invoice_number}'
+
+    return invoice
+
+
+# e-SLOG 2.0
+
+def read_header(invoice, element):
+    invoice.invoice_type = element.findtext('{*}C_C002/{*}D_1001')
+    invoice.invoice_number = element.findtext('{*}C_C106/{*}D_1004')
+
+
+def read_date(invoice, element):
+    _set_date(invoice, element.findtext('{*}C_C507/{*}D_2005'), element.findtext('{*}C_C507/{*}D_2380'))
+
+
+def read_free_text(invoice, element):
+    text_type = element.findtext('{*}D_4451')
+    text = ' '.join(part.text or '' for part in element.find('{*}C_C108'))
+
+    if text_type == 'PAI':
+        invoice.payment_type = text
+    elif text_type == 'ALQ':
+        invoice.payment_purpose = text
+    elif invoice.intro_text is None:
+        invoice.intro_text = text
+    else:
+        invoice.outro_text = text
+
+
+def read_reference(invoice, element):
+    reference_type = element.findtext('{*}S_RFF/{*}C_C506/{*}D_1153')
+    reference = element.findtext('{*}S_RFF/{*}C_C506/{*}D_1154')
+
+    if reference_type == 'PQ':
+        invoice.payment_reference = reference
+    else:
+        invoice.add_reference_document(reference, reference_type)
+
+
+def read_company(invoice, element):
+    info = element.find('{*}S_NAD')
+    references = {group.findtext('{*}S_RFF/{*}C_C506/{*}D_1153'): group.findtext('{*}S_RFF/{*}C_C506/{*}D_1154')
+                  for group in element.iterfind('{*}G_SG3')}
+
+    # The account holder is the name as given, unless it was cut to 34 characters
+    holder = element.findtext('{*}S_FII/{*}C_C078/{*}D_3192')
+    name = holder if holder is not None and len(holder) < 34 else _join(info.find('{*}C_C080'))
+
+    business = Business(name=name,
+                        address=_join(info.find('{*}C_C059')),
+                        city=info.findtext('{*}D_3164'),
+                        zip_code=info.findtext('{*}D_3251'),
+                        country=None,
+                        country_iso_code=info.findtext('{*}D_3207'),
+                        vat_id=references.get('AHP'),
+                        iban=element.findtext('{*}S_FII/{*}C_C078/{*}D_3194'),
+                        bic=element.findtext('{*}S_FII/{*}C_C088/{*}D_3433'),
+                        registration_number=references.get('0199'))
+
+    _set_business(invoice, info.findtext('{*}D_3035'), business)
+
+
+def read_currency(invoice, element):
+    invoice.currency = element.findtext('{*}S_CUX/{*}C_C504/{*}D_6345')
+
+
+def read_payment_terms(invoice, element):
+    invoice.date_due = _date(element.findtext('{*}S_DTM/{*}C_C507/{*}D_2380'))
+
+
+def read_global_discount(invoice, element):
+    invoice.global_discount_percentage = _decimal(element.findtext('{*}G_SG19/{*}S_PCD/{*}C_C501/{*}D_5482'))
+    invoice.global_discount_amount = _decimal(element.findtext('{*}G_SG20/{*}S_MOA/{*}C_C516/{*}D_5004'))
+
+
+def read_item(invoice, element):
+    values = _flatten(element, {'D_5004': 'D_5025', 'D_5118': 'D_5125'})
+    discounted = 'G_SG39' in values
+
+    invoice.add_item(row_number=values['D_1082'],
+                     item_name=values['D_7008'],
+                     quantity=_decimal(values['D_6060']),
+                     price_without_tax=_decimal(values.get(('D_5118', 'AAB'), values.get(('D_5118', 'AAA')))),
+                     total_with_tax=_decimal(values[('D_5004', '38')]),
+                     total_without_tax=_decimal(values[('D_5004', '125')]),
+                     tax_rate=_decimal(values['D_5278']),
+                     tax_rate_type=values['D_5305'],
+                     ean=values.get('D_7140'),
+                     discount_percentage=_decimal(values['D_5482']) if discounted else None,
+                     discount_amount=_decimal(values[('D_5004', '204')]) if discounted else None,
+                     unit=values['D_6411'])
+
+
+def read_sums(invoice, element):
+    amount_type = element.findtext('{*}S_MOA/{*}C_C516/{*}D_5025')
+    amount = _decimal(element.findtext('{*}S_MOA/{*}C_C516/{*}D_5004'))
+
+    if amount_type == '9':
+        invoice.total_with_tax = amount
+    elif amount_type == '389':
+        invoice.total_without_tax = amount
+    elif amount_type == '79':
+        # Sums follow the items, replace the total add_item summed from the item amounts read
+        invoice.subtotal_net = amount
+
+
+def read_tax_summary(invoice, element):
+    amounts = _amounts(element)
+
+    invoice.add_tax_summary(tax_rate=_decimal(element.findtext('{*}S_TAX/{*}C_C243/{*}D_5278')),
+                            tax_base=amounts['125'],
+                            tax_amount=amounts['124'],
+                            tax_type=element.findtext('{*}S_TAX/{*}D_5305'))
+
+
+# e-SLOG 1.6.1
+
+def read_header_v1(invoice, element):
+    invoice.invoice_type = element.findtext('VrstaRacuna')
+    invoice.invoice_number = element.findtext('StevilkaRacuna')
+    invoice.invoice_function = element.findtext('FunkcijaRacuna')
+    invoice.payment_type = element.findtext('NacinPlacila')
+    invoice.payment_purpose = element.findtext('KodaNamena')
+
+
+def read_date_v1(invoice, element):
+    _set_date(invoice, element.findtext('VrstaDatuma'), element.findtext('DatumRacuna'))
+
+
+def read_currency_v1(invoice, element):
+    invoice.currency = element.findtext('KodaValute')
+
+
+def read_location_v1(invoice, element):
+    invoice.location_code = element.findtext('VrstaLokacije')
+    invoice.location_address = element.findtext('NazivLokacije')
+
+
+def read_company_v1(invoice, element):
+    info = element.find('NazivNaslovPodjetja')
+    references = {reference.findtext('VrstaPodatkaPodjetja'): reference.findtext('PodatekPodjetja')
+                  for reference in element.iterfind('ReferencniPodatkiPodjetja')}
+
+    business = Business(name=_join(info.find('NazivPartnerja')),
+                        address=_join(info.find('Ulica')),
+                        city=info.findtext('Kraj'),
+                        zip_code=info.findtext('PostnaStevilka'),
+                        country=info.findtext('NazivDrzave'),
+                        country_iso_code=info.findtext('KodaDrzave'),
+                        vat_id=references.get('VA'),
+                        iban=element.findtext('FinancniPodatkiPodjetja/BancniRacun/StevilkaBancnegaRacuna'),
+                        bic=element.findtext('FinancniPodatkiPodjetja/BancniRacun/BIC'),
+                        registration_number=references.get('GN'))
+
+    _set_business(invoice, info.findtext('VrstaPartnerja'), business)
+
+
+def read_payment_terms_v1(invoice, element):
+    invoice.date_due = _date(element.findtext('PlacilniRoki/Datum'))
+
+
+def read_sums_v1(invoice, element):
+    amount_type = element.findtext('ZneskiRacuna/VrstaZneska')
+    amount = _decimal(element.findtext('ZneskiRacuna/ZnesekRacuna'))
+
+    if amount_type == '9':
+        invoice.total_with_tax = amount
+        invoice.payment_reference = element.findtext('SklicZaPlacilo/StevilkaSklica')
+    elif amount_type == '125':
+        invoice.total_without_tax = amount
+    elif amount_type == '79':
+        invoice.subtotal_net = amount
+
+
+def read_reference_document_v1(invoice, element):
+    invoice.add_reference_document(element.findtext('StevilkaDokumenta'), element.get('VrstaDokumenta'))
+
+
+def read_global_discount_v1(invoice, element):
+    invoice.global_discount_percentage = _decimal(element.findtext('OdstotekPopusta'))
+    invoice.global_discount_amount = _decimal(element.findtext('ZnesekPopusta'))
+
+
+def read_free_text_v1(invoice, element):
+    content = element.find('Besedilo')
+    text = ' '.join(part.text or '' for part in content[1:])
+
+    if content.findtext('Tekst1') == 'GLAVA_TEKST':
+        invoice.intro_text = text
+    else:
+        invoice.outro_text = text
+
+
+def read_item_v1(invoice, element):
+    values = _flatten(element, {'ZnesekPostavke': 'VrstaZneskaPostavke', 'Znesek': 'VrstaZneskaDavkaPostavke'})
+    discounted = 'OdstotkiPostavk' in values
+
+    invoice.add_item(row_number=values['StevilkaVrstice'],
+                     item_name=values['OpisArtikla1'],
+                     quantity=_decimal(values['Kolicina']),
+                     price_without_tax=_decimal(values['Cena']),
+                     total_with_tax=_decimal(values[('ZnesekPostavke', '38')]),
+                     total_without_tax=_decimal(values[('Znesek', '125')]),
+                     tax_rate=_decimal(values['OdstotekDavkaPostavke']),
+                     discount_percentage=_decimal(values['OdstotekPostavke']) if discounted else None,
+                     discount_amount=_decimal(values['ZnesekOdstotka']) if discounted else None,
+                     unit=values['EnotaMere'])
+
+
+def read_tax_summary_v1(invoice, element):
+    amounts = {amount.findtext('VrstaZneskaDavka'): _decimal(amount.findtext('ZnesekDavka'))
+               for amount in element.iterfind('ZneskiDavkov')}
+
+    invoice.add_tax_summary(tax_rate=_decimal(element.findtext('DavkiRacuna/OdstotekDavka')),
+                            tax_base=amounts['125'],
+                            tax_amount=amounts['124'])
+
+
+SEGMENTS = {
+    'S_BGM': read_header,
+    'S_DTM': read_date,
+    'S_FTX': read_free_text,
+    'G_SG1': read_reference,
+    'G_SG2': read_company,
+    'G_SG7': read_currency,
+    'G_SG8': read_payment_terms,
+    'G_SG16': read_global_discount,
+    'G_SG26': read_item,
+    'G_SG50': read_sums,
+    'G_SG52': read_tax_summary,
+
+    'GlavaRacuna': read_header_v1,
+    'DatumiRacuna': read_date_v1,
+    'Valuta': read_currency_v1,
+    'Lokacije': read_location_v1,
+    'PodatkiPodjetja': read_company_v1,
+    'PlacilniPogoji': read_payment_terms_v1,
+    'PovzetekZneskovRacuna': read_sums_v1,
+    'ReferencniDokumenti': read_reference_document_v1,
+    'GlobalniPopusti': read_global_discount_v1,
+    'PoljubnoBesedilo': read_free_text_v1,
+    'PostavkeRacuna': read_item_v1,
+    'PovzetekDavkovRacuna': read_tax_summary_v1,
+}
+
+
+def _local(tag):
+    # e-SLOG 2.0 documents declare urn:eslog:2.00 as the default namespace
+    return tag.rpartition('}')[2]
+
+
+def _set_date(invoice, date_code, value):
+    if date_code == invoice.date_issued_code:
+        invoice.date_issued = _date(value)
+    elif date_code == invoice.date_of_service_code:
+        invoice.date_of_service = _date(value)
+
+
+def _set_business(invoice, business_type, business):
+    if business_type in ('SE', 'II'):
+        invoice.issuer = business
+    elif business_type == 'BY':
+        invoice.recipient = business
+
+
+def _flatten(element, qualified):
+    """
+    Texts of the element and all its descendants, read in one pass, by local tag name. Items are the bulk of a
+    document and this is several times faster than looking up every value with findtext.
+
+    Only the first occurrence of a tag is kept. Tags in qualified are kept under (tag, qualifier) instead, where
+    qualifier is the text of the last preceding qualifier tag, e.g. ('D_5004', '125') for the amount qualified by
+    D_5025 125.
+    :param element:
+    :param qualified: dict of tag -> qualifier tag
+    :return: dict
+    """
+    values = {}
+    last = {}
+
+    for tag, text in [(descendant.tag.rpartition('}')[2], descendant.text) for descendant in element.iter()]:
+        if tag in qualified:
+            values[(tag, last.get(qualified[tag]))] = text
+        elif tag not in values:
+            values[tag] = text
+
+        last[tag] = text
+
+    return values
+
+
+def _amounts(element):
+    """
+    S_MOA amounts of the element by amount type.
+    """
+    return {amount.findtext('{*}D_5025'): _decimal(amount.findtext('{*}D_5004'))
+            for amount in element.iterfind('{*}S_MOA/{*}C_C516')}
+
+
+def _join(element):
+    """
+    Join the parts of a text split over numbered elements.
+    """
+    return ' '.join(part.text or '' for part in element) if element is not None else None
+
+
+def _date(value):
+    if value is None:
+        return None
+
+    return datetime.fromisoformat(value) if 'T' in value else date.fromisoformat(value)
+
+
+def _decimal(value):
+    return Decimal(value) if value else None
@@ -0,0 +1,70 @@
+from lxml import etree
+
+from eracun_generator.builder import build_xml
+from eracun_generator.definitions import construct_root_data, construct_invoice_segments
+from eracun_generator.definitionsV2 import construct_root_data as construct_root_dataV2
+from eracun_generator.definitionsV2 import construct_invoice_segments as construct_invoice_segmentsV2
+from eracun_generator import elements, elementsV2, prototypes, prototypesV2
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>\n'
+
+# e-Slog 2.0 and 1.6.1 modules of the engines building lxml elements directly
+ENGINE_MODULES = {'element': (elementsV2, elements), 'prototype': (prototypesV2, prototypes)}
+
+
+def iter_invoice_xml(invoice, v2=True, engine='dict'):
+    """
+    Yield the unsigned invoice XML as c14n encoded byte chunks.
+
+    The root element is serialized once and every segment of the invoice element (header, items, sums, tax
+    summaries) is constructed, serialized and released one at a time, so memory stays flat regardless of the
+    number of items. Joined chunks are identical to Invoice.render_xml(v2=v2) encoded as UTF-8.
+    :param invoice:
+    :param v2:
+    :param engine: 'dict', 'element' or 'prototype', see Invoice.render_xml
+    :return:
+    """
+    if engine in ENGINE_MODULES:
+        module = ENGINE_MODULES[engine][0 if v2 else 1]
+        root, segments = module.construct_root_element(), module.construct_invoice_segments(invoice)
+    else:
+        if v2:
+            root_data, segments = construct_root_dataV2(), construct_invoice_segmentsV2(invoice, cached_parties=True)
+        else:
+            root_data, segments = construct_root_data(), construct_invoice_segments(invoice, cached_parties=True)
+
+        root = build_xml(root_data)
+        segments = (build_xml(segment) for _, segment in segments)
+
+    head, tail = _split_root(root)
+
+    yield XML_DECLARATION
+    yield head
+
+    for segment in segments:
+        yield etree.tostring(segment, method="c14n")
+
+    yield tail
+
+
+def write_invoice_xml(invoice, fp, v2=True, engine='dict'):
+    """
+    Write the unsigned invoice XML to a binary file object segment by segment.
+    :param invoice:
+    :param fp: file object opened in binary mode
+    :param v2:
+    :param engine:
+    :return:
+    """
+    for chunk in iter_invoice_xml(invoice, v2=v2, engine=engine):
+        fp.write(chunk)
+
+
+def _split_root(root):
+    """
+    Serialize the root and the empty invoice element and split the result just before the invoice closing tag.
+    """
+    serialized = etree.tostring(root, method="c14n")
+    position = serialized.rindex(b'</%s>' % root[0].tag.encode('utf-8'))
+
+    return serialized[:position], serialized[position:]
@@ -3,11 +3,6 @@ import hashlib
 from base64 import b64encode
 from datetime import datetime, timezone
 
-from cryptography import x509
-from cryptography.hazmat.backends import default_backend
-
-from signxml import XMLSigner
-
 from eracun_generator.builder import build_xml
 
 
@@ -15,40 +10,130 @@ def ds_tag(tag):
     return "{http://www.w3.org/2000/09/xmldsig#}" + tag
 
 
-def sign_invoice(invoice_json, key, cert):
-    invoice_json = add_temp_sign_data(key, cert, invoice_json)
+class SigningCertificate:
+    """
+    PEM certificate chain, the signing certificate first, with the data of the signature placeholder.
+    """
+    def __init__(self, cert):
+        from cryptography import x509
+
+        if isinstance(cert, str):
+            cert = cert.encode('utf-8')
+
+        self.cert = cert
+
+        # Every certificate of the chain is embedded into the signature
+        self.certificates = x509.load_pem_x509_certificates(cert)
+        self.certificate = self.certificates[0]
+
+        self.cert_digest = b64encode(hashlib.sha1(cert).digest()).decode()
+        self.issuer_name = self.certificate.subject.rfc4514_string()
+        self.serial_number = str(self.certificate.serial_number)
+
+
+class SigningContext(SigningCertificate):
+    """
+    Signing data of one key and certificate.
+
+    The certificate is parsed, hashed and described and the private key is loaded once, so signing an invoice only
+    costs the digest and RSA operations. Reuse a single context for every invoice signed with the same certificate.
+    """
+    def __init__(self, key, cert, passphrase=None):
+        """
+        :param key: PEM encoded private key or a loaded private key object
+        :param cert: PEM encoded certificate, or certificate chain with the signing certificate first
+        :param passphrase: passphrase of the PEM encoded private key
+        """
+        # The signing stack takes longer to import than the rest of the package, load it only when signing
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import serialization
+        from signxml import XMLSigner
+
+        super().__init__(cert)
+
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+
+        self.key = key
+        self.passphrase = passphrase
+
+        if isinstance(key, bytes):
+            self.private_key = serialization.load_pem_private_key(key, password=passphrase, backend=default_backend())
+        else:
+            self.private_key = key
+
+        self.signer = XMLSigner(c14n_algorithm='http://www.w3.org/TR/2001/REC-xml-c14n-20010315')
+
+    def __reduce__(self):
+        # Loaded keys can't be pickled - rebuild the context from PEM data, e.g. once in every worker process.
+        if isinstance(self.key, bytes):
+            return SigningContext, (self.key, self.cert, self.passphrase)
 
-    xml_content = build_xml(invoice_json)
+        # Contexts made from a key object are rebuilt from the key serialized without encryption
+        from cryptography.hazmat.primitives import serialization
 
-    signed_xml = XMLSigner(c14n_algorithm='http://www.w3.org/TR/2001/REC-xml-c14n-20010315').sign(xml_content,
-                                                                                                  key=key,
-                                                                                                  cert=cert,
-                                                                                                  reference_uri=['data','signprops'])
+        key = self.private_key.private_bytes(serialization.Encoding.PEM,
+                                             serialization.PrivateFormat.PKCS8,
+                                             serialization.NoEncryption())
 
-    ds_object = signed_xml[1][0]
+        return SigningContext, (key, self.cert)
 
-    signed_xml[1].remove(ds_object)
-    signed_xml[1].append(ds_object)
+    def sign_invoice(self, invoice_json):
+        invoice_json['signature_placeholder'] = self.construct_temp_sign_data()
 
-    signed_xml[1].attrib['Id'] = 'signature'
+        return self.sign_xml(build_xml(invoice_json))
 
-    return signed_xml
+    def sign_invoice_element(self, xml_content):
+        """
+        Sign an already built invoice tree. The signature placeholder is appended to the root element.
+        """
+        build_xml(self.construct_temp_sign_data(), parent=xml_content)
+
+        return self.sign_xml(xml_content)
+
+    def sign_xml(self, xml_content):
+        signed_xml = self.signer.sign(xml_content,
+                                      key=self.private_key,
+                                      cert=self.certificates,
+                                      reference_uri=['data','signprops'])
+
+        ds_object = signed_xml[1][0]
+
+        signed_xml[1].remove(ds_object)
+        signed_xml[1].append(ds_object)
+
+        signed_xml[1].attrib['Id'] = 'signature'
+
+        return signed_xml
+
+    def construct_temp_sign_data(self, signed_props_id='signprops'):
+        return construct_temp_sign_data(self, signed_props_id)
+
+
+def sign_invoice(invoice_json, key, cert):
+    return SigningContext(key, cert).sign_invoice(invoice_json)
+
+
+def sign_invoice_element(xml_content, key, cert):
+    return SigningContext(key, cert).sign_invoice_element(xml_content)
 
 
 def add_temp_sign_data(key, cert, invoice_json, signed_props_id='signprops'):
-    pm = cert
-    pem_cert = x509.load_pem_x509_certificate(pm, default_backend())
+    invoice_json['signature_placeholder'] = construct_temp_sign_data(SigningCertificate(cert), signed_props_id)
+
+    return invoice_json
 
-    digest = hashlib.sha1()
-    digest.update(pm)
-    digest = b64encode(digest.digest()).decode()
 
-    invoice_json['signature_placeholder'] = {
+def construct_temp_sign_data(context, signed_props_id='signprops'):
+    """
+    :param context: SigningCertificate or SigningContext of the signing certificate
+    """
+    signature_placeholder = {
         '_name': ds_tag('Signature'),
         '_attrs': [('Id', 'placeholder')]
     }
 
-    invoice_json['signature_placeholder']['sign_temp_data'] = {
+    signature_placeholder['sign_temp_data'] = {
         '_name': ds_tag('Object'),
         'qualifying_props': {
             '_name': 'QualifyingProperties',
@@ -74,7 +159,7 @@ def add_temp_sign_data(key, cert, invoice_json, signed_props_id='signprops'):
                                 },
                                 'value': {
                                     '_name': 'DigestValue',
-                                    '_value': digest
+                                    '_value': context.cert_digest
                                 }
                             },
                             'issuer_serial': {
@@ -82,12 +167,12 @@ def add_temp_sign_data(key, cert, invoice_json, signed_props_id='signprops'):
                                 'name': {
                                     '_name': 'X509IssuerName',
                                    # '_attrs': [('xmlns', 'http://www.w3.org/2000/09/xmldsig#')],
-                                    '_value': pem_cert.subject.rfc4514_string()
+                                    '_value': context.issuer_name
                                 },
                                 'serial': {
                                     '_name': 'X509SerialNumber',
                                    # '_attrs': [('xmlns', 'http://www.w3.org/2000/09/xmldsig#')],
-                                    '_value': str(pem_cert.serial_number)
+                                    '_value': context.serial_number
                                 }
                             }
                         },
@@ -103,4 +188,4 @@ def add_temp_sign_data(key, cert, invoice_json, signed_props_id='signprops'):
         }
     }
 
-    return invoice_json
+    return signature_placeholder
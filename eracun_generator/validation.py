@@ -0,0 +1,163 @@
+"""
+XSD validation of invoice and envelope trees.
+
+The schema files are published by GZS and UJP and are not distributed with the package, see SCHEMA_URLS. Download
+them into a directory and set ERACUN_SCHEMA_DIR, or SCHEMA_DIR, to it. The directory is looked up when a schema is
+first needed and every schema file is compiled once per process. Validating without the schemas raises
+SchemaNotFoundError.
+"""
+import os
+
+from copy import deepcopy
+from functools import lru_cache
+
+from lxml import etree
+
+# Directory of the schema files, takes precedence over the ERACUN_SCHEMA_DIR environment variable when set
+SCHEMA_DIR = None
+
+INVOICE_SCHEMA = 'eSLOG_1-6_EnostavniRacun.xsd'
+INVOICE_SCHEMA_V2 = 'eSLOG20_INVOIC_v200.xsd'
+ENVELOPE_SCHEMA = 'envelope.xsd'
+
+SCHEMA_URLS = {
+    INVOICE_SCHEMA: 'http://www.gzs.si/e-poslovanje/sheme/eSLOG_1-6_EnostavniRacun.xsd',
+    INVOICE_SCHEMA_V2: 'http://www.roseslovenia.eu/e_files/news/eSLOG20_INVOIC_v200.xsd',
+    ENVELOPE_SCHEMA: 'the e-invoice envelope schema published by UJP',
+}
+
+XSD = '{http://www.w3.org/2001/XMLSchema}'
+
+
+class SchemaNotFoundError(Exception):
+    """
+    The schema directory is not configured or the schema file needed for validation is not in it.
+    """
+
+
+def schema_path(filename):
+    """
+    :param filename: name of the schema file
+    :return: path of the schema file in SCHEMA_DIR or ERACUN_SCHEMA_DIR
+    """
+    directory = SCHEMA_DIR or os.environ.get('ERACUN_SCHEMA_DIR')
+
+    if not directory:
+        raise SchemaNotFoundError(f'Validation needs {filename}, download it from {SCHEMA_URLS[filename]} and set '
+                                  f'ERACUN_SCHEMA_DIR to the directory holding it')
+
+    path = os.path.join(directory, filename)
+
+    if not os.path.isfile(path):
+        raise SchemaNotFoundError(f'{filename} is not in {directory}, download it from {SCHEMA_URLS[filename]} to '
+                                  f'that directory')
+
+    return path
+
+
+def load_schema(filename):
+    """
+    Compile the schema file from the schema directory.
+    :param filename:
+    :return: tuple of etree.XMLSchema and the target namespace of the schema or None
+    """
+    return _load_schema(schema_path(filename))
+
+
+def load_unqualified_schema(filename):
+    """
+    Compile the schema file from the schema directory without its target namespace, to validate trees built without
+    the namespace as they are.
+
+    Returns None for schemas that include or redefine other schema files, which keep their namespace, and for
+    schemas that refer to their namespace with a prefix, whose references would still point into it.
+    :param filename:
+    :return: etree.XMLSchema or None
+    """
+    return _load_unqualified_schema(schema_path(filename))
+
+
+@lru_cache(maxsize=None)
+def _load_schema(path):
+    document = etree.parse(path)
+
+    return etree.XMLSchema(document), document.getroot().get('targetNamespace')
+
+
+@lru_cache(maxsize=None)
+def _load_unqualified_schema(path):
+    root = etree.parse(path).getroot()
+    namespace = root.get('targetNamespace')
+
+    if root.find(XSD + 'include') is not None or root.find(XSD + 'redefine') is not None:
+        return None
+
+    for element in root.iter(etree.Element):
+        if any(uri == namespace and prefix is not None for prefix, uri in element.nsmap.items()):
+            return None
+
+    # A new root without the target namespace and its default namespace declaration. Unprefixed type and element
+    # references of the copied definitions then refer to definitions without a namespace.
+    unqualified = etree.Element(root.tag, nsmap={prefix: uri for prefix, uri in root.nsmap.items() if uri != namespace})
+
+    for name, value in root.attrib.items():
+        if name != 'targetNamespace':
+            unqualified.set(name, value)
+
+    for child in root:
+        unqualified.append(deepcopy(child))
+
+    # Relative schema locations of imports are resolved against the original file
+    unqualified.getroottree().docinfo.URL = path
+
+    return etree.XMLSchema(unqualified)
+
+
+def validate_invoice(xml_content, v2=True):
+    """
+    Validate an invoice tree as built by render_xml, signed or not.
+
+    Raises etree.DocumentInvalid with the schema errors when the invoice is not valid and SchemaNotFoundError when
+    the schema is not installed.
+    :param xml_content: root element of the invoice
+    :param v2: set to False for e-Slog v1.6.1
+    :return:
+    """
+    filename = INVOICE_SCHEMA_V2 if v2 else INVOICE_SCHEMA
+    schema, namespace = load_schema(filename)
+
+    if not namespace or xml_content.tag.startswith('{'):
+        schema.assertValid(xml_content)
+        return
+
+    # e-Slog 2.0 trees are built without a namespace and only get urn:eslog:2.00 from the xmlns attribute of the root
+    # when the serialized document is parsed. They are checked against the schema without its namespace instead.
+    unqualified_schema = load_unqualified_schema(filename)
+
+    if unqualified_schema is None:
+        schema.assertValid(etree.fromstring(etree.tostring(xml_content)))
+        return
+
+    # The xmlns attribute is a namespace declaration once serialized, not an attribute the schema allows
+    attributes = xml_content.attrib.items()
+    xml_content.attrib.pop('xmlns', None)
+
+    try:
+        unqualified_schema.assertValid(xml_content)
+    finally:
+        # Set every attribute again, so they keep their order
+        xml_content.attrib.clear()
+
+        for name, value in attributes:
+            xml_content.set(name, value)
+
+
+def validate_envelope(envelope):
+    """
+    Validate an envelope tree. Raises etree.DocumentInvalid when the envelope is not valid and SchemaNotFoundError
+    when the schema is not installed.
+    :param envelope: root element of the envelope
+    :return:
+    """
+    schema, _ = load_schema(ENVELOPE_SCHEMA)
+    schema.assertValid(envelope)
@@ -3,6 +3,9 @@ from setuptools import setup, find_packages
 setup(
     name='eracun_generator',
     packages=['eracun_generator', 'eracun_generator.envelope'],
+    entry_points={
+        'console_scripts': ['eracun = eracun_generator.cli:main'],
+    },
     version='0.2.8',
     description='e-SLOG e-Racun v1.6.1 and v2.0 XML generator',
     author='Boris Savic',
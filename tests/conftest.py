@@ -0,0 +1,131 @@
+import os
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from eracun_generator.core import Business, Invoice, ReferenceDocument
+
+CERT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'demos', 'cert')
+
+
+def make_business(name, vat_id):
+    return Business(name=name,
+                    address='Our Address 100',
+                    zip_code=1000,
+                    city='Ljubljana',
+                    country='Slovenia',
+                    country_iso_code='SI',
+                    vat_id=vat_id,
+                    iban='SI56111122223333456',
+                    bic='BAKOSI2XXXX',
+                    registration_number='555555555')
+
+
+def build_invoice(item_count=3, invoice_number='1-2019-154'):
+    invoice = Invoice(
+        issuer=make_business('Company d.o.o.', '12345678'),
+        recipient=make_business('Recipient Name', '87654321'),
+        invoice_number=invoice_number,
+        total_without_tax=Decimal('1.48') * item_count,
+        total_with_tax=Decimal('1.81') * item_count,
+        location_address='Ljubljana',
+        date_issued=datetime(2019, 5, 6),
+        date_of_service=datetime(2019, 5, 6),
+        date_due=datetime(2019, 6, 5),
+        payment_reference='SI001-2019-154',
+        intro_text='Invoice intro text to be included')
+
+    invoice.add_reference_document('NAR-54654', ReferenceDocument.TYPE_ORDER_NUMBER)
+
+    for i in range(item_count):
+        invoice.add_item(row_number=i + 1,
+                         item_name=f'Item {i + 1}',
+                         quantity=Decimal('2.00'),
+                         ean='12345678',
+                         price_without_tax=Decimal('0.74'),
+                         total_with_tax=Decimal('1.81'),
+                         total_without_tax=Decimal('1.48'),
+                         tax_rate=Decimal('22.00'))
+
+    invoice.add_tax_summary(tax_rate=Decimal('22.00'),
+                            tax_base=Decimal('1.48') * item_count,
+                            tax_amount=Decimal('0.33') * item_count)
+
+    return invoice
+
+
+def build_mixed_invoice(columnar_items=False):
+    """
+    Invoice using most of the format: long names and texts split over several fields, discounted items, three tax
+    rates and a global discount.
+    """
+    invoice = Invoice(
+        issuer=make_business('Company with a rather long name that does not fit into a single field d.o.o.', '12345678'),
+        recipient=make_business('Recipient Name', '87654321'),
+        invoice_number='2-2019-7',
+        total_without_tax=None,
+        total_with_tax=None,
+        location_address='Ljubljana',
+        date_issued=datetime(2019, 5, 6),
+        date_of_service=datetime(2019, 5, 6),
+        date_due=datetime(2019, 6, 5),
+        payment_reference='SI001-2019-7',
+        global_discount_amount=Decimal('1.00'),
+        global_discount_percentage=Decimal('5'),
+        intro_text='Invoice intro text to be included',
+        outro_text='Outro text long enough to be split into more than one segment of seventy characters, ' * 2,
+        columnar_items=columnar_items)
+
+    invoice.issuer.address = 'Cesta v Mestni log 12, a street address longer than thirty five characters'
+
+    invoice.add_reference_document('NAR-54654', ReferenceDocument.TYPE_ORDER_NUMBER)
+    invoice.add_reference_document('DOB-1', ReferenceDocument.TYPE_DELIVERY_NOTE)
+
+    invoice.add_item(row_number=1, item_name='CocaCola 0.33L', quantity=Decimal('2.00'), ean='12345678',
+                     price_without_tax=Decimal('0.74'), total_with_tax=Decimal('1.81'),
+                     total_without_tax=Decimal('1.48'), tax_rate=Decimal('22.00'))
+    invoice.add_item(row_number=2, item_name='Item with a name longer than thirty five characters', ean=None,
+                     quantity=Decimal('3'), price_without_tax=Decimal('4.00'), total_with_tax=Decimal('11.83'),
+                     total_without_tax=Decimal('10.80'), tax_rate=Decimal('9.50'),
+                     discount_percentage=Decimal('10'), discount_amount=Decimal('1.20'), unit='KGM')
+    invoice.add_item(row_number=3, item_name='Book', quantity=Decimal('1'), price_without_tax=Decimal('12.50'),
+                     total_with_tax=Decimal('12.50'), total_without_tax=Decimal('12.50'), tax_rate=Decimal('0'),
+                     tax_rate_type='E')
+    invoice.add_item(row_number=4, item_name='Service hour', quantity=Decimal('1.5'),
+                     price_without_tax=Decimal('20.00'), total_with_tax=Decimal('32.94'),
+                     total_without_tax=Decimal('27.00'), tax_rate=Decimal('22.00'),
+                     discount_percentage=Decimal('10'), discount_amount=Decimal('3.00'), unit='HUR')
+
+    invoice.finalize_totals()
+
+    return invoice
+
+
+@pytest.fixture
+def make_mixed_invoice():
+    """
+    Factory of the invoice built by build_mixed_invoice.
+    """
+    return build_mixed_invoice
+
+
+@pytest.fixture
+def make_invoice():
+    """
+    Factory of invoices with the given number of items, all taxed at 22 %.
+    """
+    return build_invoice
+
+
+@pytest.fixture(scope='session')
+def key():
+    with open(os.path.join(CERT_DIR, 'example.key'), 'rb') as fp:
+        return fp.read()
+
+
+@pytest.fixture(scope='session')
+def cert():
+    with open(os.path.join(CERT_DIR, 'example.pem'), 'rb') as fp:
+        return fp.read()
@@ -0,0 +1,90 @@
+import os
+import threading
+
+import pytest
+
+from eracun_generator.batch import map_chunks, render_many
+
+
+class Unpicklable:
+    """
+    Stands in for an invoice holding something that can't be sent to a worker process.
+    """
+    invoice_number = 'unpicklable'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+
+class Crash:
+    """
+    Stands in for an invoice whose rendering kills the worker process.
+    """
+    invoice_number = 'crash'
+
+    def render_xml(self, **options):
+        os._exit(1)
+
+
+def square(item):
+    return item * item
+
+
+@pytest.mark.parametrize('workers', (1, 2))
+@pytest.mark.parametrize('ordered', (True, False))
+def test_render_many(make_invoice, workers, ordered):
+    invoices = [make_invoice(invoice_number=f'1-2019-{i}') for i in range(7)]
+
+    results = sorted(render_many(invoices, workers=workers, chunksize=2, ordered=ordered), key=lambda r: r.index)
+
+    assert [result.invoice_number for result in results] == [invoice.invoice_number for invoice in invoices]
+    assert [result.xml for result in results] == [invoice.render_xml() for invoice in invoices]
+
+
+def test_render_many_failing_invoice(make_invoice):
+    invoices = [make_invoice(), None, make_invoice()]
+
+    results = list(render_many(invoices, workers=1))
+
+    assert [result.ok for result in results] == [True, False, True]
+    assert 'AttributeError' in results[1].error
+
+
+def test_render_many_unpicklable_chunk(make_invoice):
+    invoices = [make_invoice(invoice_number=str(i)) for i in range(6)]
+    invoices[2] = Unpicklable()
+
+    results = list(render_many(invoices, workers=2, chunksize=2))
+
+    assert [result.index for result in results] == list(range(6))
+    assert [result.ok for result in results] == [True, True, False, False, True, True]
+    assert results[2].invoice_number == 'unpicklable'
+    assert 'pickle' in results[2].error
+
+
+def test_render_many_worker_died(make_invoice):
+    invoices = [make_invoice(invoice_number=str(i)) for i in range(12)]
+    invoices[1] = Crash()
+
+    results = list(render_many(invoices, workers=2, chunksize=2))
+
+    # The chunks in flight fail with the pool, the following ones are rendered by a new pool
+    assert [result.index for result in results] == list(range(12))
+    assert not results[1].ok
+    assert 'BrokenProcessPool' in results[1].error
+    assert all(result.ok for result in results[-4:])
+
+
+def test_map_chunks_raises_without_on_error():
+    with pytest.raises(Exception, match='pickle'):
+        list(map_chunks(square, [1, 2, threading.Lock()], workers=2, chunksize=1))
+
+
+@pytest.mark.parametrize('ordered', (True, False))
+def test_map_chunks(ordered):
+    results = list(map_chunks(square, range(100), workers=2, chunksize=7, ordered=ordered))
+
+    assert sorted(results) == [item * item for item in range(100)]
+
+    if ordered:
+        assert results == [item * item for item in range(100)]
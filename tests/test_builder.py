@@ -0,0 +1,39 @@
+from lxml import etree
+
+from eracun_generator.builder import build_xml
+
+
+def test_build_xml():
+    element = build_xml({
+        '_name': 'root',
+        '_attrs': [('Id', 'data')],
+        'first': {'_name': 'a', '_value': '1'},
+        'second': {'_name': 'b', '_value': None},
+    })
+
+    assert etree.tostring(element) == b'<root Id="data"><a>1</a><b/></root>'
+
+
+def test_build_xml_sorting():
+    element = build_xml({
+        '_name': 'root',
+        '_sorting': ['a', 'b', 'c'],
+        'c': {'_name': 'c'},
+        'a1': {'_name': 'a', '_value': '1'},
+        'b': {'_name': 'b'},
+        'a2': {'_name': 'a', '_value': '2'},
+    })
+
+    # Children with the same name keep their order
+    assert etree.tostring(element) == b'<root><a>1</a><a>2</a><b/><c/></root>'
+
+
+def test_build_xml_prebuilt_element():
+    prebuilt = etree.fromstring('<party><name>Company</name></party>')
+    parent = etree.Element('root')
+
+    first = build_xml({'_element': prebuilt}, parent)
+    second = build_xml({'_element': prebuilt}, parent)
+
+    assert first is not prebuilt and second is not first
+    assert etree.tostring(parent) == b'<root>' + b'<party><name>Company</name></party>' * 2 + b'</root>'
@@ -0,0 +1,117 @@
+import hashlib
+import io
+import zipfile
+
+import pytest
+
+from lxml import etree
+
+from eracun_generator.bundle import add_bundle, bundle_name, write_bundle, write_bundles
+
+PDF = b'%PDF-1.4 ' * 1000
+
+
+def members(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+def bundle(invoice, attachments=None, **options):
+    fp = io.BytesIO()
+    write_bundle(fp, invoice, attachments, **options)
+
+    return members(fp.getvalue())
+
+
+@pytest.mark.parametrize('source', (PDF, io.BytesIO(PDF), 'path'))
+def test_write_bundle(make_invoice, tmp_path, source):
+    if source == 'path':
+        source = tmp_path / 'invoice.pdf'
+        source.write_bytes(PDF)
+        source = str(source)
+
+    invoice = make_invoice()
+    files = bundle(invoice, [('invoice.pdf', 'PDF', source)])
+
+    assert list(files) == ['eRacun.xml', 'invoice.pdf', 'envelope.xml']
+    assert files['eRacun.xml'] == invoice.render_xml_bytes()
+    assert files['invoice.pdf'] == PDF
+    assert files['envelope.xml'] == invoice.render_envelope_bytes(attachments=[('invoice.pdf', 'PDF', PDF)],
+                                                                  xml=files['eRacun.xml'])
+
+    attachments = etree.fromstring(files['envelope.xml']).find('attachments')
+
+    assert attachments.findtext('hash') == hashlib.sha1(files['eRacun.xml'] + PDF).hexdigest()
+
+
+def test_write_bundle_signed(make_invoice, key, cert):
+    from eracun_generator.utils import SigningContext
+
+    files = bundle(make_invoice(), signing_context=SigningContext(key, cert))
+
+    assert b'<ds:SignatureValue>' in files['eRacun.xml']
+
+
+def test_write_bundles(make_invoice):
+    fp = io.BytesIO()
+    write_bundles(fp, [make_invoice(invoice_number='1/2019'), make_invoice(invoice_number='1/2019'),
+                       (make_invoice(invoice_number='2'), [('invoice.pdf', 'PDF', PDF)])])
+
+    assert list(members(fp.getvalue())) == [
+        '1_2019/eRacun.xml', '1_2019/envelope.xml',
+        '1_2019_2/eRacun.xml', '1_2019_2/envelope.xml',
+        '2/eRacun.xml', '2/invoice.pdf', '2/envelope.xml',
+    ]
+
+
+@pytest.mark.parametrize('invoice_number, name', [
+    ('1-2019-154', '1-2019-154'),
+    ('1/2019', '1_2019'),
+    ('..\\1', '.._1'),
+    ('..', '_..'),
+    ('.', '_.'),
+    ('', '_'),
+    (154, '154'),
+])
+def test_bundle_name(invoice_number, name):
+    assert bundle_name(invoice_number) == name
+
+
+def test_invoice_number_outside_of_archive(make_invoice):
+    fp = io.BytesIO()
+    write_bundles(fp, [make_invoice(invoice_number='..')])
+
+    assert list(members(fp.getvalue())) == ['_../eRacun.xml', '_../envelope.xml']
+
+
+@pytest.mark.parametrize('filename', ('../invoice.pdf', 'dir/invoice.pdf', '..', '.', '', 'a\\b.pdf'))
+def test_attachment_filename_rejected(make_invoice, filename):
+    with pytest.raises(ValueError, match='is not a file name'):
+        bundle(make_invoice(), [(filename, 'PDF', PDF)])
+
+
+@pytest.mark.parametrize('prefix', ('../', '/abs/', 'a/../', './', 'a\\b/'))
+def test_prefix_rejected(make_invoice, prefix):
+    with zipfile.ZipFile(io.BytesIO(), 'w') as archive:
+        with pytest.raises(ValueError, match='is not a relative directory'):
+            add_bundle(archive, make_invoice(), prefix=prefix)
+
+
+def test_nested_prefix(make_invoice):
+    fp = io.BytesIO()
+
+    with zipfile.ZipFile(fp, 'w') as archive:
+        add_bundle(archive, make_invoice(), prefix='2019/05/')
+
+    assert list(members(fp.getvalue())) == ['2019/05/eRacun.xml', '2019/05/envelope.xml']
+
+
+@pytest.mark.parametrize('source', (4096, None))
+def test_attachment_size_rejected(make_invoice, source):
+    with pytest.raises(ValueError, match='needs its content'):
+        bundle(make_invoice(), [('invoice.pdf', 'PDF', source)])
+
+
+def test_duplicate_filename_rejected(make_invoice):
+    with pytest.raises(ValueError, match='more than one file with the same name'):
+        bundle(make_invoice(), [('eRacun.xml', 'XML', PDF)])
@@ -0,0 +1,239 @@
+import csv
+import io
+import json
+import os
+import zipfile
+
+from decimal import Decimal
+
+import pytest
+
+from eracun_generator.cli import ITEM_COLUMNS, DirectoryOutput, invoice_from_record, main, read_csv
+from eracun_generator.reader import read_invoice
+
+HEADER = {
+    'invoice_number': '1-2019-154',
+    'location_address': 'Ljubljana',
+    'payment_reference': 'SI001-2019-154',
+    'date_issued': '2019-05-06',
+    'date_of_service': '2019-05-06',
+    'date_due': '2019-06-05',
+    'total_without_tax': '2.96',
+    'total_with_tax': '3.62',
+    'global_discount_amount': '1.00',
+    'global_discount_percentage': '10',
+}
+
+BUSINESS = {
+    'name': 'Company d.o.o.',
+    'address': 'Our Address 100',
+    'city': 'Ljubljana',
+    'zip_code': '1000',
+    'country': 'Slovenia',
+    'country_iso_code': 'SI',
+    'vat_id': '12345678',
+    'iban': 'SI56111122223333456',
+    'bic': 'BAKOSI2XXXX',
+    'registration_number': '555555555',
+}
+
+ITEM = {
+    'item_name': 'CocaCola 0.33L',
+    'quantity': '2.00',
+    'price_without_tax': '0.74',
+    'total_with_tax': '1.81',
+    'total_without_tax': '1.48',
+    'tax_rate': '22.00',
+}
+
+
+def make_csv(rows):
+    row = dict(HEADER)
+    row.update((f'{party}_{field}', value) for party in ('issuer', 'recipient') for field, value in BUSINESS.items())
+    row.update((ITEM_COLUMNS[field], value) for field, value in ITEM.items())
+
+    fp = io.StringIO()
+    writer = csv.DictWriter(fp, fieldnames=list(row) + ['item_row_number'])
+    writer.writeheader()
+
+    for row_number in range(1, rows + 1):
+        writer.writerow({**row, 'item_row_number': row_number})
+
+    fp.seek(0)
+
+    return fp
+
+
+def test_read_csv_header_amounts():
+    record, = read_csv(make_csv(2))
+
+    for field in ('total_without_tax', 'total_with_tax', 'global_discount_amount', 'global_discount_percentage'):
+        assert record[field] == HEADER[field]
+
+    assert len(record['items']) == 2
+
+
+def test_csv_global_discount_round_trip():
+    record, = read_csv(make_csv(2))
+    invoice = invoice_from_record(record)
+
+    assert invoice.global_discount_amount == Decimal('1.00')
+    assert invoice.global_discount_percentage == Decimal('10')
+
+    for v2 in (True, False):
+        read = read_invoice(invoice.render_xml_bytes(v2=v2))
+
+        assert read.global_discount_amount == Decimal('1.00')
+        assert read.global_discount_percentage == Decimal('10')
+
+
+def make_record(invoice_number, **item):
+    record = {field: value for field, value in HEADER.items() if not field.startswith(('total', 'global'))}
+    record.update(invoice_number=invoice_number, issuer=BUSINESS, recipient=BUSINESS, items=[{**ITEM, **item}])
+
+    return record
+
+
+def write_jsonl(path, records, lines=()):
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records) + ''.join(lines), encoding='utf-8')
+
+    return str(path)
+
+
+def run(capsys, *argv):
+    status = main(['--workers', '1', *argv])
+
+    return status, capsys.readouterr().err
+
+
+def read_zip(path):
+    with zipfile.ZipFile(path) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+def test_main_jsonl_to_directory(tmp_path, capsys):
+    source = write_jsonl(tmp_path / 'invoices.jsonl', [make_record('1-2019-1'), make_record('1-2019/2')])
+    output = tmp_path / 'out'
+
+    status, err = run(capsys, source, '--output', str(output), '--envelope')
+
+    assert status == 0
+    assert '2 converted, 0 skipped, 0 failed' in err
+    assert sorted(os.listdir(output)) == ['1-2019-1', '1-2019_2']
+    assert sorted(os.listdir(output / '1-2019-1')) == ['eRacun.xml', 'envelope.xml']
+
+    read = read_invoice(str(output / '1-2019_2' / 'eRacun.xml'))
+
+    assert read.invoice_number == '1-2019/2'
+    assert read.total_with_tax == Decimal('1.81')
+
+
+def test_main_csv_to_directory(tmp_path, capsys):
+    source = tmp_path / 'invoices.csv'
+    source.write_text(make_csv(3).getvalue(), encoding='utf-8')
+
+    status, err = run(capsys, str(source), '--output', str(tmp_path / 'out'), '--v1')
+
+    assert status == 0
+    assert '1 converted' in err
+    assert len(read_invoice(str(tmp_path / 'out' / '1-2019-154' / 'eRacun.xml')).document_items) == 3
+
+
+@pytest.mark.parametrize('workers', ('1', '2'))
+def test_main_jsonl_to_zip(tmp_path, capsys, workers):
+    source = write_jsonl(tmp_path / 'invoices.jsonl', [make_record(f'1-2019-{i}') for i in range(5)])
+    output = str(tmp_path / 'invoices.zip')
+
+    assert main([source, '--output', output, '--workers', workers, '--chunksize', '2']) == 0
+    assert sorted(read_zip(output)) == [f'1-2019-{i}/eRacun.xml' for i in range(5)]
+    assert not os.path.exists(output + '.tmp')
+
+
+@pytest.mark.parametrize('output', ('out', 'invoices.zip'))
+def test_main_resume(tmp_path, capsys, output):
+    output = str(tmp_path / output)
+    records = [make_record('1-2019-1'), make_record('1-2019-2')]
+
+    run(capsys, write_jsonl(tmp_path / 'first.jsonl', records[:1]), '--output', output)
+    status, err = run(capsys, write_jsonl(tmp_path / 'all.jsonl', records), '--output', output)
+
+    assert status == 0
+    assert '1 converted, 1 skipped, 0 failed' in err
+
+    status, err = run(capsys, str(tmp_path / 'all.jsonl'), '--output', output, '--overwrite')
+
+    assert '2 converted, 0 skipped' in err
+
+    if output.endswith('.zip'):
+        assert sorted(read_zip(output)) == ['1-2019-1/eRacun.xml', '1-2019-2/eRacun.xml']
+
+
+def test_main_duplicate_invoice_numbers(tmp_path, capsys):
+    records = [make_record('1-2019-1', item_name=f'Item {i}') for i in range(3)]
+    source = write_jsonl(tmp_path / 'invoices.jsonl', records)
+    output = tmp_path / 'out'
+
+    status, err = run(capsys, source, '--output', str(output))
+
+    assert '3 converted, 0 skipped, 0 failed' in err
+    assert sorted(os.listdir(output)) == ['1-2019-1', '1-2019-1_2', '1-2019-1_3']
+    assert read_invoice(str(output / '1-2019-1_3' / 'eRacun.xml')).document_items[0].item_name == 'Item 2'
+
+    # Resumed runs give the duplicates the same names
+    status, err = run(capsys, source, '--output', str(output))
+
+    assert '0 converted, 3 skipped' in err
+
+
+def test_main_record_failure(tmp_path, capsys):
+    source = write_jsonl(tmp_path / 'invoices.jsonl', [make_record('1-2019-1', quantity='two'),
+                                                       make_record('1-2019-2')])
+    output = tmp_path / 'out'
+
+    status, err = run(capsys, source, '--output', str(output))
+
+    assert status == 1
+    assert '1 converted, 0 skipped, 1 failed' in err
+    assert '1-2019-1 failed' in err
+    assert os.listdir(output) == ['1-2019-2']
+
+
+def test_main_invalid_input(tmp_path, capsys):
+    source = write_jsonl(tmp_path / 'invoices.jsonl', [make_record('1-2019-1')], lines=['{not json\n'])
+
+    with pytest.raises(SystemExit) as exit_info:
+        run(capsys, source, '--output', str(tmp_path / 'out'))
+
+    assert exit_info.value.code == 2
+    assert 'invalid input, line 2' in capsys.readouterr().err
+
+
+def test_main_output_error_is_not_invalid_input(tmp_path, capsys, monkeypatch):
+    def write(self, name, filename, data):
+        raise ValueError('disk says no')
+
+    monkeypatch.setattr(DirectoryOutput, 'write', write)
+    source = write_jsonl(tmp_path / 'invoices.jsonl', [make_record('1-2019-1')])
+
+    with pytest.raises(ValueError, match='disk says no'):
+        run(capsys, source, '--output', str(tmp_path / 'out'))
+
+
+def test_main_damaged_archive(tmp_path, capsys):
+    source = write_jsonl(tmp_path / 'invoices.jsonl', [make_record(f'1-2019-{i}') for i in range(3)])
+    output = tmp_path / 'invoices.zip'
+
+    run(capsys, source, '--output', str(output))
+    output.write_bytes(output.read_bytes()[:-30])
+
+    with pytest.raises(SystemExit) as exit_info:
+        run(capsys, source, '--output', str(output))
+
+    assert exit_info.value.code == 2
+    assert 'is damaged' in capsys.readouterr().err
+    assert not os.path.exists(str(output) + '.tmp')
+
+    status, err = run(capsys, source, '--output', str(output), '--overwrite')
+
+    assert status == 0
+    assert len(read_zip(output)) == 3
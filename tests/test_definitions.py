@@ -0,0 +1,34 @@
+import pytest
+
+from lxml import etree
+
+from eracun_generator import definitions, definitionsV2
+from eracun_generator.builder import build_xml
+
+# Party segments of the invoice data by key, with the business and business type they are built from
+PARTIES = {
+    True: (definitionsV2, {'issuer': ('issuer', 'SE'), 'buyer': ('recipient', 'BY')}),
+    False: (definitions, {'issuer': ('issuer', 'II'), 'buyer': ('recipient', 'BY'), 'recipient': ('recipient', 'IV')}),
+}
+
+
+@pytest.mark.parametrize('v2', (True, False))
+def test_invoice_json_parties_are_dicts(make_invoice, v2):
+    module, parties = PARTIES[v2]
+    invoice = make_invoice()
+    invoice_json = module.construct_invoice_json(invoice)
+
+    for key, (business, business_type) in parties.items():
+        assert invoice_json['invoice'][key] == module.construct_company_data(getattr(invoice, business), business_type)
+
+
+@pytest.mark.parametrize('v2', (True, False))
+def test_invoice_json_cached_parties(make_invoice, v2):
+    module, parties = PARTIES[v2]
+    invoice = make_invoice()
+    cached = module.construct_invoice_json(invoice, cached_parties=True)
+
+    for key in parties:
+        assert set(cached['invoice'][key]) == {'_element'}
+
+    assert etree.tostring(build_xml(cached)) == etree.tostring(build_xml(module.construct_invoice_json(invoice)))
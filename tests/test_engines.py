@@ -0,0 +1,60 @@
+import pytest
+
+from lxml import etree
+
+from eracun_generator.core import Invoice
+from eracun_generator.utils import SigningContext
+
+ENGINES = (Invoice.ENGINE_ELEMENT, Invoice.ENGINE_PROTOTYPE)
+
+
+def variants(make_invoice, make_mixed_invoice):
+    """
+    Invoices with and without the optional parts of the format.
+    """
+    plain = make_invoice(1)
+
+    bare = make_invoice(2)
+    bare.intro_text = None
+    bare.payment_reference = None
+    bare.reference_documents = []
+    bare.issuer.iban = None
+
+    return [plain, bare, make_mixed_invoice(), make_mixed_invoice(columnar_items=True)]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('v2', (True, False))
+def test_engine_like_dict_engine(make_invoice, make_mixed_invoice, engine, v2):
+    for invoice in variants(make_invoice, make_mixed_invoice):
+        assert invoice.render_xml_bytes(v2=v2, engine=engine) == invoice.render_xml_bytes(v2=v2)
+
+
+def without_signature(xml):
+    root = etree.fromstring(xml)
+    root.remove(root.find('{http://www.w3.org/2000/09/xmldsig#}Signature'))
+
+    return etree.tostring(root, method='c14n')
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('v2', (True, False))
+def test_engine_signed(make_mixed_invoice, key, cert, engine, v2):
+    signing_context = SigningContext(key, cert)
+    invoice = make_mixed_invoice()
+
+    signed = invoice.render_xml_bytes(v2=v2, engine=engine, signing_context=signing_context)
+    expected = invoice.render_xml_bytes(v2=v2, signing_context=signing_context)
+
+    assert without_signature(signed) == without_signature(expected)
+
+
+@pytest.mark.parametrize('v2', (True, False))
+def test_prototype_engine_keeps_no_values(make_invoice, make_mixed_invoice, v2):
+    invoices = variants(make_invoice, make_mixed_invoice)
+    expected = [invoice.render_xml_bytes(v2=v2) for invoice in invoices]
+
+    # Clones of the prototypes are filled in, values of one invoice never show up in the next
+    for _ in range(2):
+        for invoice, xml in zip(invoices + invoices[::-1], expected + expected[::-1]):
+            assert invoice.render_xml_bytes(v2=v2, engine=Invoice.ENGINE_PROTOTYPE) == xml
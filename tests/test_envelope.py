@@ -0,0 +1,72 @@
+import hashlib
+import io
+
+from decimal import Decimal
+
+import pytest
+
+from lxml import etree
+
+NO_HASH = '0' * 40
+
+
+def envelope_amount(invoice):
+    return etree.fromstring(invoice.render_envelope_bytes()).findtext('payment_data/amount')
+
+
+def test_envelope_amount(make_invoice):
+    invoice = make_invoice(3)
+
+    assert invoice.total_with_tax == Decimal('5.43')
+    assert envelope_amount(invoice) == '5.43'
+
+    invoice.total_with_tax = Decimal('5.4300')
+    assert envelope_amount(invoice) == '5.43'
+
+    invoice.total_with_tax = Decimal('5.425')
+    assert envelope_amount(invoice) == '5.43'
+
+    invoice.total_with_tax = 5
+    assert envelope_amount(invoice) == '5.00'
+
+
+def attachments_data(envelope):
+    attachments = etree.fromstring(envelope).find('attachments')
+
+    return (attachments.findtext('hash'), attachments.findtext('size'),
+            [(attachment.findtext('filename'), attachment.findtext('size'))
+             for attachment in attachments.iterfind('attachment')])
+
+
+@pytest.mark.parametrize('size', (4096, '4096'))
+def test_attachment_sizes_only(make_invoice, size):
+    invoice = make_invoice()
+    xml = invoice.render_xml_bytes()
+
+    envelope = invoice.render_envelope_bytes(attachments=[('invoice.pdf', 'PDF', size)], xml=xml)
+
+    assert attachments_data(envelope) == (NO_HASH, str(len(xml) + 4096),
+                                          [('eRacun.xml', str(len(xml))), ('invoice.pdf', '4096')])
+
+
+def test_attachment_contents(make_invoice):
+    invoice = make_invoice()
+    xml = invoice.render_xml_bytes()
+    pdf = b'%PDF' * 100
+
+    envelope = invoice.render_envelope_bytes(attachments=[('invoice.pdf', 'PDF', io.BytesIO(pdf))], xml=xml)
+
+    assert attachments_data(envelope) == (hashlib.sha1(xml + pdf).hexdigest(), str(len(xml) + len(pdf)),
+                                          [('eRacun.xml', str(len(xml))), ('invoice.pdf', str(len(pdf)))])
+
+
+@pytest.mark.parametrize('attachment', (('invoice.pdf', 'PDF'), ('invoice.pdf', 'PDF', 4096)))
+def test_attachment_sizes_unknown(make_invoice, attachment):
+    invoice = make_invoice()
+    xml = invoice.render_xml_bytes()
+
+    # The size of the invoice XML, or of the attachment, is not known
+    assert attachments_data(invoice.render_envelope_bytes(attachments=[attachment]))[:2] == (NO_HASH, '0')
+
+    if len(attachment) == 2:
+        assert attachments_data(invoice.render_envelope_bytes(attachments=[attachment], xml=xml))[:2] == (NO_HASH, '0')
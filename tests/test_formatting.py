@@ -0,0 +1,131 @@
+import random
+import textwrap
+
+from decimal import Decimal, ROUND_DOWN, localcontext
+
+import pytest
+
+from eracun_generator import formatting
+from eracun_generator.formatting import format_amount, split_text
+
+# Widths and segment counts the definitions and engines split texts with
+SPLITS = ((70, 5), (70, 4), (35, 4))
+
+TEXTS = [
+    '',
+    ' ',
+    'Company d.o.o.',
+    '  leading and trailing spaces  ',
+    'Cesta v Mestni log 12, 1000 Ljubljana, Slovenija',
+    ' '.join(['x' * 36] * 9),
+    'x' * 400,
+    'word ' * 100,
+    'a' * 35 + ' ' + 'b' * 35,
+    'a' * 34 + ' ' * 40 + 'b' * 80,
+    'well-known hyphenated-words and a long-hyphenated-' + 'x' * 80,
+    'em--dash between--words',
+    'tabs\tand\nnew lines\r\nin\x0btext\x0c',
+    'no\xa0break spaces and ​zero width',
+    'Šumniki čćžšđ ' * 20,
+]
+
+FRAGMENTS = ['a', 'b', 'Č', ' ', '  ', '-', '--', '\t', '\n', '\xa0', '.', 'x' * 40, 'word ', 'ž' * 80, ' ' * 40]
+
+
+def wrapped(text, width, count):
+    return tuple(textwrap.wrap(text, width, break_long_words=True)[:count])
+
+
+def random_texts(count, seed):
+    generator = random.Random(seed)
+
+    for _ in range(count):
+        text = ''.join(generator.choice(FRAGMENTS) for _ in range(generator.randint(0, 30)))
+
+        # Half of the texts take the path without textwrap
+        if generator.random() < 0.5:
+            text = text.replace('-', '').replace('\t', '').replace('\n', '').replace('\xa0', '')
+
+        yield text
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    formatting._text_cache.clear()
+
+
+@pytest.mark.parametrize('text', TEXTS)
+@pytest.mark.parametrize('width, count', SPLITS)
+def test_split_text_like_textwrap(text, width, count):
+    assert split_text(text, width, count) == wrapped(text, width, count)
+
+    # Cached
+    assert split_text(text, width, count) == wrapped(text, width, count)
+
+
+@pytest.mark.parametrize('width, count', SPLITS + ((3, 10), (1, 50)))
+def test_split_random_text_like_textwrap(width, count):
+    for text in random_texts(5000, seed=width * 100 + count):
+        formatting._text_cache.clear()
+
+        assert split_text(text, width, count) == wrapped(text, width, count), text
+
+
+def test_split_long_text_keeps_count_segments():
+    text = 'word ' * 10000
+
+    assert split_text(text, 70, 5) == wrapped(text, 70, 5)
+    assert len(split_text(text, 70, 5)) == 5
+
+
+@pytest.mark.parametrize('value, text', [
+    (Decimal('0.825'), '0.83'),
+    (Decimal('0.125'), '0.13'),
+    (Decimal('-0.125'), '-0.13'),
+    (Decimal('1.004'), '1.00'),
+    (Decimal('3.62'), '3.62'),
+    (Decimal('1E+3'), '1000.00'),
+    (Decimal('12345678901234567890.005'), '12345678901234567890.01'),
+    (1.005, '1.01'),
+    (0.825, '0.83'),
+    (9.5, '9.50'),
+    (22, '22.00'),
+    (0, '0.00'),
+    (-0.0, '-0.00'),
+])
+def test_format_amount(value, text):
+    formatting._cache.clear()
+
+    assert format_amount(value) == text
+
+    # Cached
+    assert format_amount(value) == text
+
+
+def test_format_amount_ignores_context():
+    with localcontext() as context:
+        context.prec = 2
+        context.rounding = ROUND_DOWN
+
+        assert format_amount(Decimal('1234.565')) == '1234.57'
+
+
+def test_format_amount_cache(monkeypatch):
+    monkeypatch.setattr(formatting, 'CACHE_SIZE', 3)
+    formatting._cache.clear()
+
+    for value in (22, 9.5, 0):
+        format_amount(value)
+
+    # Zero isn't cached, -0.0 is an equal key formatted differently
+    assert formatting._cache == {22: '22.00', 9.5: '9.50'}
+
+    format_amount(Decimal('1.5'))
+    assert len(formatting._cache) == 2
+
+    format_amount(5)
+    assert len(formatting._cache) == 3
+
+    # Full, cleared before the next value is added
+    assert format_amount(8.25) == '8.25'
+    assert formatting._cache == {8.25: '8.25'}
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from eracun_generator.pipeline import Pipeline
+
+
+class Broken:
+    """
+    Stands in for an invoice that can't be rendered.
+    """
+    invoice_number = 'broken'
+
+    def _construct_xml(self, v2, engine, stopwatch):
+        raise ValueError('broken invoice')
+
+
+async def aiterate(items):
+    for item in items:
+        yield item
+
+
+@pytest.mark.parametrize('asynchronous', (False, True))
+@pytest.mark.parametrize('envelope', (False, True))
+def test_pipeline(make_invoice, asynchronous, envelope):
+    invoices = [make_invoice(invoice_number=f'1-2019-{i}') for i in range(5)]
+    received = {}
+
+    async def sink(invoice, xml, envelope):
+        received[invoice.invoice_number] = (xml, envelope)
+
+    pipeline = Pipeline(sink, envelope=envelope, render_workers=2, sign_workers=2, queue_size=2)
+    summary = asyncio.run(pipeline.run(aiterate(invoices) if asynchronous else invoices))
+
+    assert pipeline.errors == []
+    assert summary['failed'] == 0
+    assert list(summary['stages']) == ['render', 'sign'] + ['envelope'] * envelope + ['sink']
+    assert all(stage['processed'] == 5 and stage['failed'] == 0 for stage in summary['stages'].values())
+
+    for invoice in invoices:
+        xml, envelope_xml = received[invoice.invoice_number]
+
+        assert xml == invoice.render_xml_bytes()
+        assert (envelope_xml is not None) == envelope
+
+
+def test_pipeline_plain_function_sink(make_invoice):
+    invoices = [make_invoice(invoice_number=f'1-2019-{i}') for i in range(3)]
+    received = []
+
+    pipeline = Pipeline(lambda invoice, xml, envelope: received.append(invoice.invoice_number))
+    asyncio.run(pipeline.run(invoices))
+
+    assert sorted(received) == sorted(invoice.invoice_number for invoice in invoices)
+
+
+def test_pipeline_failed_render(make_invoice):
+    invoices = [make_invoice(invoice_number='1-2019-1'), Broken(), make_invoice(invoice_number='1-2019-2')]
+    received = []
+
+    async def sink(invoice, xml, envelope):
+        received.append(invoice.invoice_number)
+
+    pipeline = Pipeline(sink)
+    summary = asyncio.run(pipeline.run(invoices))
+
+    # The broken invoice is recorded and the others still reach the sink
+    assert sorted(received) == ['1-2019-1', '1-2019-2']
+    assert [(invoice, stage) for invoice, stage, _ in pipeline.errors] == [(invoices[1], 'render')]
+    assert 'ValueError: broken invoice' in pipeline.errors[0][2]
+
+    assert summary['failed'] == 1
+    assert summary['stages']['render']['processed'] == 2 and summary['stages']['render']['failed'] == 1
+    assert summary['stages']['sink']['processed'] == 2 and summary['stages']['sink']['failed'] == 0
+
+
+def test_pipeline_failed_sink(make_invoice):
+    invoices = [make_invoice(invoice_number=f'1-2019-{i}') for i in range(4)]
+    received = []
+
+    async def sink(invoice, xml, envelope):
+        if invoice.invoice_number == '1-2019-2':
+            raise IOError('storage is down')
+
+        received.append(invoice.invoice_number)
+
+    pipeline = Pipeline(sink)
+    summary = asyncio.run(pipeline.run(invoices))
+
+    assert sorted(received) == ['1-2019-0', '1-2019-1', '1-2019-3']
+    assert [(invoice.invoice_number, stage) for invoice, stage, _ in pipeline.errors] == [('1-2019-2', 'sink')]
+    assert summary['failed'] == 1
+    assert summary['stages']['sign']['processed'] == 4
+    assert summary['stages']['sink']['processed'] == 3 and summary['stages']['sink']['failed'] == 1
+
+
+def test_pipeline_backpressure(make_invoice):
+    queue_size = 2
+    invoice = make_invoice()
+    read = []
+
+    def invoices():
+        for i in range(100):
+            read.append(i)
+            yield invoice
+
+    async def run():
+        release = asyncio.Event()
+
+        async def sink(invoice, xml, envelope):
+            await release.wait()
+
+        pipeline = Pipeline(sink, queue_size=queue_size)
+        task = asyncio.ensure_future(pipeline.run(invoices()))
+
+        # Wait until the stages in front of the blocked sink have filled up and stopped reading invoices
+        count = None
+
+        while count != len(read):
+            count = len(read)
+            await asyncio.sleep(0.1)
+
+        blocked = pipeline.summary()
+        release.set()
+
+        return count, blocked, await task
+
+    count, blocked, summary = asyncio.run(run())
+    stages = blocked['stages']
+
+    # Every stage holds at most a full queue and one invoice per worker, and one more invoice waits to be queued
+    assert count < 100
+    assert stages['sink']['processed'] == 0
+    assert count <= sum(queue_size + stage['workers'] for stage in stages.values()) + 1
+    assert all(stage['max_queue_depth'] <= queue_size for stage in stages.values())
+    assert stages['sink']['queue_depth'] == queue_size
+
+    # Once the sink is released every invoice goes through
+    assert summary['failed'] == 0
+    assert summary['stages']['sink']['processed'] == 100
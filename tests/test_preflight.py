@@ -0,0 +1,129 @@
+from decimal import Decimal
+
+import pytest
+
+from eracun_generator.preflight import (INVALID, MISMATCH, MISSING, TOO_LONG, check_business, check_invoice,
+                                        check_invoices, valid_iban)
+
+IBAN = 'SI56191000000123438'
+
+
+@pytest.fixture
+def invoice(make_invoice):
+    invoice = make_invoice()
+
+    for business in (invoice.issuer, invoice.recipient):
+        business.iban = IBAN
+
+    return invoice
+
+
+def codes(issues):
+    return [(issue.field, issue.code) for issue in issues]
+
+
+@pytest.mark.parametrize('columnar_items', (False, True))
+def test_valid_invoice(invoice, make_mixed_invoice, columnar_items):
+    assert check_invoice(invoice) == []
+
+    mixed = make_mixed_invoice(columnar_items)
+    mixed.issuer.iban = mixed.recipient.iban = IBAN
+
+    assert codes(check_invoice(mixed)) == [
+        ('issuer.name', TOO_LONG),
+        ('issuer.address', TOO_LONG),
+        ('document_items[1].item_name', TOO_LONG),
+    ]
+
+
+def test_missing_values(invoice):
+    invoice.invoice_number = None
+    invoice.date_due = None
+    invoice.payment_reference = ''
+    invoice.recipient = None
+    invoice.issuer.city = None
+    invoice.document_items[2].item_name = ''
+
+    assert codes(check_invoice(invoice)) == [
+        ('invoice_number', MISSING),
+        ('date_due', MISSING),
+        ('payment_reference', MISSING),
+        ('issuer.city', MISSING),
+        ('recipient', MISSING),
+        ('document_items[2].item_name', MISSING),
+    ]
+
+
+@pytest.mark.parametrize('v2, segments', ((True, 5), (False, 4)))
+def test_text_too_long(invoice, v2, segments):
+    # Words of 34 characters, two fill a line of 70
+    word = 'x' * 34
+
+    invoice.intro_text = ' '.join([word] * 2 * segments)
+    assert check_invoice(invoice, v2) == []
+
+    invoice.intro_text += ' x'
+    assert codes(check_invoice(invoice, v2)) == [('intro_text', TOO_LONG)]
+
+
+@pytest.mark.parametrize('field, value, code', [
+    ('iban', 'SI56191000000123439', INVALID),
+    ('iban', 'SI56 1910 0000 0123 438', INVALID),
+    ('bic', 'BAKOSI2', INVALID),
+    ('bic', 'bakosi2xxxx', INVALID),
+    ('bic', None, MISSING),
+    ('name', 'x' * 71, TOO_LONG),
+])
+def test_business(invoice, field, value, code):
+    setattr(invoice.issuer, field, value)
+
+    assert codes(check_business(invoice.issuer, 'issuer')) == [(f'issuer.{field}', code)]
+
+
+@pytest.mark.parametrize('iban, valid', [
+    (IBAN, True),
+    ('GB82WEST12345698765432', True),
+    ('DE89370400440532013000', True),
+    ('SI56111122223333456', False),
+    ('GB82WEST1234569876543', False),
+    ('XX', False),
+])
+def test_valid_iban(iban, valid):
+    assert valid_iban(iban) is valid
+
+
+def test_totals(invoice):
+    assert codes(check_invoice(invoice)) == []
+
+    invoice.total_with_tax += Decimal('0.01')
+    assert codes(check_invoice(invoice)) == [('total_with_tax', MISMATCH)]
+
+    invoice.total_with_tax -= Decimal('0.01')
+    invoice.global_discount_amount = Decimal('1.00')
+    assert codes(check_invoice(invoice)) == [('total_without_tax', MISMATCH)]
+
+    invoice.finalize_totals()
+    assert codes(check_invoice(invoice)) == []
+
+    invoice.tax_summaries[0].tax_base += Decimal('0.01')
+    assert codes(check_invoice(invoice)) == [('tax_summaries', MISMATCH)]
+
+    invoice.tax_summaries = []
+    assert codes(check_invoice(invoice)) == [('tax_summaries', MISSING)]
+
+    invoice.total_without_tax = None
+    assert codes(check_invoice(invoice)) == [('total_without_tax', MISSING)]
+
+
+def test_totals_to_the_cent(invoice):
+    # Sub-cent differences that round away are not reported
+    invoice.total_with_tax += Decimal('0.004')
+
+    assert check_invoice(invoice) == []
+
+
+def test_check_invoices(invoice, make_invoice):
+    results = list(check_invoices([invoice, make_invoice()]))
+
+    assert results[0] == (invoice, [])
+    assert codes(results[1][1]) == [('issuer.iban', INVALID), ('recipient.iban', INVALID)]
@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+import pytest
+
+from eracun_generator.reader import read_invoice
+
+
+@pytest.mark.parametrize('v2', (True, False))
+def test_round_trip(make_invoice, v2):
+    xml = make_invoice().render_xml_bytes(v2=v2)
+
+    assert read_invoice(xml).render_xml_bytes(v2=v2) == xml
+
+
+@pytest.mark.parametrize('v2', (True, False))
+def test_round_trip_signed(make_invoice, key, cert, v2):
+    invoice = make_invoice()
+    signed = invoice.render_xml_bytes(key=key, cert=cert, v2=v2)
+
+    assert read_invoice(signed).render_xml_bytes(v2=v2) == invoice.render_xml_bytes(v2=v2)
+
+
+@pytest.mark.parametrize('v2', (True, False))
+def test_round_trip_discounts(make_invoice, v2):
+    invoice = make_invoice(0)
+    invoice.add_item(row_number=1, item_name='Discounted', quantity=Decimal('2.00'),
+                     price_without_tax=Decimal('0.82'), total_with_tax=Decimal('1.81'),
+                     total_without_tax=Decimal('1.48'), tax_rate=Decimal('22.00'), discount_percentage=Decimal('10'),
+                     discount_amount=Decimal('0.16'))
+    invoice.global_discount_amount = Decimal('0.15')
+    invoice.global_discount_percentage = Decimal('10')
+    invoice.finalize_totals()
+
+    xml = invoice.render_xml_bytes(v2=v2)
+
+    assert read_invoice(xml).render_xml_bytes(v2=v2) == xml
+
+
+@pytest.mark.parametrize('v2', (True, False))
+def test_round_trip_sub_cent_amounts(make_invoice, v2):
+    invoice = make_invoice(0)
+
+    for row_number in range(1, 4):
+        invoice.add_item(row_number=row_number, item_name=f'Item {row_number}', quantity=Decimal('1.00'),
+                         price_without_tax=Decimal('1.484'), total_with_tax=Decimal('1.8105'),
+                         total_without_tax=Decimal('1.484'), tax_rate=Decimal('22.00'))
+
+    invoice.finalize_totals()
+
+    xml = invoice.render_xml_bytes(v2=v2)
+    read = read_invoice(xml)
+
+    # Items come back as written, the total before discounts as summed from the exact amounts
+    assert read.document_items[0].total_without_tax == Decimal('1.48')
+    assert read.subtotal_net == Decimal('4.45')
+    assert read.render_xml_bytes(v2=v2) == xml
+
+
+@pytest.mark.parametrize('name', ['Company d.o.o. ', 'Company  d.o.o.', 'Long company name ' * 3])
+def test_round_trip_names(make_invoice, name):
+    invoice = make_invoice()
+    invoice.issuer.name = name
+
+    xml = invoice.render_xml_bytes()
+    read = read_invoice(xml)
+
+    assert read.render_xml_bytes() == xml
+
+    if len(name) < 34:
+        assert read.issuer.name == name
@@ -0,0 +1,39 @@
+import pickle
+
+import pytest
+
+from cryptography.hazmat.primitives import serialization
+
+from eracun_generator.utils import SigningContext
+
+
+@pytest.fixture(scope='module')
+def private_key(key):
+    return serialization.load_pem_private_key(key, password=None)
+
+
+def signed(invoice, signing_context):
+    return invoice.render_xml_bytes(signing_context=signing_context)
+
+
+@pytest.mark.parametrize('from_object', (False, True))
+def test_pickle_signing_context(make_invoice, key, cert, private_key, from_object):
+    signing_context = SigningContext(private_key if from_object else key, cert)
+    copy = pickle.loads(pickle.dumps(signing_context))
+
+    assert copy.cert == signing_context.cert
+    assert copy.cert_digest == signing_context.cert_digest
+    assert copy.private_key.private_numbers() == private_key.private_numbers()
+    assert b'<ds:SignatureValue>' in signed(make_invoice(), copy)
+
+
+def test_pickle_encrypted_key(cert, private_key):
+    passphrase = b'secret'
+    key = private_key.private_bytes(serialization.Encoding.PEM,
+                                    serialization.PrivateFormat.PKCS8,
+                                    serialization.BestAvailableEncryption(passphrase))
+
+    copy = pickle.loads(pickle.dumps(SigningContext(key, cert, passphrase)))
+
+    assert copy.key == key
+    assert copy.private_key.private_numbers() == private_key.private_numbers()
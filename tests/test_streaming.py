@@ -0,0 +1,45 @@
+import io
+
+import pytest
+
+from eracun_generator.streaming import iter_invoice_xml, write_invoice_xml
+
+ENGINES = ('dict', 'element', 'prototype')
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('v2', (True, False))
+@pytest.mark.parametrize('columnar_items', (False, True))
+def test_stream_xml_like_render_xml(make_mixed_invoice, engine, v2, columnar_items):
+    invoice = make_mixed_invoice(columnar_items)
+    expected = invoice.render_xml_bytes(v2=v2)
+
+    fp = io.BytesIO()
+    invoice.stream_xml(fp, v2=v2, engine=engine)
+
+    assert fp.getvalue() == expected
+
+    fp = io.BytesIO()
+    write_invoice_xml(invoice, fp, v2=v2, engine=engine)
+
+    assert fp.getvalue() == expected
+
+
+@pytest.mark.parametrize('v2', (True, False))
+def test_iter_invoice_xml_chunks(make_invoice, v2):
+    invoice = make_invoice(50)
+    chunks = list(iter_invoice_xml(invoice, v2=v2))
+
+    assert b''.join(chunks) == invoice.render_xml_bytes(v2=v2)
+
+    # Declaration, head and tail of the root and one chunk per segment, every item is a segment of its own
+    assert len(chunks) > 50
+    assert max(len(chunk) for chunk in chunks[2:-1]) < len(b''.join(chunks)) / 10
+
+
+def test_stream_xml_without_items(make_invoice):
+    invoice = make_invoice(0)
+    fp = io.BytesIO()
+    invoice.stream_xml(fp)
+
+    assert fp.getvalue() == invoice.render_xml_bytes()
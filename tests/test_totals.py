@@ -0,0 +1,138 @@
+from decimal import Decimal
+
+import pytest
+
+
+def summaries(invoice):
+    return [(ts.tax_rate, ts.tax_type, ts.tax_base, ts.tax_amount) for ts in invoice.tax_summaries]
+
+
+ITEMS = [
+    # tax_rate, tax_rate_type, total_without_tax, total_with_tax
+    (Decimal('22.00'), 'S', Decimal('1.48'), Decimal('1.81')),
+    (Decimal('9.50'), 'S', Decimal('10.80'), Decimal('11.83')),
+    (Decimal('0'), 'E', Decimal('12.50'), Decimal('12.50')),
+    (Decimal('22.00'), 'S', Decimal('27.00'), Decimal('32.94')),
+]
+
+
+def add_items(invoice, items=ITEMS):
+    for row_number, (tax_rate, tax_rate_type, total_without_tax, total_with_tax) in enumerate(items, start=1):
+        invoice.add_item(row_number=row_number, item_name=f'Item {row_number}', quantity=Decimal('1'),
+                         price_without_tax=total_without_tax, total_with_tax=total_with_tax,
+                         total_without_tax=total_without_tax, tax_rate=tax_rate, tax_rate_type=tax_rate_type)
+
+
+def add_columns(invoice, items=ITEMS):
+    tax_rates, tax_rate_types, totals_without_tax, totals_with_tax = zip(*items)
+
+    invoice.add_items_from_columns(item_name=[f'Item {i}' for i in range(len(items))], quantity=[1] * len(items),
+                                   price_without_tax=totals_without_tax, total_with_tax=totals_with_tax,
+                                   total_without_tax=totals_without_tax, tax_rate=tax_rates,
+                                   tax_rate_type=tax_rate_types)
+
+
+@pytest.fixture
+def invoice(make_invoice):
+    invoice = make_invoice(0)
+    invoice.tax_summaries = []
+
+    return invoice
+
+
+def test_finalize_totals_mixed_rates(invoice):
+    add_items(invoice)
+    invoice.finalize_totals()
+
+    assert summaries(invoice) == [
+        (Decimal('22.00'), 'S', Decimal('28.48'), Decimal('6.27')),
+        (Decimal('9.50'), 'S', Decimal('10.80'), Decimal('1.03')),
+        (Decimal('0'), 'E', Decimal('12.50'), Decimal('0.00')),
+    ]
+    assert invoice.subtotal_net == Decimal('51.78')
+    assert invoice.total_without_tax == Decimal('51.78')
+    assert invoice.total_with_tax == Decimal('59.08')
+
+
+def test_finalize_totals_global_discount(invoice):
+    add_items(invoice)
+    invoice.global_discount_amount = Decimal('1.00')
+    invoice.finalize_totals()
+
+    # The discount is spread in proportion to the bases, the last base takes the rounding difference
+    assert summaries(invoice) == [
+        (Decimal('22.00'), 'S', Decimal('27.93'), Decimal('6.15')),
+        (Decimal('9.50'), 'S', Decimal('10.59'), Decimal('1.01')),
+        (Decimal('0'), 'E', Decimal('12.26'), Decimal('0.00')),
+    ]
+    assert invoice.subtotal_net == Decimal('51.78')
+    assert invoice.total_without_tax == Decimal('50.78')
+    assert invoice.total_with_tax == Decimal('57.94')
+
+
+@pytest.mark.parametrize('discount', (Decimal('0.01'), Decimal('7.77'), Decimal('51.78'), 1, 0.5))
+def test_finalize_totals_bases_add_up(invoice, discount):
+    add_items(invoice)
+    invoice.global_discount_amount = discount
+    invoice.finalize_totals()
+
+    assert invoice.total_without_tax == Decimal('51.78') - Decimal(str(discount))
+    assert sum(ts.tax_base for ts in invoice.tax_summaries) == invoice.total_without_tax
+    assert invoice.total_with_tax == invoice.total_without_tax + sum(ts.tax_amount for ts in invoice.tax_summaries)
+
+
+def test_finalize_totals_repeated(invoice):
+    add_items(invoice)
+    invoice.global_discount_amount = Decimal('1.00')
+    invoice.finalize_totals()
+    first = summaries(invoice), invoice.total_without_tax, invoice.total_with_tax
+
+    invoice.finalize_totals()
+
+    assert (summaries(invoice), invoice.total_without_tax, invoice.total_with_tax) == first
+
+
+def test_finalize_totals_without_items(invoice):
+    invoice.finalize_totals()
+
+    assert invoice.tax_summaries == []
+    assert invoice.total_without_tax == invoice.total_with_tax == Decimal('0.00')
+
+
+def test_finalize_totals_sub_cent_amounts(invoice):
+    add_items(invoice, [(Decimal('22.00'), 'S', Decimal('0.333'), Decimal('0.406'))] * 3)
+    invoice.finalize_totals()
+
+    # Summaries are rounded once from the exact sums, not summed from rounded items
+    assert summaries(invoice) == [(Decimal('22.00'), 'S', Decimal('1.00'), Decimal('0.22'))]
+
+
+def test_add_items_from_columns_totals(invoice, make_invoice):
+    add_columns(invoice)
+
+    by_item = make_invoice(0)
+    add_items(by_item)
+
+    assert invoice.tax_totals == by_item.tax_totals
+    assert invoice.subtotal_net == by_item.subtotal_net
+
+    assert list(invoice.tax_totals) == list(by_item.tax_totals)
+
+    invoice.global_discount_amount = by_item.global_discount_amount = Decimal('1.00')
+    invoice.finalize_totals()
+    by_item.finalize_totals()
+
+    assert summaries(invoice) == summaries(by_item)
+
+
+def test_add_tax_totals(invoice):
+    # One rate is summed whole, several are grouped first, both add to the running totals
+    invoice.add_tax_totals([Decimal('22.00')] * 2, ['S'] * 2, [Decimal('1.00'), Decimal('2.00')],
+                           [Decimal('1.22'), Decimal('2.44')])
+    invoice.add_tax_totals([Decimal('22.00'), Decimal('9.50')], ['S', 'S'], [Decimal('3.00'), Decimal('1.00')],
+                           [Decimal('3.66'), Decimal('1.095')])
+
+    assert invoice.tax_totals == {
+        (Decimal('22.00'), 'S'): [Decimal('6.00'), Decimal('7.32')],
+        (Decimal('9.50'), 'S'): [Decimal('1.00'), Decimal('1.095')],
+    }
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+from lxml import etree
+
+from eracun_generator import validation
+from eracun_generator.validation import (INVOICE_SCHEMA_V2, SchemaNotFoundError, load_unqualified_schema,
+                                         validate_envelope, validate_invoice)
+
+SCHEMAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas')
+
+
+@pytest.fixture(autouse=True)
+def schema_dir(monkeypatch):
+    monkeypatch.setattr(validation, 'SCHEMA_DIR', None)
+    monkeypatch.setenv('ERACUN_SCHEMA_DIR', SCHEMAS)
+
+
+def built(invoice, v2=True):
+    return invoice._construct_xml(v2, invoice.ENGINE_DICT, None)
+
+
+@pytest.mark.parametrize('v2', (True, False))
+def test_valid_invoice(make_invoice, v2):
+    xml = make_invoice().render_xml_bytes(v2=v2, validate=True)
+
+    assert xml == make_invoice().render_xml_bytes(v2=v2)
+
+
+def test_valid_signed_invoice(make_invoice, key, cert):
+    make_invoice().render_xml_bytes(key=key, cert=cert, validate=True)
+
+
+def test_validation_keeps_tree(make_invoice):
+    assert load_unqualified_schema(INVOICE_SCHEMA_V2) is not None
+
+    xml_content = built(make_invoice())
+    before = etree.tostring(xml_content)
+
+    validate_invoice(xml_content)
+
+    assert etree.tostring(xml_content) == before
+
+
+def test_invalid_invoice_keeps_tree(make_invoice):
+    xml_content = built(make_invoice())
+    message = xml_content.find('M_INVOIC')
+    message.remove(message.find('S_BGM'))
+    before = etree.tostring(xml_content)
+
+    with pytest.raises(etree.DocumentInvalid):
+        validate_invoice(xml_content)
+
+    assert etree.tostring(xml_content) == before
+
+
+def test_invalid_v1_invoice(make_invoice):
+    xml_content = built(make_invoice(), v2=False)
+    invoice = xml_content.find('Racun')
+    invoice.remove(invoice.find('GlavaRacuna'))
+
+    with pytest.raises(etree.DocumentInvalid):
+        validate_invoice(xml_content, v2=False)
+
+
+def test_namespaced_invoice(make_invoice):
+    xml_content = etree.fromstring(make_invoice().render_xml_bytes())
+
+    assert xml_content.tag == '{urn:eslog:2.00}Invoice'
+
+    validate_invoice(xml_content)
+
+
+def test_valid_envelope(make_invoice):
+    make_invoice().render_envelope_bytes(validate=True)
+
+
+def test_invalid_envelope():
+    with pytest.raises(etree.DocumentInvalid):
+        validate_envelope(etree.Element('envelope'))
+
+
+@pytest.mark.parametrize('directory', ('include', 'prefixed'))
+def test_schema_kept_namespaced(monkeypatch, make_invoice, directory):
+    monkeypatch.setenv('ERACUN_SCHEMA_DIR', os.path.join(SCHEMAS, directory))
+
+    assert load_unqualified_schema(INVOICE_SCHEMA_V2) is None
+
+    xml_content = built(make_invoice())
+    before = etree.tostring(xml_content)
+
+    validate_invoice(xml_content)
+
+    assert etree.tostring(xml_content) == before
+
+    message = xml_content.find('M_INVOIC')
+    message.remove(message.find('S_BGM'))
+
+    with pytest.raises(etree.DocumentInvalid):
+        validate_invoice(xml_content)
+
+
+def test_schema_dir_not_set(monkeypatch, make_invoice):
+    monkeypatch.delenv('ERACUN_SCHEMA_DIR')
+
+    with pytest.raises(SchemaNotFoundError, match='ERACUN_SCHEMA_DIR'):
+        make_invoice().render_xml_bytes(validate=True)
+
+
+def test_schema_dir_module_value(monkeypatch, make_invoice):
+    monkeypatch.delenv('ERACUN_SCHEMA_DIR')
+    monkeypatch.setattr(validation, 'SCHEMA_DIR', SCHEMAS)
+
+    make_invoice().render_xml_bytes(validate=True)
+
+
+def test_schema_file_missing(monkeypatch, tmp_path, make_invoice):
+    monkeypatch.setenv('ERACUN_SCHEMA_DIR', str(tmp_path))
+
+    with pytest.raises(SchemaNotFoundError, match=INVOICE_SCHEMA_V2):
+        make_invoice().render_xml_bytes(validate=True)